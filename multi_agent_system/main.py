@@ -1,32 +1,75 @@
 import sys
 import os
-from rich.panel import Panel  # <--- NEW IMPORT
+import re
+import json
+import argparse
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+# A replayed run must not touch the network, not even for LiteLLM's price list (fetched on import)
+if "--replay" in sys.argv:
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
 from src.interface.parser import ConfigParser
 from src.engine.orchestrator import Orchestrator
 from src.interface.console import ui
+from src.interface.database import db
+from src.interface.tools import ToolRegistry
+from src.interface.cassette import Cassette, use as use_cassette
+from src.engine.task_queue import open_queue
+from src.engine.distributed import QueueDispatcher, Worker
 
-def main():
-    # 1. Welcome Banner
-    ui.print_welcome()
-
-    # 2. Determine path
-    if len(sys.argv) > 1:
-        input_path = sys.argv[1]
-    else:
-        input_path = "config.yaml"
-
-    # Smart path checking
+def _find_config(input_path: str):
+    """Smart path checking: the path itself, then the examples folders."""
     possible_paths = [
         input_path,
         os.path.join("examples", input_path),
         os.path.join("example", input_path)
     ]
-
-    final_config_path = None
     for path in possible_paths:
         if os.path.exists(path):
-            final_config_path = path
-            break
+            return path
+    return None
+
+def run_workflow(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="Run a workflow config.")
+    parser.add_argument("config", nargs="?", default="config.yaml", help="Workflow YAML file")
+    parser.add_argument("--headless", action="store_true",
+                        help="Emit compact JSON lines instead of the Rich dashboard")
+    parser.add_argument("--queue", nargs="?", const="", default=None, metavar="URL",
+                        help="Run agents on queue workers (sqlite:///path.db or redis://host); "
+                             "without a URL uses TASK_QUEUE_URL or the orchestrator database")
+    tape = parser.add_mutually_exclusive_group()
+    tape.add_argument("--record", metavar="CASSETTE",
+                      help="Save every LLM request/response and tool call of this run (gzip JSON lines)")
+    tape.add_argument("--replay", metavar="CASSETTE",
+                      help="Answer LLM and tool calls from a recording: offline, no API keys needed")
+    parser.add_argument("--zero-latency", action="store_true",
+                        help="With --replay, skip the recorded call durations")
+    args = parser.parse_args(argv)
+
+    if args.zero_latency and not args.replay:
+        parser.error("--zero-latency only applies to --replay")
+    if args.queue is not None and (args.record or args.replay):
+        # Workers call the LLMs in their own processes, out of the cassette's reach
+        parser.error("--record/--replay can't be combined with --queue")
+
+    if args.headless:
+        ui.configure(headless=True)
+
+    try:
+        _run_workflow(args)
+    finally:
+        # Draw everything still queued before the process exits
+        ui.shutdown()
+
+def _run_workflow(args):
+    # 1. Welcome Banner
+    ui.print_welcome()
+
+    # 2. Determine path
+    input_path = args.config
+    final_config_path = _find_config(input_path)
 
     if not final_config_path:
         ui.print_error(f"Could not find configuration file: '{input_path}'")
@@ -34,26 +77,276 @@ def main():
 
     # 3. Parse Config
     try:
-        ui.console.print(f"[dim]Loading configuration from: {final_config_path}...[/dim]")
+        ui.info(f"Loading configuration from: {final_config_path}...", style="dim")
         config = ConfigParser.load_config(final_config_path)
-        ui.console.print("[bold green]✅ Configuration Loaded![/bold green]")
+        ui.info("✅ Configuration Loaded!", style="bold green")
     except Exception as e:
         ui.print_error(f"Configuration Error: {e}")
         return
 
+    # Keep the audit log bounded (LOG_RETENTION_DAYS / LOG_MAX_ROWS) while we run
+    db.start_log_maintenance()
+
+    # Distributed mode: agents are executed by `main.py worker` processes
+    dispatcher = None
+    if args.queue is not None:
+        dispatcher = QueueDispatcher(open_queue(args.queue or None))
+
+    # Record / replay: every LLM and tool call goes through the cassette
+    tape = None
+    try:
+        if args.record:
+            tape = Cassette.record(args.record, config=final_config_path)
+        elif args.replay:
+            tape = Cassette.replay(args.replay, realtime=not args.zero_latency)
+    except (OSError, ValueError) as e:
+        ui.print_error(f"Cassette Error: {e}")
+        return
+
     # 4. Run Workflow
     try:
-        orchestrator = Orchestrator(config)
-        final_result = orchestrator.run()
-        
-        ui.console.print("\n[bold green]🎉 Workflow Completed Successfully![/bold green]")
-        # FIX: Correct way to print a Panel in Rich
-        ui.console.print(Panel(final_result, title="Final Output", border_style="green"))
-        
+        orchestrator = Orchestrator(config, dispatcher=dispatcher)
+        with use_cassette(tape) if tape else nullcontext():
+            final_result = orchestrator.run()
+
+        ui.info("\n🎉 Workflow Completed Successfully!", style="bold green")
+        ui.print_result(final_result, title="Final Output")
+
+        # Tool executor metrics (calls, queue depth, latency) for the audit log
+        tool_metrics = ToolRegistry.metrics()
+        if tool_metrics:
+            db.log_event("tools", "tool_metrics", json.dumps(tool_metrics), run_id=orchestrator.run_id)
+
     except Exception as e:
         ui.print_error(f"Runtime Error: {e}")
         import traceback
+        ui.flush()
         traceback.print_exc()
+    finally:
+        if dispatcher is not None:
+            dispatcher.shutdown()
+        if tape is not None:
+            ui.info(tape.summary(), style="dim")
+
+def _parse_time(value: str) -> datetime:
+    """Accepts a relative age ('30m', '2h', '7d') or an ISO date/time."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([mhd])', value.strip().lower())
+    if match:
+        unit = {'m': 'minutes', 'h': 'hours', 'd': 'days'}[match.group(2)]
+        return datetime.now() - timedelta(**{unit: float(match.group(1))})
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an age like '2h' / '7d' or an ISO date, got '{value}'")
+
+def show_logs(argv):
+    """`main.py logs`: streams matching audit log rows straight from a database cursor."""
+    parser = argparse.ArgumentParser(prog="main.py logs", description="Query the audit log.")
+    parser.add_argument("--run", help="Only this run id")
+    parser.add_argument("--agent", help="Only this agent id")
+    parser.add_argument("--action", help="Only this action (e.g. tool_use, agent_response)")
+    parser.add_argument("--since", type=_parse_time, help="Age like '2h' / '7d' or an ISO date")
+    parser.add_argument("--until", type=_parse_time, help="Age like '2h' / '7d' or an ISO date")
+    parser.add_argument("--limit", type=int, default=100, help="Maximum rows (0 = no limit)")
+    parser.add_argument("--newest", action="store_true", help="Newest rows first")
+    parser.add_argument("--full", action="store_true", help="Don't truncate long details")
+    parser.add_argument("--json", action="store_true", help="One JSON object per line")
+    parser.add_argument("--prune", action="store_true",
+                        help="Apply LOG_RETENTION_DAYS / LOG_MAX_ROWS now and exit")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Compact the database file with a full VACUUM and exit (blocks other writers; "
+                             "run it while no workflow is running)")
+    args = parser.parse_args(argv)
+
+    if args.vacuum:
+        db.vacuum(full=True)
+        print("🧹 Database compacted (incremental auto-vacuum is enabled from now on).")
+        return
+
+    if args.prune:
+        deleted = db.prune_logs(
+            max_age_days=float(os.getenv("LOG_RETENTION_DAYS", "30") or 0),
+            max_rows=int(os.getenv("LOG_MAX_ROWS", "1000000") or 0)
+        )
+        print(f"🧹 Pruned {deleted} log rows.")
+        return
+
+    rows = db.iter_logs(
+        run_id=args.run, agent_id=args.agent, action=args.action,
+        since=args.since, until=args.until, limit=args.limit or None,
+        newest_first=args.newest,
+        # Large details live compressed in the blob store; a preview only needs their start
+        details_chars=None if args.full else 201
+    )
+    for log_id, timestamp, run_id, agent_id, action, details in rows:
+        details = details or ""
+        if not args.full and len(details) > 200:
+            details = details[:200] + "..."
+        if args.json:
+            print(json.dumps({
+                "id": log_id, "timestamp": str(timestamp), "run_id": run_id,
+                "agent_id": agent_id, "action": action, "details": details
+            }))
+        else:
+            print(f"{timestamp}  {run_id or '-':12}  {agent_id or '-':16}  {action:16}  {details}")
+
+def show_cascade(argv):
+    """`main.py cascade`: per-tier hit rates of model cascades, for tuning them."""
+    parser = argparse.ArgumentParser(prog="main.py cascade", description="Show model cascade hit rates.")
+    parser.add_argument("--agent", help="Only this agent id")
+    parser.add_argument("--json", action="store_true", help="One JSON object per line")
+    parser.add_argument("--reset", action="store_true", help="Forget the recorded outcomes")
+    args = parser.parse_args(argv)
+
+    if args.reset:
+        db.reset_cascade_stats(args.agent)
+        print("🧹 Cascade stats cleared.")
+        return
+
+    rows = db.cascade_stats(args.agent)
+    if not rows:
+        print("No cascade runs recorded yet.")
+        return
+
+    # Runs per agent = attempts at tier 0; "answered" is the share of runs a tier ended
+    runs = {}
+    for agent_id, tier, _, attempts, _, _ in rows:
+        if tier == 0:
+            runs[agent_id] = runs.get(agent_id, 0) + attempts
+
+    if not args.json:
+        print(f"{'agent':16}  {'tier':>4}  {'model':36}  {'tries':>6}  {'hit rate':>8}  {'answered':>8}  {'avg s':>6}")
+    for agent_id, tier, model, attempts, accepted, seconds in rows:
+        hit_rate = accepted / attempts if attempts else 0.0
+        answered = accepted / runs[agent_id] if runs.get(agent_id) else 0.0
+        avg = seconds / attempts if attempts else 0.0
+        if args.json:
+            print(json.dumps({
+                "agent_id": agent_id, "tier": tier + 1, "model": model, "attempts": attempts,
+                "accepted": accepted, "hit_rate": round(hit_rate, 3),
+                "answered_share": round(answered, 3), "avg_seconds": round(avg, 3)
+            }))
+        else:
+            print(f"{agent_id:16}  {tier + 1:>4}  {model:36}  {attempts:>6}  {hit_rate:>8.0%}  {answered:>8.0%}  {avg:>6.2f}")
+
+def export_history(argv):
+    """`main.py export`: writes logs, spans and LLM usage as date-partitioned columnar files."""
+    from src.interface.export import export_tables
+
+    tables = list(db.EXPORT_TABLES)
+    parser = argparse.ArgumentParser(prog="main.py export", description="Export run history for offline analysis.")
+    parser.add_argument("--out", default="exports", help="Output directory (default: exports)")
+    parser.add_argument("--tables", default=",".join(tables), help=f"Comma-separated subset of {', '.join(tables)}")
+    parser.add_argument("--since", type=_parse_time, help="Age like '2h' / '7d' or an ISO date")
+    parser.add_argument("--until", type=_parse_time, help="Age like '2h' / '7d' or an ISO date")
+    parser.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto",
+                        help="Parquet needs pyarrow; auto falls back to gzip CSV")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows read from SQLite at a time")
+    parser.add_argument("--compression", default="zstd", help="Parquet codec (zstd, snappy, gzip, ...)")
+    args = parser.parse_args(argv)
+
+    selected = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = [t for t in selected if t not in tables]
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(unknown)}")
+
+    try:
+        summary = export_tables(
+            db, args.out, selected, since=args.since, until=args.until,
+            fmt=args.format, chunk_size=args.chunk_size, compression=args.compression
+        )
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for table, (rows, files) in summary.items():
+        print(f"📦 {table:6} {rows:>10} rows → {len(files)} file(s) in {os.path.join(args.out, table)}")
+
+def estimate_workflow(argv):
+    """`main.py estimate`: predicted calls, tokens, time and cost of a config, without running it."""
+    from dataclasses import asdict
+    from src.engine.estimator import WorkflowEstimator
+
+    parser = argparse.ArgumentParser(prog="main.py estimate",
+                                     description="Estimate a workflow's cost and latency from past runs.")
+    parser.add_argument("config", nargs="?", default="config.yaml", help="Workflow YAML file")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object")
+    args = parser.parse_args(argv)
+
+    path = _find_config(args.config)
+    if not path:
+        print(f"❌ Could not find configuration file: '{args.config}'")
+        sys.exit(1)
+    try:
+        config = ConfigParser.load_config(path)
+    except Exception as e:
+        print(f"❌ Configuration Error: {e}")
+        sys.exit(1)
+
+    estimator = WorkflowEstimator(config)
+    total = estimator.estimate()
+    warnings = estimator.warnings()
+    rows = sorted(estimator.rows.values(), key=lambda r: -r.cost)
+
+    if args.json:
+        summary = {k: v for k, v in asdict(total).items() if k != "output_chars"}
+        print(json.dumps({"total": summary, "agents": [asdict(r) for r in rows],
+                          "warnings": warnings, "notes": estimator.notes}))
+        return
+
+    print(f"🧮 Estimate for {path} ({config.workflow.type})\n")
+    print(f"{'agent':16}  {'model':28}  {'runs':>5}  {'calls':>6}  {'prompt tok':>10}  {'compl tok':>9}  {'seconds':>7}  {'cost $':>8}  based on")
+    for r in rows:
+        print(f"{r.agent:16}  {r.model:28}  {r.runs:>5.1f}  {r.calls:>6.1f}  {r.prompt_tokens:>10.0f}  "
+              f"{r.completion_tokens:>9.0f}  {r.seconds:>7.1f}  {r.cost:>8.4f}  {r.source}")
+    print(f"\n📞 LLM calls:      {total.calls:.1f} expected, up to {total.max_calls}")
+    print(f"🔤 Tokens:         {total.prompt_tokens:,.0f} prompt + {total.completion_tokens:,.0f} completion")
+    print(f"⏱️  Wall time:      ~{total.seconds:.1f}s along the critical path")
+    print(f"💰 Cost:           ~${total.cost:.4f}")
+    print(f"🛤️  Critical path:  {' -> '.join(total.path) or '(empty)'}")
+    for note in estimator.notes:
+        print(f"ℹ️  {note}")
+    if warnings:
+        print("\n⚠️  Possible waste:")
+        for warning in warnings:
+            print(f"  - {warning}")
+
+def run_worker(argv):
+    """`main.py worker`: claims agent tasks from the shared queue until stopped."""
+    parser = argparse.ArgumentParser(prog="main.py worker", description="Run agent tasks from the task queue.")
+    parser.add_argument("--queue", default=None, metavar="URL",
+                        help="sqlite:///path.db or redis://host:6379/0 (default: TASK_QUEUE_URL or the orchestrator database)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "4")),
+                        help="Agent tasks to run at once")
+    parser.add_argument("--lease", type=float, default=float(os.getenv("TASK_LEASE_SECONDS", "60")),
+                        help="Seconds a claimed task stays leased without a heartbeat")
+    parser.add_argument("--id", dest="worker_id", default=None, help="Worker name (default: host-pid)")
+    parser.add_argument("--headless", action="store_true", help="Emit JSON lines instead of Rich output")
+    args = parser.parse_args(argv)
+
+    if args.headless:
+        ui.configure(headless=True)
+    try:
+        Worker(open_queue(args.queue), worker_id=args.worker_id,
+               concurrency=args.concurrency, lease_seconds=args.lease).run_forever()
+    finally:
+        ui.shutdown()
+
+# Sub-commands; anything else is treated as a workflow config path
+COMMANDS = {
+    "logs": show_logs,
+    "cascade": show_cascade,
+    "export": export_history,
+    "estimate": estimate_workflow,
+    "worker": run_worker,
+}
+
+def main():
+    argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+    else:
+        run_workflow(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,96 +1,352 @@
+import dataclasses
 import json
-import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from src.schema import AgentConfig
-from src.engine.llm import llm_client
+from src.engine.llm import llm_client, supports_function_calling
+from src.engine.cascade import CONFIDENCE_INSTRUCTION, check_answer, split_confidence
+from src.engine.jsonscan import find_json
+from src.engine.recall import render_memories, select_memories
 from src.interface.tools import ToolRegistry
 from src.interface.console import ui
 from src.interface.database import db
+from src.interface.context import agent_scope
+from src.interface import cassette
+
+class AgentCancelled(Exception):
+    """Raised inside a worker when the Orchestrator no longer needs its answer."""
+
+
+class AgentTimeout(AgentCancelled):
+    """Raised when an agent runs past its deadline."""
+
 
 class AgentRunner:
+    # Compiled system prompts, keyed by everything that goes into them, so runs
+    # (and queue workers) sharing an agent id but not its config never mix them up
+    _system_prompts: "OrderedDict[Tuple, str]" = OrderedDict()
+    _prompt_lock = threading.Lock()
+    MAX_CACHED_PROMPTS = 512
+
+    @classmethod
+    def build_system_prompt(cls, agent: AgentConfig, native_tools: bool = False) -> str:
+        """
+        Compiles the static system prompt for an agent.
+        The prompt only depends on the agent's config (never on the task), and is
+        built once so it stays byte-identical between calls. That lets
+        providers with prompt caching reuse the prefix.
+        With native function calling the tool list travels in `tools=`, so the
+        text-JSON rules are left out.
+        """
+        tool_names = cls._agent_tools(agent)
+        confidence = bool(agent.cascade and "confidence" in agent.cascade.checks)
+        key = (agent.role, agent.goal, agent.instructions, tuple(tool_names), native_tools, confidence)
+        with cls._prompt_lock:
+            cached = cls._system_prompts.get(key)
+            if cached is not None:
+                cls._system_prompts.move_to_end(key)
+                return cached
+
+
+            lines = [f"You are {agent.role}. Your goal: {agent.goal}."]
+            if agent.instructions:
+                lines.append(f"Instructions: {agent.instructions}")
+
+            if tool_names and not native_tools:
+                # We explicitly tell Llama 3.2 how to format tool calls
+                lines.append(f"Available Tools: {json.dumps(tool_names)}")
+                lines.append(
+                    "CRITICAL RULES:\n"
+                    "1. If you need to use a tool, output ONLY a JSON object like this:\n"
+                    '   {"tool": "tool_name", "args": {"arg_name": "value"}}\n'
+                    "2. If you do NOT need a tool, just answer normally.\n"
+                    "3. Do not add markdown like ```json```."
+                )
+
+            if confidence:
+                lines.append(CONFIDENCE_INSTRUCTION)
+
+            prompt = "\n".join(lines)
+            cls._system_prompts[key] = prompt
+            if len(cls._system_prompts) > cls.MAX_CACHED_PROMPTS:
+                cls._system_prompts.popitem(last=False)  # Least recently used
+            return prompt
+
     @staticmethod
-    def run(agent: AgentConfig, context: str, task_input: str) -> str:
+    def _agent_tools(agent: AgentConfig) -> List[str]:
+        """The agent's declared tools that actually exist in the registry."""
+        registered = set(ToolRegistry.list_tools())
+        return [t for t in agent.tools if t in registered]
+
+    @classmethod
+    def _use_native_tools(cls, agent: AgentConfig) -> bool:
+        """
+        Decides between native function calling and the text-JSON fallback.
+        'auto' picks native whenever LiteLLM says the model supports it.
+        """
+        if not cls._agent_tools(agent) or agent.tool_mode == "text":
+            return False
+        if agent.tool_mode == "native":
+            return True
+        return supports_function_calling(agent.model)
+
+    @classmethod
+    def run(cls, agent: AgentConfig, context: str, task_input: str,
+            cancel_event: Optional[threading.Event] = None,
+            deadline: Optional[float] = None) -> str:
         """
         Executes a single agent's task.
         It allows the agent to use ONE tool step before giving a final answer.
+        If `cancel_event` gets set (e.g. another branch won a race), the agent
+        stops at the next step boundary instead of making further calls.
+        `deadline` is an absolute time.monotonic() value; each LLM call only
+        gets the time that is left, so a hung provider can't block forever.
         """
-        
-        # 1. SETUP: Build the System Prompt
-        # We explicitly tell Llama 3.2 how to format tool calls
-        tool_names = list(ToolRegistry.list_tools())
-        
-        system_prompt = (
-            f"You are {agent.role}. Your goal: {agent.goal}.\n"
-            f"Instructions: {agent.instructions}\n"
-            f"Available Tools: {json.dumps(tool_names)}\n"
-            "CRITICAL RULES:\n"
-            "1. If you need to use a tool, output ONLY a JSON object like this:\n"
-            '   {"tool": "tool_name", "args": {"arg_name": "value"}}\n'
-            "2. If you do NOT need a tool, just answer normally.\n"
-            "3. Do not add markdown like ```json```."
-        )
-        
+        cls._check_cancelled(agent, cancel_event, deadline)
+
+        # 1. SETUP: per-task user message (the system prompt depends on the model tier)
         user_msg = f"Context: {context}\nCurrent Task: {task_input}"
 
         # 2. THINKING: Call the Brain
         ui.log_agent_start(agent.id, agent.role)
-        
+        started = time.monotonic()
+        started_at = datetime.now()
+
+        # Tools called from here on see this agent as the caller (agent-scoped memory)
+        status, final_response = "error", ""
+        try:
+            with agent_scope(agent.id):
+                if agent.recall:
+                    user_msg = cls._recall_memory(agent, context, task_input) or user_msg
+                if agent.cascade:
+                    final_response = cls._run_cascade(agent, user_msg, cancel_event, deadline)
+                else:
+                    final_response = cls._run_once(agent, user_msg, cancel_event, deadline)
+            status = "error" if final_response.startswith("❌ LLM Error") else "ok"
+        except AgentTimeout:
+            status = "timeout"
+            raise
+        except AgentCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            cls._record_span("agent", agent.id, started_at, (time.monotonic() - started) * 1000, status,
+                             input_chars=len(user_msg), output_chars=len(final_response), agent_id=agent.id)
+
+        db.log_event(agent.id, "agent_response", final_response)
+        ui.stream_output(agent.id, final_response)
+        ui.log_agent_completion(agent.id, time.monotonic() - started)
+        return final_response
+
+    @staticmethod
+    def _recall_memory(agent: AgentConfig, context: str, task_input: str) -> Optional[str]:
+        """
+        Retrieval before the first call: relevant memory entries go into the
+        user message (never the system prompt, which must stay cacheable), so
+        an agent that only needs a fact doesn't spend a tool round trip on it.
+        Returns the new user message, or None if nothing relevant was found.
+        """
+        try:
+            selected = select_memories(agent, task_input)
+        except Exception as e:
+            # Recall is an optimisation; the agent can still use read_memory
+            ui.print_error(f"Memory recall failed for '{agent.id}': {e}")
+            return None
+        if not selected:
+            return None
+        keys = [key for _, key, _ in selected]
+        db.log_event(agent.id, "memory_recall", json.dumps(keys))
+        ui.info(f"  🧠 {agent.id}: recalled {', '.join(keys)}", style="dim")
+        return f"Context: {context}\n{render_memories(selected)}\nCurrent Task: {task_input}"
+
+    @classmethod
+    def _run_once(cls, agent: AgentConfig, user_msg: str,
+                  cancel_event: Optional[threading.Event], deadline: Optional[float]) -> str:
+        """One full attempt (including the tool step) with the agent's model."""
+        native = cls._use_native_tools(agent)
+        messages = [
+            {"role": "system", "content": cls.build_system_prompt(agent, native_tools=native)},
+            {"role": "user", "content": user_msg}
+        ]
+        if native:
+            return cls._run_native(agent, messages, cancel_event, deadline)
+        return cls._run_text(agent, messages, cancel_event, deadline)
+
+    @classmethod
+    def _run_cascade(cls, agent: AgentConfig, user_msg: str,
+                     cancel_event: Optional[threading.Event], deadline: Optional[float]) -> str:
+        """
+        Tries the cascade's models cheapest first and keeps the first answer
+        that passes its checks. The last tier's answer is used as is.
+        Each tier is recorded in cascade_stats so hit rates can be tuned.
+        """
+        cascade = agent.cascade
+        answer = ""
+        last_tier = len(cascade.models) - 1
+        for tier, model in enumerate(cascade.models):
+            tier_agent = dataclasses.replace(agent, model=model)
+            started = time.monotonic()
+            try:
+                output = cls._run_once(tier_agent, user_msg, cancel_event, deadline)
+            except AgentTimeout:
+                # Out of time while escalating: the cheaper answer beats none
+                if tier > 0:
+                    ui.log_agent_status(agent.id, f"⏱ tier {tier + 1} timed out")
+                    return answer
+                raise
+
+            if tier == last_tier:
+                # Nothing left to escalate to, so don't pay for checks
+                passed, reason = True, "final tier"
+                answer = split_confidence(output)[0] if "confidence" in cascade.checks else output
+            else:
+                passed, reason, answer = check_answer(
+                    cascade, agent, user_msg, output, timeout=cls._time_left(deadline)
+                )
+            if not cassette.replaying():
+                db.record_cascade(agent.id, tier, model, passed, time.monotonic() - started)
+
+            if passed:
+                db.log_event(agent.id, "cascade", f"tier {tier + 1} ({model}) answered: {reason}")
+                return answer
+
+            db.log_event(agent.id, "cascade", f"tier {tier + 1} ({model}) escalated: {reason}")
+            ui.info(f"  ⤴ {agent.id}: {model} → {cascade.models[tier + 1]} ({reason})", style="warning")
+            cls._check_cancelled(agent, cancel_event, deadline)
+        return answer
+
+    @classmethod
+    def _run_native(cls, agent: AgentConfig, messages: List[Dict[str, Any]],
+                    cancel_event: Optional[threading.Event], deadline: Optional[float]) -> str:
+        """Tool use through the provider's function-calling API."""
+        tools = ToolRegistry.get_schemas(cls._agent_tools(agent))
+
+        reply = llm_client.chat_with_tools(
+            messages, tools, model=agent.model, timeout=cls._time_left(deadline)
+        )
+        cls._check_cancelled(agent, cancel_event, deadline)
+
+        if not reply.tool_calls:
+            return reply.content
+
+        # 3. TOOL STEP: run every call the model asked for in this turn
+        messages.append(reply.as_message())
+        for call in reply.tool_calls:
+            tool_result = cls._execute_tool(agent, call.name, call.arguments, deadline)
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call.id,
+                "name": call.name,
+                "content": str(tool_result)
+            })
+
+        # 4. FINAL SYNTHESIS: same conversation, but no further tool calls allowed
+        cls._check_cancelled(agent, cancel_event, deadline)
+        final = llm_client.chat_with_tools(
+            messages, tools, model=agent.model, timeout=cls._time_left(deadline),
+            tool_choice="none"
+        )
+        return final.content
+
+    @classmethod
+    def _run_text(cls, agent: AgentConfig, messages: List[Dict[str, Any]],
+                  cancel_event: Optional[threading.Event], deadline: Optional[float]) -> str:
+        """Fallback for models without function calling: the model prints a JSON tool call."""
         # Use the model specified in the agent's YAML config
-        model_to_use = agent.model 
-        
-        response = llm_client.call(system_prompt, user_msg, model=model_to_use)
+        model_to_use = agent.model
+
+        response = llm_client.chat(messages, model=model_to_use, timeout=cls._time_left(deadline))
 
         # 3. DETECT TOOL USAGE
-        # We look for a JSON pattern in the response
-        tool_call = AgentRunner._extract_json(response)
-
-        if tool_call:
-            # The agent wants to use a tool!
-            t_name = tool_call.get("tool")
-            t_args = tool_call.get("args", {})
-            
-            ui.log_tool_use(t_name, str(t_args))
-            
-            # Execute the tool
+        # We look for a JSON tool call in the response
+        tool_call = AgentRunner._extract_json(response) if cls._agent_tools(agent) else None
+
+        cls._check_cancelled(agent, cancel_event, deadline)
+
+        if not tool_call:
+            # No tool used, just return the answer
+            return response
+
+        # The agent wants to use a tool!
+        t_args = tool_call.get("args") or {}
+        tool_result = cls._execute_tool(agent, tool_call.get("tool"), t_args, deadline)
+
+        # 4. FINAL SYNTHESIS: Feed the tool result back to the brain.
+        # Appending to the same conversation keeps the whole first turn as a cacheable prefix.
+        final_prompt = (
+            f"Tool Output: {tool_result}\n"
+            "Based on this output, give a final concise answer."
+        )
+        cls._check_cancelled(agent, cancel_event, deadline)
+        messages += [
+            {"role": "assistant", "content": response},
+            {"role": "user", "content": final_prompt}
+        ]
+        return llm_client.chat(messages, model=model_to_use, timeout=cls._time_left(deadline))
+
+    @classmethod
+    def _execute_tool(cls, agent: AgentConfig, t_name: str, t_args: Dict[str, Any],
+                      deadline: Optional[float] = None) -> Any:
+        """
+        Runs one tool call (only if this agent was actually given the tool).
+        The tool gets at most the time left before the agent's deadline.
+        """
+        ui.log_tool_use(t_name, str(t_args))
+        db.log_event(agent.id, "tool_use", f"Tool: {t_name}, Input: {t_args}")
+        started = time.monotonic()
+        started_at = datetime.now()
+
+        if t_name not in agent.tools:
+            tool_result = f"Tool Error: '{t_name}' is not available to agent '{agent.id}'."
+        elif not isinstance(t_args, dict):
+            tool_result = f"Tool Error: arguments for '{t_name}' must be an object."
+        else:
             try:
-                tool_result = ToolRegistry.execute(t_name, **t_args)
+                tool_result = ToolRegistry.run(t_name, t_args, timeout=cls._time_left(deadline))
             except Exception as e:
                 tool_result = f"Tool Error: {e}"
-                
-            ui.log_tool_result(str(tool_result))
-            
-            # 4. FINAL SYNTHESIS: Feed the tool result back to the brain
-            final_prompt = (
-                f"Original Task: {task_input}\n"
-                f"Tool Output: {tool_result}\n"
-                "Based on this output, give a final concise answer."
-            )
-            final_response = llm_client.call(system_prompt, final_prompt, model=model_to_use)
-            
-            ui.stream_output(agent.id, final_response)
-            return final_response
-            
-        else:
-            # No tool used, just return the answer
-            ui.stream_output(agent.id, response)
-            return response
+
+        failed = str(tool_result).startswith(("Tool Error", "Error executing tool"))
+        cls._record_span("tool", t_name, started_at, (time.monotonic() - started) * 1000,
+                         "error" if failed else "ok", input_chars=len(str(t_args)),
+                         output_chars=len(str(tool_result)), agent_id=agent.id)
+        db.log_event(agent.id, "tool_result", str(tool_result))
+        ui.log_tool_result(str(tool_result), t_name)
+        return tool_result
+
+    @staticmethod
+    def _record_span(kind: str, name: str, started_at: datetime, duration_ms: float, status: str, **fields):
+        if cassette.replaying():
+            return  # Replayed runs stay out of the timing history
+        try:
+            db.record_span(kind, name, started_at, duration_ms, status, **fields)
+        except Exception as e:
+            # Metrics must never break an agent run (or hide the error it raised)
+            ui.print_error(f"Could not record {kind} span: {e}")
+
+    @staticmethod
+    def _check_cancelled(agent: AgentConfig, cancel_event: Optional[threading.Event],
+                         deadline: Optional[float] = None):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise AgentTimeout(f"Agent '{agent.id}' missed its deadline.")
+        if cancel_event is not None and cancel_event.is_set():
+            raise AgentCancelled(f"Agent '{agent.id}' was cancelled.")
+
+    @staticmethod
+    def _time_left(deadline: Optional[float]) -> Optional[float]:
+        """Seconds until `deadline`, used as the per-request timeout."""
+        if deadline is None:
+            return None
+        return max(1.0, deadline - time.monotonic())
 
     @staticmethod
     def _extract_json(text: str):
         """
-        Helper to find JSON inside a potentially messy LLM response.
+        Helper to find a JSON tool call inside a potentially messy LLM response.
+        Only objects with a "tool" key count, so ordinary answers that happen
+        to contain braces are left alone.
         """
-        try:
-            # Attempt 1: Direct parse
-            return json.loads(text)
-        except:
-            pass
-        
-        try:
-            # Attempt 2: Find the first { and last }
-            match = re.search(r'\{.*\}', text, re.DOTALL)
-            if match:
-                return json.loads(match.group(0))
-        except:
-            pass
-            
-        return None
\ No newline at end of file
+        return find_json(text, lambda value: isinstance(value, dict) and bool(value.get("tool")), openers="{")
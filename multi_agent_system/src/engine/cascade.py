@@ -0,0 +1,91 @@
+import re
+from typing import Optional, Tuple
+from src.schema import AgentConfig, CascadeConfig
+from src.engine.llm import llm_client
+from src.engine.jsonscan import parse_json_answer
+
+# Appended to the system prompt when the cascade checks self-reported confidence
+CONFIDENCE_INSTRUCTION = (
+    "After your answer, add a last line 'Confidence: <number from 0 to 1>' "
+    "saying how sure you are that the answer is complete and correct."
+)
+
+_CONFIDENCE_LINE = re.compile(r'^[\s*_>]*confidence\s*[:=]\s*(\d+(?:\.\d+)?)\s*(%?)[\s*_.]*$',
+                              re.IGNORECASE | re.MULTILINE)
+
+# How much of the task the verifier gets to see
+VERIFIER_MAX_INPUT = 4000
+
+
+def split_confidence(output: str) -> Tuple[str, Optional[float]]:
+    """
+    Pulls the 'Confidence: 0.8' line out of an answer.
+    Returns (answer without that line, confidence or None if none was reported).
+    """
+    matches = list(_CONFIDENCE_LINE.finditer(output))
+    if not matches:
+        return output, None
+    last = matches[-1]
+    value = float(last.group(1))
+    if last.group(2) or value > 1:
+        value /= 100
+    answer = (output[:last.start()] + output[last.end():]).strip()
+    return answer, value
+
+
+def verify(cascade: CascadeConfig, agent: AgentConfig, task: str, answer: str,
+           timeout: Optional[float] = None) -> Tuple[bool, str]:
+    """One call to the verifier model: PASS keeps the answer, anything else escalates."""
+    messages = [
+        {"role": "system", "content": (
+            "You are a strict reviewer. Decide whether the answer fully and correctly completes the task.\n"
+            "Reply with PASS or FAIL, followed by one short reason."
+        )},
+        {"role": "user", "content": (
+            f"Agent: {agent.role}. Goal: {agent.goal}.\n"
+            f"Task:\n{task[-VERIFIER_MAX_INPUT:]}\n\n"
+            f"Answer:\n{answer}"
+        )}
+    ]
+    reply = llm_client.chat(messages, model=cascade.verifier or cascade.models[0], timeout=timeout)
+    verdict = reply.strip().lstrip("*_#` ").upper()
+    if verdict.startswith("PASS"):
+        return True, "verifier passed"
+    return False, f"verifier: {reply.strip()[:120]}"
+
+
+def check_answer(cascade: CascadeConfig, agent: AgentConfig, task: str, output: str,
+                 timeout: Optional[float] = None) -> Tuple[bool, str, str]:
+    """
+    Runs the configured checks in order (cheapest first, verifier last).
+    Returns (passed, reason, answer) where answer has the confidence line removed.
+    """
+    answer, confidence = split_confidence(output) if "confidence" in cascade.checks else (output, None)
+
+    # Errors and empty answers always escalate
+    if not answer.strip():
+        return False, "empty answer", answer
+    if answer.startswith("❌ LLM Error"):
+        return False, "model error", answer
+
+    if "json" in cascade.checks:
+        try:
+            parsed = parse_json_answer(answer)
+        except ValueError:
+            return False, "invalid JSON", answer
+        missing = [k for k in cascade.json_keys if not isinstance(parsed, dict) or k not in parsed]
+        if missing:
+            return False, f"JSON missing {', '.join(missing)}", answer
+
+    if "confidence" in cascade.checks:
+        if confidence is None:
+            return False, "no confidence reported", answer
+        if confidence < cascade.min_confidence:
+            return False, f"confidence {confidence:.2f} < {cascade.min_confidence:.2f}", answer
+
+    if "verifier" in cascade.checks:
+        passed, reason = verify(cascade, agent, task, answer, timeout=timeout)
+        if not passed:
+            return False, reason, answer
+
+    return True, "checks passed", answer
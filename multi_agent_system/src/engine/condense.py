@@ -0,0 +1,150 @@
+import hashlib
+import random
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+# Word shingles of this length describe an output's content
+SHINGLE_WORDS = 5
+
+# MinHash signature length, split into LSH bands of BAND_ROWS rows.
+# 16 bands x 4 rows makes outputs above ~50% similarity candidates; the
+# signatures then decide against the real threshold.
+NUM_PERM = 64
+BAND_ROWS = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: the same outputs always hash (and therefore group) the same way
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class OutputGroup:
+    """Branch outputs that say (nearly) the same thing, represented by the first of them."""
+    agents: List[str]
+    text: str
+    first: int  # Position of the representative in the input order
+
+    @property
+    def votes(self) -> int:
+        return len(self.agents)
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> Set[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def signature(shingle_set: Set[str]) -> Tuple[int, ...]:
+    """MinHash signature: per permutation, the smallest hash over all shingles."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+              for s in shingle_set]
+    if not hashes:
+        return tuple([_MAX_HASH] * NUM_PERM)
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def group_near_duplicates(outputs: List[Tuple[str, str]], threshold: float = 0.8) -> List[OutputGroup]:
+    """
+    Merges (agent id, output) pairs whose estimated similarity reaches `threshold`.
+    Candidates come from LSH buckets, so wide fan-outs don't compare every pair.
+    Groups are ordered by votes, then by where their first output appeared,
+    so the result doesn't depend on which branch finished first.
+    """
+    parent = list(range(len(outputs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int):
+        a, b = find(i), find(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    signatures = []
+    exact: Dict[str, int] = {}
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for i, (_, text) in enumerate(outputs):
+        # Identical text (ignoring case and spacing) is a duplicate without any hashing
+        normalized = " ".join(text.lower().split())
+        if normalized in exact:
+            union(exact[normalized], i)
+        else:
+            exact[normalized] = i
+        sig = signature(shingles(text))
+        signatures.append(sig)
+        if not normalized:
+            continue
+        for band in range(0, NUM_PERM, BAND_ROWS):
+            buckets.setdefault((band, sig[band:band + BAND_ROWS]), []).append(i)
+
+    checked = set()
+    for members in buckets.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                pair = (members[x], members[y])
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                if similarity(signatures[pair[0]], signatures[pair[1]]) >= threshold:
+                    union(*pair)
+
+    groups: Dict[int, OutputGroup] = {}
+    for i, (agent_id, text) in enumerate(outputs):
+        root = find(i)
+        if root not in groups:
+            # The root is the lowest index, so the earliest output represents the group
+            groups[root] = OutputGroup(agents=[], text=outputs[root][1], first=root)
+        groups[root].agents.append(agent_id)
+    return sorted(groups.values(), key=lambda g: (-g.votes, g.first))
+
+
+def render_groups(groups: List[OutputGroup]) -> List[str]:
+    """One entry per group, in the 'Agent x said: ...' form the aggregator is used to."""
+    entries = []
+    for group in groups:
+        if group.votes == 1:
+            entries.append(f"Agent {group.agents[0]} said: {group.text}")
+        else:
+            entries.append(f"Agents {', '.join(group.agents)} ({group.votes} votes, near-identical) said: {group.text}")
+    return entries
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text; good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def pack_entries(entries: List[str], max_tokens: int) -> List[List[str]]:
+    """Splits entries, in order, into batches of at most `max_tokens` (an oversized entry gets its own batch)."""
+    batches: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for entry in entries:
+        size = estimate_tokens(entry)
+        if current and used + size > max_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append(entry)
+        used += size
+    if current:
+        batches.append(current)
+    return batches
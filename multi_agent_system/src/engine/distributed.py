@@ -0,0 +1,195 @@
+import concurrent.futures
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from typing import Dict, Optional, Tuple
+from src.schema import AgentConfig, CascadeConfig, RecallConfig
+from src.engine.agent_runner import AgentRunner, AgentCancelled
+from src.engine.task_queue import AgentTask, TaskQueue
+from src.interface.console import ui
+from src.interface.context import get_run_id, run_scope
+
+# How often the coordinator deletes finished tasks older than TASK_RESULT_TTL
+PRUNE_INTERVAL = 600.0
+
+
+class QueueDispatcher:
+    """
+    Coordinator side of distributed mode.
+    Instead of running agents on a local thread, the Orchestrator hands them
+    to `submit()`, which enqueues a task and returns a Future. A background
+    poller resolves futures as workers post results, re-queues tasks whose
+    lease expired, and cancels tasks whose future was cancelled.
+    """
+
+    def __init__(self, queue: TaskQueue, poll_interval: float = 0.5,
+                 max_attempts: Optional[int] = None):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts or int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+        # task id -> (future, agent id, run id)
+        self._pending: Dict[str, Tuple[concurrent.futures.Future, str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_prune = 0.0
+        self._poller = threading.Thread(target=self._poll_loop, name="queue-poller", daemon=True)
+        self._poller.start()
+
+    def submit(self, agent: AgentConfig, context: str, task_input: str,
+               deadline: Optional[float] = None) -> concurrent.futures.Future:
+        """Enqueues one agent run. `deadline` is a time.monotonic() value, like in AgentRunner."""
+        wall_deadline = time.time() + (deadline - time.monotonic()) if deadline else None
+        task = AgentTask(
+            agent=asdict(agent), context=context, task_input=task_input,
+            run_id=get_run_id(), deadline=wall_deadline, max_attempts=self.max_attempts
+        )
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            self._pending[task.id] = (future, agent.id, task.run_id)
+        self.queue.enqueue(task)
+        ui.info(f"📤 Queued {agent.id} (task {task.id[:8]})", style="dim")
+        return future
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._poll_once()
+            except Exception as e:
+                ui.print_error(f"Task queue poll failed: {e}")
+
+    def _poll_once(self):
+        # Finished tasks are only needed until their results are collected
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            self.queue.prune_finished()
+
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return
+
+        # Futures the Orchestrator gave up on (race lost, deadline passed)
+        for task_id, (future, _, _) in pending.items():
+            if future.cancelled():
+                self.queue.cancel(task_id)
+                with self._lock:
+                    self._pending.pop(task_id, None)
+
+        requeued, given_up = self.queue.requeue_expired()
+        if requeued:
+            ui.info(f"🔁 Re-queued {requeued} task(s) whose worker stopped responding", style="warning")
+
+        for task_id, outcome in self.queue.results(list(pending)).items():
+            with self._lock:
+                future, agent_id, run_id = self._pending.pop(task_id, (None, None, None))
+            if future is None or future.done():
+                continue
+            if outcome.status == "done":
+                # The poller is shared by all runs, so tag the event with the task's run
+                with run_scope(run_id):
+                    ui.stream_output(f"{agent_id} @ {outcome.worker_id}", outcome.result or "")
+                future.set_result(outcome.result or "")
+            elif outcome.status == "cancelled":
+                future.set_exception(AgentCancelled(f"Task {task_id[:8]} was cancelled."))
+            else:
+                future.set_exception(RuntimeError(outcome.error or "Worker failed"))
+
+    def shutdown(self):
+        """Stops polling and cancels whatever is still queued or running."""
+        self._stop.set()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for task_id, (future, _, _) in pending.items():
+            self.queue.cancel(task_id)
+            future.cancel()
+
+
+class Worker:
+    """
+    Worker side of distributed mode (`python main.py worker`).
+    Claims agent tasks from the queue, runs them with AgentRunner and posts
+    the results back, heart-beating the lease while the agent works.
+    """
+
+    def __init__(self, queue: TaskQueue, worker_id: Optional[str] = None,
+                 concurrency: int = 4, lease_seconds: float = 60.0, idle_sleep: float = 0.5):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.idle_sleep = idle_sleep
+        self._slots = threading.Semaphore(concurrency)
+        self._active: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run_forever(self):
+        ui.info(f"👷 Worker {self.worker_id} ready ({self.concurrency} slots)", style="workflow")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)
+        heartbeat.start()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while not self._stop.is_set():
+                self._slots.acquire()
+                task = self.queue.claim(self.worker_id, self.lease_seconds)
+                if task is None:
+                    self._slots.release()
+                    self._stop.wait(self.idle_sleep)
+                    continue
+                cancel_event = threading.Event()
+                with self._lock:
+                    self._active[task.id] = cancel_event
+                pool.submit(self._run_task, task, cancel_event)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            pool.shutdown(wait=True)
+
+    def stop(self):
+        self._stop.set()
+
+    @staticmethod
+    def _agent_from_dict(data: Dict) -> AgentConfig:
+        """Rebuilds an AgentConfig from its queued form, nested options included."""
+        agent = AgentConfig(**data)
+        if isinstance(agent.cascade, dict):
+            agent.cascade = CascadeConfig(**agent.cascade)
+        if isinstance(agent.recall, dict):
+            agent.recall = RecallConfig(**agent.recall)
+        return agent
+
+    def _run_task(self, task: AgentTask, cancel_event: threading.Event):
+        try:
+            agent = self._agent_from_dict(task.agent)
+            deadline = time.monotonic() + (task.deadline - time.time()) if task.deadline else None
+            with run_scope(task.run_id or "distributed"):
+                result = AgentRunner.run(
+                    agent, context=task.context, task_input=task.task_input,
+                    cancel_event=cancel_event, deadline=deadline
+                )
+            self.queue.complete(task.id, self.worker_id, result=result)
+        except AgentCancelled as e:
+            self.queue.complete(task.id, self.worker_id, error=str(e), status="cancelled")
+        except Exception as e:
+            self.queue.complete(task.id, self.worker_id, error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(task.id, None)
+            self._slots.release()
+
+    def _heartbeat_loop(self):
+        # Renew well before the lease runs out; a refused renewal means the
+        # coordinator cancelled the task (or gave it to another worker).
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                active = dict(self._active)
+            for task_id, cancel_event in active.items():
+                try:
+                    if not self.queue.heartbeat(task_id, self.worker_id, self.lease_seconds):
+                        cancel_event.set()
+                except Exception as e:
+                    ui.print_error(f"Heartbeat for task {task_id[:8]} failed: {e}")
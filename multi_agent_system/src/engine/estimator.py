@@ -0,0 +1,505 @@
+import json
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from src.schema import AgentConfig, ForEach, OrchestrationConfig, WorkflowStep
+from src.engine.agent_runner import AgentRunner
+from src.engine.fanout import CHUNK_CHARS
+from src.engine.recall import keywords
+from src.engine.routing import CLASSIFIER_MAX_INPUT
+from src.interface.tools import ToolRegistry
+from src.interface.database import DatabaseHandler, db
+
+# Assumptions for models and agents without any recorded runs
+DEFAULT_LATENCY_S = 3.0
+DEFAULT_OUTPUT_CHARS = 1500
+DEFAULT_TOOL_RATE = 0.5  # Chance that an agent with tools makes its tool round trip
+DEFAULT_TOOL_OUTPUT_CHARS = 2000
+DEFAULT_TOOL_SECONDS = 1.0
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_ESCALATION = 0.5  # Chance that a cascade tier's answer is rejected
+
+# Fan-outs over the previous output can't be counted before the run
+ASSUMED_FOREACH_ITEMS = int(os.getenv("ESTIMATE_FOREACH_ITEMS", "10"))
+
+# Runs needed before "never used its tools" is worth a warning
+MIN_RUNS_FOR_WASTE = 3
+
+# Words that suggest an agent works on what the previous step produced
+_DEPENDENCY_CUES = re.compile(
+    r"\b(previous|above|earlier|draft|given|input|context|results?|outputs?|answers?|review|improve|edit|"
+    r"summari[sz]e|refine|check|critique|feedback|based on|polish|combine|aggregate|translate|rewrite|"
+    r"verify|approve|reject|fix|correct|provided|extracted|memory)\b",
+    re.IGNORECASE
+)
+
+_START_CONTEXT = "Start of workflow."
+
+
+@dataclass
+class Estimate:
+    """Expected cost of a piece of the workflow. `seconds` follows the critical path."""
+    calls: float = 0.0
+    max_calls: int = 0
+    prompt_tokens: float = 0.0
+    completion_tokens: float = 0.0
+    seconds: float = 0.0
+    cost: float = 0.0
+    path: List[str] = field(default_factory=list)
+    output_chars: float = 0.0  # What this part hands to the next step
+
+    def then(self, other: "Estimate") -> "Estimate":
+        """This part followed by `other`."""
+        return Estimate(
+            calls=self.calls + other.calls, max_calls=self.max_calls + other.max_calls,
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            seconds=self.seconds + other.seconds, cost=self.cost + other.cost,
+            path=self.path + other.path, output_chars=other.output_chars
+        )
+
+    @staticmethod
+    def parallel(parts: List["Estimate"], wait_for: Optional[int] = None) -> "Estimate":
+        """Parts running at once; the slowest (or the `wait_for`-th fastest, in a race) sets the time."""
+        if not parts:
+            return Estimate()
+        ordered = sorted(parts, key=lambda p: p.seconds)
+        deciding = ordered[min(wait_for, len(ordered)) - 1] if wait_for else ordered[-1]
+        return Estimate(
+            calls=sum(p.calls for p in parts), max_calls=sum(p.max_calls for p in parts),
+            prompt_tokens=sum(p.prompt_tokens for p in parts),
+            completion_tokens=sum(p.completion_tokens for p in parts),
+            seconds=deciding.seconds, cost=sum(p.cost for p in parts),
+            path=deciding.path, output_chars=sum(p.output_chars for p in parts)
+        )
+
+    @staticmethod
+    def choice(parts: List["Estimate"]) -> "Estimate":
+        """Exactly one of the parts runs (router routes): averages, with the slowest as the path."""
+        if not parts:
+            return Estimate()
+        n = len(parts)
+        slowest = max(parts, key=lambda p: p.seconds)
+        return Estimate(
+            calls=sum(p.calls for p in parts) / n, max_calls=max(p.max_calls for p in parts),
+            prompt_tokens=sum(p.prompt_tokens for p in parts) / n,
+            completion_tokens=sum(p.completion_tokens for p in parts) / n,
+            seconds=sum(p.seconds for p in parts) / n, cost=sum(p.cost for p in parts) / n,
+            path=slowest.path, output_chars=sum(p.output_chars for p in parts) / n
+        )
+
+    def repeated(self, expected: float, at_most: int) -> "Estimate":
+        """A loop body run `expected` times on average and `at_most` times in the worst case."""
+        return Estimate(
+            calls=self.calls * expected, max_calls=self.max_calls * at_most,
+            prompt_tokens=self.prompt_tokens * expected, completion_tokens=self.completion_tokens * expected,
+            seconds=self.seconds * expected, cost=self.cost * expected,
+            path=self._repeat_path(expected), output_chars=self.output_chars
+        )
+
+    def _repeat_path(self, times: float) -> List[str]:
+        if times == 1 or not self.path:
+            return list(self.path)
+        if len(self.path) == 1:
+            return [f"{self.path[0]} (x{times:g})"]
+        return [f"({' -> '.join(self.path)}) x{times:g}"]
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    latency_s: float = DEFAULT_LATENCY_S
+    completion_tokens: Optional[float] = None
+    chars_per_token: float = DEFAULT_CHARS_PER_TOKEN
+    input_price: Optional[float] = None  # USD per token, from LiteLLM's price list
+    output_price: Optional[float] = None
+
+
+@dataclass
+class AgentStats:
+    runs: int = 0
+    seconds: Optional[float] = None
+    output_chars: Optional[float] = None
+    calls_per_run: Optional[float] = None
+    # Per tool: calls, and average seconds / output chars per call
+    tool_calls: Dict[str, int] = field(default_factory=dict)
+    tool_call_seconds: Dict[str, float] = field(default_factory=dict)
+    tool_call_output_chars: Dict[str, float] = field(default_factory=dict)
+
+    def _per_call(self, averages: Dict[str, float]) -> Optional[float]:
+        """Average over all of the agent's tool calls, whichever tool they used."""
+        measured = [(self.tool_calls[name], value) for name, value in averages.items() if value is not None]
+        calls = sum(count for count, _ in measured)
+        return sum(count * value for count, value in measured) / calls if calls else None
+
+    @property
+    def tool_seconds(self) -> Optional[float]:
+        return self._per_call(self.tool_call_seconds)
+
+    @property
+    def tool_output_chars(self) -> Optional[float]:
+        return self._per_call(self.tool_call_output_chars)
+
+
+@dataclass
+class AgentRow:
+    """Expected totals for one agent over the whole workflow."""
+    agent: str
+    model: str
+    runs: float = 0.0
+    calls: float = 0.0
+    prompt_tokens: float = 0.0
+    completion_tokens: float = 0.0
+    seconds: float = 0.0
+    cost: float = 0.0
+    source: str = "defaults"  # "agent history", "model history" or "defaults"
+
+
+class WorkflowEstimator:
+    """
+    Predicts calls, tokens, time and price of a workflow without running it.
+    The structure comes from the config; sizes and speeds come from past runs
+    recorded in the usage and spans tables, with conservative defaults where
+    there is no history yet.
+    """
+
+    def __init__(self, config: OrchestrationConfig, database: DatabaseHandler = db):
+        self.config = config
+        self.agents_map = {a.id: a for a in config.agents}
+        self.db = database
+        self.models: Dict[str, ModelStats] = {}
+        self.agent_stats: Dict[str, AgentStats] = {}
+        self.rows: Dict[str, AgentRow] = {}
+        self.notes: List[str] = []
+        self._load_history()
+
+    # --- HISTORY ---
+
+    def _load_history(self):
+        for model, calls, _, completion, latency_ms, chars, tokens in self.db.model_usage_stats():
+            self.models[model] = ModelStats(
+                calls=calls,
+                latency_s=(latency_ms or DEFAULT_LATENCY_S * 1000) / 1000,
+                completion_tokens=completion,
+                chars_per_token=(chars / tokens) if chars and tokens else DEFAULT_CHARS_PER_TOKEN
+            )
+
+        for agent_id, kind, name, count, duration_ms, output_chars, llm_calls in self.db.agent_span_stats():
+            stats = self.agent_stats.setdefault(agent_id, AgentStats())
+            if kind == "agent":
+                stats.runs = count
+                stats.seconds = (duration_ms or 0) / 1000
+                stats.output_chars = output_chars
+                stats.calls_per_run = llm_calls / count if count else None
+            elif kind == "tool":
+                stats.tool_calls[name] = count
+                stats.tool_call_seconds[name] = (duration_ms or 0) / 1000
+                stats.tool_call_output_chars[name] = output_chars
+
+    def _model(self, model: str) -> ModelStats:
+        if model not in self.models:
+            self.models[model] = ModelStats()
+        stats = self.models[model]
+        if stats.input_price is None:
+            stats.input_price, stats.output_price = self._prices(model)
+        return stats
+
+    @staticmethod
+    def _prices(model: str) -> Tuple[Optional[float], Optional[float]]:
+        """Per-token prices from LiteLLM's bundled price list (no network needed)."""
+        try:
+            from litellm import model_cost
+        except ImportError:
+            return None, None
+        entry = model_cost.get(model) or model_cost.get(model.split("/", 1)[-1]) or {}
+        return entry.get("input_cost_per_token"), entry.get("output_cost_per_token")
+
+    def _escalation_chances(self, agent: AgentConfig) -> List[float]:
+        """Per cascade tier: the chance that it runs at all."""
+        hit_rates = {}
+        for _, tier, _, attempts, accepted, _ in self.db.cascade_stats(agent.id):
+            if attempts:
+                hit_rates[tier] = accepted / attempts
+        chances, reach = [], 1.0
+        for tier in range(len(agent.cascade.models)):
+            chances.append(reach)
+            reach *= 1 - hit_rates.get(tier, 1 - DEFAULT_ESCALATION)
+        return chances
+
+    # --- ONE AGENT RUN ---
+
+    def _agent(self, agent_id: str, context_chars: float, task_chars: float, weight: float) -> Estimate:
+        """
+        One run of an agent. `weight` is how often this run happens on average
+        (e.g. 1/3 for one of three router routes) and only affects the per-agent table.
+        """
+        agent = self.agents_map.get(agent_id)
+        if agent is None:
+            return Estimate()
+        model = self._model(agent.model)
+        history = self.agent_stats.get(agent_id, AgentStats())
+        cpt = model.chars_per_token
+
+        # 1. Prompt size: the compiled system prompt (plus tool schemas) and the user message
+        native = AgentRunner._use_native_tools(agent)
+        system_chars = len(AgentRunner.build_system_prompt(agent, native_tools=native))
+        if native:
+            system_chars += len(json.dumps(ToolRegistry.get_schemas(AgentRunner._agent_tools(agent))))
+        user_chars = len("Context: \nCurrent Task: ") + context_chars + task_chars
+        if agent.recall:
+            user_chars += agent.recall.max_chars
+        first_prompt = (system_chars + user_chars) / cpt
+
+        # 2. Calls: one per answer, plus the tool round trip, for every cascade tier that runs
+        has_tools = bool(AgentRunner._agent_tools(agent))
+        if history.runs:
+            tool_rate = min(1.0, sum(history.tool_calls.values()) / history.runs) if has_tools else 0.0
+        else:
+            tool_rate = DEFAULT_TOOL_RATE if has_tools else 0.0
+        tiers = self._escalation_chances(agent) if agent.cascade else [1.0]
+        expected_tiers = sum(tiers)
+        verifier_calls = (expected_tiers - tiers[-1]) if agent.cascade and "verifier" in agent.cascade.checks else 0.0
+        calls = history.calls_per_run if history.calls_per_run else expected_tiers * (1 + tool_rate) + verifier_calls
+        max_calls = len(tiers) * (2 if has_tools else 1) + (len(tiers) - 1 if verifier_calls else 0)
+
+        # 3. Output size and tokens
+        if history.output_chars:
+            output_chars = history.output_chars
+        elif model.completion_tokens:
+            output_chars = model.completion_tokens * cpt
+        else:
+            output_chars = DEFAULT_OUTPUT_CHARS
+        tool_output = history.tool_output_chars or DEFAULT_TOOL_OUTPUT_CHARS
+        prompt_tokens = first_prompt * calls + tool_rate * expected_tiers * (output_chars + tool_output) / cpt
+        completion_tokens = calls * (model.completion_tokens or output_chars / cpt)
+
+        # 4. Time: measured agent runs beat per-call latency
+        if history.seconds:
+            seconds, source = history.seconds, "agent history"
+        else:
+            tool_seconds = history.tool_seconds if history.tool_seconds is not None else DEFAULT_TOOL_SECONDS
+            seconds = calls * model.latency_s + tool_rate * expected_tiers * tool_seconds
+            source = "model history" if model.calls else "defaults"
+
+        cost = 0.0
+        if model.input_price is not None:
+            cost = prompt_tokens * model.input_price + completion_tokens * (model.output_price or 0)
+        else:
+            self._note(f"No price known for '{agent.model}'; it is counted as free.")
+
+        estimate = Estimate(calls=calls, max_calls=max_calls, prompt_tokens=prompt_tokens,
+                            completion_tokens=completion_tokens, seconds=seconds, cost=cost,
+                            path=[agent_id], output_chars=output_chars)
+        self._record(agent, estimate, weight, source)
+        return estimate
+
+    def _record(self, agent: AgentConfig, estimate: Estimate, weight: float, source: str):
+        row = self.rows.setdefault(agent.id, AgentRow(agent=agent.id, model=agent.model, source=source))
+        row.runs += weight
+        row.calls += estimate.calls * weight
+        row.prompt_tokens += estimate.prompt_tokens * weight
+        row.completion_tokens += estimate.completion_tokens * weight
+        row.seconds += estimate.seconds * weight
+        row.cost += estimate.cost * weight
+
+    def _note(self, message: str):
+        if message not in self.notes:
+            self.notes.append(message)
+
+    # --- WORKFLOW STRUCTURE ---
+
+    def estimate(self) -> Estimate:
+        """The whole workflow (resets the per-agent table)."""
+        self.rows = {}
+        workflow = self.config.workflow
+        if workflow.type == "parallel":
+            return self._parallel(len(_START_CONTEXT), 1.0)
+        return self._steps(workflow.steps, len(_START_CONTEXT), 1.0)
+
+    def _steps(self, steps: List[WorkflowStep], context_chars: float, weight: float) -> Estimate:
+        total = Estimate(output_chars=context_chars)
+        for step in steps:
+            context_chars = total.output_chars
+            if step.kind == "router":
+                part = self._router(step, context_chars, weight)
+            elif step.kind == "loop":
+                part = self._loop(step, context_chars, weight)
+            elif step.kind == "foreach":
+                part = self._foreach(step.foreach, context_chars, weight)
+            else:
+                # The previous output is both the context and the task
+                part = self._agent(step.agent, context_chars, context_chars, weight)
+            total = total.then(part)
+        return total
+
+    def _router(self, step: WorkflowStep, context_chars: float, weight: float) -> Estimate:
+        classifier = Estimate()
+        if step.classifier:
+            model = self._model(step.classifier)
+            prompt = (400 + min(context_chars, CLASSIFIER_MAX_INPUT)) / model.chars_per_token
+            price = (model.input_price or 0) * prompt + (model.output_price or 0) * 5
+            classifier = Estimate(calls=1, max_calls=1, prompt_tokens=prompt, completion_tokens=5,
+                                  seconds=model.latency_s, cost=price, path=["(classifier)"],
+                                  output_chars=context_chars)
+
+        options = list(step.routes) + ([step.default] if step.default is not None else [])
+        if not options:
+            return classifier
+        share = weight / len(options)
+        routes = [self._steps(route.steps, context_chars, share) for route in options]
+        return classifier.then(Estimate.choice(routes))
+
+    def _loop(self, step: WorkflowStep, context_chars: float, weight: float) -> Estimate:
+        # Without history, assume the exit condition is met halfway to the cap
+        expected = (1 + step.max_iterations) / 2
+        body = self._steps(step.steps, context_chars, weight * expected)
+        return body.repeated(expected, step.max_iterations)
+
+    def _foreach(self, spec: ForEach, context_chars: float, weight: float) -> Estimate:
+        items, item_chars = self._count_items(spec, context_chars)
+        task_chars = len(spec.task) + item_chars
+        one = self._agent(spec.agent, len("Item 1 of a fan-out."), task_chars, weight * items)
+        # The table already counts every item through the weight above
+        fanned = Estimate(
+            calls=one.calls * items, max_calls=one.max_calls * items,
+            prompt_tokens=one.prompt_tokens * items, completion_tokens=one.completion_tokens * items,
+            seconds=one.seconds * math.ceil(items / max(1, spec.concurrency)), cost=one.cost * items,
+            path=[f"{spec.agent} (x{items})"], output_chars=one.output_chars * items
+        )
+        if not spec.then:
+            return fanned
+
+        # Rolling aggregation: one call per chunk, each seeing the summary so far plus the chunk
+        chunks = max(1, math.ceil(fanned.output_chars / CHUNK_CHARS))
+        summary_chars = DEFAULT_OUTPUT_CHARS
+        fold = self._agent(spec.then, min(fanned.output_chars, CHUNK_CHARS) + summary_chars, 40, weight * chunks)
+        return fanned.then(fold.repeated(chunks, chunks))
+
+    def _count_items(self, spec: ForEach, context_chars: float) -> Tuple[int, float]:
+        """(number of items, average item length) as far as it can be known up front."""
+        if spec.file:
+            try:
+                with open(spec.file, "r", encoding="utf-8") as f:
+                    lengths = [len(line.strip()) for line in f if line.strip()]
+                return max(1, len(lengths)), (sum(lengths) / len(lengths) if lengths else 0)
+            except OSError:
+                self._note(f"foreach file '{spec.file}' doesn't exist yet; assuming {ASSUMED_FOREACH_ITEMS} items.")
+                return ASSUMED_FOREACH_ITEMS, 200
+        if spec.from_previous:
+            self._note(f"foreach over the previous output: assuming {ASSUMED_FOREACH_ITEMS} items "
+                       f"(set ESTIMATE_FOREACH_ITEMS to change).")
+            return ASSUMED_FOREACH_ITEMS, context_chars / ASSUMED_FOREACH_ITEMS
+        lengths = [len(item if isinstance(item, str) else json.dumps(item)) for item in spec.items]
+        return max(1, len(lengths)), (sum(lengths) / len(lengths) if lengths else 0)
+
+    def _parallel(self, context_chars: float, weight: float) -> Estimate:
+        workflow = self.config.workflow
+        if workflow.foreach:
+            return self._foreach(workflow.foreach, context_chars, weight)
+
+        task = "Execute your specific goal independently."
+        branches = [self._agent(b, len("Parallel Task"), len(task), weight) for b in workflow.branches]
+        racing = workflow.mode == "race"
+        total = Estimate.parallel(branches, wait_for=workflow.quorum if racing else None)
+        if not workflow.then:
+            return total
+
+        # The aggregator sees every output ("Agent x said: ..."), or groups of them within the budget
+        aggregate_chars = total.output_chars + 20 * len(branches)
+        budget = workflow.aggregate.max_tokens
+        cpt = self._model(self.agents_map[workflow.then.agent].model).chars_per_token \
+            if workflow.then.agent in self.agents_map else DEFAULT_CHARS_PER_TOKEN
+        if budget and aggregate_chars / cpt > budget:
+            groups = math.ceil(aggregate_chars / cpt / budget)
+            partial = self._agent(workflow.then.agent, budget * cpt, 150, weight * groups)
+            total = total.then(Estimate.parallel([partial] * groups))
+            aggregate_chars = partial.output_chars * groups
+        return total.then(self._agent(workflow.then.agent, aggregate_chars, 40, weight))
+
+    # --- WASTE ---
+
+    def warnings(self) -> List[str]:
+        """Things that cost calls or tokens for no benefit."""
+        found = []
+        used = self._used_agents()
+        registered = set(ToolRegistry.list_tools())
+
+        for agent in self.config.agents:
+            unknown = [t for t in agent.tools if t not in registered]
+            if unknown:
+                found.append(f"Agent '{agent.id}' lists tools that don't exist: {', '.join(unknown)}.")
+
+            history = self.agent_stats.get(agent.id)
+            known = [t for t in agent.tools if t in registered]
+            if known and history and history.runs >= MIN_RUNS_FOR_WASTE:
+                idle = [t for t in known if not history.tool_calls.get(t)]
+                if len(idle) == len(known):
+                    found.append(
+                        f"Agent '{agent.id}' was given {', '.join(idle)} but called no tool in {history.runs} runs. "
+                        "Without tools it would skip the tool instructions in every prompt."
+                    )
+                elif idle:
+                    found.append(f"Agent '{agent.id}' never called {', '.join(idle)} in {history.runs} runs.")
+
+            if agent.id not in used:
+                found.append(f"Agent '{agent.id}' is defined but no step runs it.")
+
+        found.extend(self._independent_steps(self.config.workflow.steps))
+        return found
+
+    def _used_agents(self) -> set:
+        workflow = self.config.workflow
+        used = set(workflow.branches)
+        if workflow.then:
+            used.add(workflow.then.agent)
+        if workflow.foreach:
+            used.update(filter(None, [workflow.foreach.agent, workflow.foreach.then]))
+
+        def walk(steps: List[WorkflowStep]):
+            for step in steps:
+                if step.agent:
+                    used.add(step.agent)
+                if step.foreach:
+                    used.update(filter(None, [step.foreach.agent, step.foreach.then]))
+                for route in step.routes + ([step.default] if step.default else []):
+                    walk(route.steps)
+                walk(step.steps)
+        walk(workflow.steps)
+        return used
+
+    def _independent_steps(self, steps: List[WorkflowStep]) -> List[str]:
+        """
+        Runs of consecutive agent steps where no agent seems to need the previous
+        output: nothing in its goal or instructions refers to it. A heuristic,
+        so it is worded as a suggestion.
+        """
+        found, run = [], []
+        for step in steps + [WorkflowStep(kind="end")]:
+            agent = self.agents_map.get(step.agent) if step.kind == "agent" and step.agent else None
+            if agent is not None and (not run or self._looks_independent(agent, run[-1])):
+                run.append(agent)
+                continue
+            if len(run) >= 2:
+                found.append(
+                    f"Steps {' -> '.join(a.id for a in run)} don't appear to use each other's output; "
+                    "a parallel workflow (branches + then) would run them at the same time."
+                )
+            run = [agent] if agent is not None else []
+        for step in steps:
+            for route in step.routes + ([step.default] if step.default else []):
+                found.extend(self._independent_steps(route.steps))
+        return found
+
+    @staticmethod
+    def _looks_independent(agent: AgentConfig, previous: AgentConfig) -> bool:
+        text = " ".join(filter(None, [agent.goal, agent.instructions]))
+        if _DEPENDENCY_CUES.search(text):
+            return False
+        mentions = {previous.id.lower(), previous.role.lower()}
+        if any(m and m in text.lower() for m in mentions):
+            return False
+        # Shared subject matter (e.g. a memory key one writes and the other reads) counts as a link
+        produced = keywords(" ".join(filter(None, [previous.goal, previous.instructions])))
+        return not (keywords(text) & produced)
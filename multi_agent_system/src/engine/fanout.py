@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from src.schema import ForEach
+from src.engine.jsonscan import parse_json_answer
+
+# Ordered results are batched for the aggregator up to roughly this many characters
+CHUNK_CHARS = int(os.getenv("FOREACH_CHUNK_CHARS", "12000"))
+
+# Results kept in memory before the spool moves to a temporary file
+SPOOL_BYTES = int(os.getenv("FOREACH_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+
+def iter_items(spec: ForEach, context: str) -> Iterator[str]:
+    """
+    Yields the fan-out inputs as strings, without loading a file into memory.
+    Non-string JSON items are passed on as compact JSON.
+    """
+    if spec.file:
+        with open(spec.file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+        return
+
+    if spec.from_previous:
+        try:
+            parsed = parse_json_answer(context)
+        except ValueError:
+            raise ValueError("foreach expected a JSON array in the previous output, found none")
+        if isinstance(parsed, dict):
+            # {"items": [...]} and similar: use the first list inside the object
+            parsed = next((v for v in parsed.values() if isinstance(v, list)), None)
+        if not isinstance(parsed, list):
+            raise ValueError("foreach expected a JSON array in the previous output")
+        items: List[Any] = parsed
+    else:
+        items = spec.items
+
+    for item in items:
+        yield item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+
+
+def render_task(template: str, item: str, index: int) -> str:
+    # Plain replacement, so braces inside items (JSON) are left alone
+    return template.replace("{item}", item).replace("{index}", str(index + 1))
+
+
+class OrderedCollector:
+    """
+    Receives results in completion order and releases them in input order.
+    Released results go to an optional JSON-lines file and to the current
+    aggregator chunk; without an aggregator they are spooled (memory first,
+    then a temporary file) instead of being joined into one big string.
+    """
+
+    def __init__(self, aggregate: bool, output_path: Optional[str] = None,
+                 chunk_chars: int = CHUNK_CHARS):
+        self.next_index = 0
+        self.released = 0
+        self.chunk_chars = chunk_chars
+        self._waiting: Dict[int, Tuple[str, str]] = {}
+        self._chunk: List[str] = []
+        self._chunk_size = 0
+        self._chunk_first = 0
+        self._spool = None if aggregate else tempfile.SpooledTemporaryFile(
+            max_size=SPOOL_BYTES, mode="w+", encoding="utf-8"
+        )
+        self._output = open(output_path, "w", encoding="utf-8") if output_path else None
+
+    @property
+    def buffered(self) -> int:
+        """Results that finished early and wait for an earlier item."""
+        return len(self._waiting)
+
+    def add(self, index: int, item: str, result: str):
+        self._waiting[index] = (item, result)
+        while self.next_index in self._waiting:
+            self._release(self.next_index, *self._waiting.pop(self.next_index))
+            self.next_index += 1
+
+    def _release(self, index: int, item: str, result: str):
+        self.released += 1
+        if self._output is not None:
+            self._output.write(json.dumps({"index": index + 1, "item": item, "result": result},
+                                          ensure_ascii=False) + "\n")
+        entry = f"[{index + 1}] {result}"
+        if self._spool is not None:
+            self._spool.write(entry + "\n")
+            return
+        if not self._chunk:
+            self._chunk_first = index
+        self._chunk.append(entry)
+        self._chunk_size += len(entry) + 1
+
+    def chunk_ready(self) -> bool:
+        return self._chunk_size >= self.chunk_chars
+
+    def take_chunk(self) -> Tuple[int, int, str]:
+        """Returns (first item, last item, text) of the released results not yet aggregated."""
+        first, last = self._chunk_first + 1, self._chunk_first + len(self._chunk)
+        text = "\n".join(self._chunk)
+        self._chunk, self._chunk_size = [], 0
+        return first, last, text
+
+    def has_chunk(self) -> bool:
+        return bool(self._chunk)
+
+    def read_all(self) -> str:
+        """Every released result, in order (only without an aggregator)."""
+        if self._spool is None:
+            return ""
+        self._spool.seek(0)
+        return self._spool.read().rstrip("\n")
+
+    def close(self):
+        if self._output is not None:
+            self._output.close()
+        if self._spool is not None:
+            self._spool.close()
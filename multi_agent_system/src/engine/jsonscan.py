@@ -0,0 +1,43 @@
+import json
+import re
+from typing import Any, Callable, Iterator, Optional
+
+# =============================================================================
+#  JSON INSIDE AGENT OUTPUT
+#  Models wrap JSON in prose and code fences. Tool calls, router conditions,
+#  cascade checks and foreach inputs all dig it out with these helpers.
+# =============================================================================
+
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL)
+
+
+def iter_json(text: str, openers: str = "{[") -> Iterator[Any]:
+    """Yields every JSON value that starts at one of `openers` in `text`, left to right."""
+    decoder = json.JSONDecoder()
+    for match in re.finditer(f"[{re.escape(openers)}]", text):
+        try:
+            yield decoder.raw_decode(text, match.start())[0]
+        except ValueError:
+            continue
+
+
+def find_json(text: str, accept: Callable[[Any], bool] = lambda value: True,
+              openers: str = "{[") -> Optional[Any]:
+    """The first embedded JSON value `accept` agrees with, or None."""
+    return next((value for value in iter_json(text, openers) if accept(value)), None)
+
+
+def parse_json_answer(output: str) -> Any:
+    """The answer as JSON: the whole text, a ```json``` block, or the first object/array in it."""
+    text = output.strip()
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    for value in iter_json(text):
+        return value
+    raise ValueError("no JSON found")
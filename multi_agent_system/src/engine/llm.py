@@ -1,11 +1,75 @@
 import os
-from litellm import completion
+import json
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from litellm import ModelResponse, completion, stream_chunk_builder
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
+from src.interface.console import ui
+from src.interface.database import db
+from src.interface.context import get_agent_id
+from src.interface.events import TOKEN, bus
+from src.interface import cassette
 
 # Load environment variables from .env file
 load_dotenv()
 
+
+@lru_cache(maxsize=None)
+def supports_prompt_caching(model: str) -> bool:
+    """
+    Asks LiteLLM whether the provider behind `model` understands
+    `cache_control` hints. Unknown models are treated as unsupported.
+    """
+    if os.getenv("PROMPT_CACHING", "1").lower() in ("0", "false", "no", "off"):
+        return False
+    try:
+        from litellm.utils import supports_prompt_caching as _supports
+        return bool(_supports(model=model))
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=None)
+def supports_function_calling(model: str) -> bool:
+    """Asks LiteLLM whether `model` accepts the `tools=` parameter natively."""
+    try:
+        from litellm import supports_function_calling as _supports
+        return bool(_supports(model=model))
+    except Exception:
+        return False
+
+
+@dataclass
+class ToolCall:
+    """A structured tool call requested by the model."""
+    id: str
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class LLMReply:
+    """Text content plus any tool calls from a function-calling request."""
+    content: str
+    tool_calls: List[ToolCall] = field(default_factory=list)
+
+    def as_message(self) -> Dict[str, Any]:
+        """The assistant message to append to the conversation before the tool results."""
+        message: Dict[str, Any] = {"role": "assistant", "content": self.content or ""}
+        if self.tool_calls:
+            message["tool_calls"] = [
+                {
+                    "id": call.id,
+                    "type": "function",
+                    "function": {"name": call.name, "arguments": json.dumps(call.arguments)}
+                }
+                for call in self.tool_calls
+            ]
+        return message
+
+
 class LLMEngine:
     def __init__(self):
         pass
@@ -15,24 +79,179 @@ class LLMEngine:
         Sends a request to an LLM provider via LiteLLM.
         The model is determined by the provider prefix (e.g., 'groq/', 'openai/', 'ollama/').
         """
-        # Fallback to environment variable or hardcoded default
-        target_model = model or os.getenv("DEFAULT_MODEL", "groq/llama-3.3-70b-versatile")
-        
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
+        return self.chat(messages, model=model)
 
+    def chat(self, messages: List[Dict[str, Any]], model: Optional[str] = None,
+             timeout: Optional[float] = None) -> str:
+        """
+        Sends a full conversation to the LLM.
+        The system message is marked as cacheable when the provider supports
+        prompt caching, so repeated calls with the same prefix get cache hits.
+        `timeout` (seconds) is handed to the provider client so a hung request is aborted.
+        """
+        # Fallback to environment variable or hardcoded default
+        target_model = model or os.getenv("DEFAULT_MODEL", "groq/llama-3.3-70b-versatile")
+
+        if supports_prompt_caching(target_model):
+            messages = self._with_cache_hints(messages)
+
+        started = time.monotonic()
         try:
             # LiteLLM automatically handles API keys and base URLs from environment variables
             # based on the model prefix (e.g., GROQ_API_KEY for groq/...)
-            response = completion(
-                model=target_model, 
-                messages=messages
+            kwargs = {"timeout": timeout} if timeout else {}
+            response = self._complete(
+                model=target_model,
+                messages=messages,
+                **kwargs
             )
+            self._report_usage(response, target_model, messages, started)
             return response.choices[0].message.content
         except Exception as e:
+            self._report_usage(None, target_model, messages, started, status="error")
             return f"❌ LLM Error ({target_model}): {str(e)}"
 
+    def chat_with_tools(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]],
+                        model: Optional[str] = None, timeout: Optional[float] = None,
+                        tool_choice: str = "auto") -> LLMReply:
+        """
+        Native function calling: tool schemas go through LiteLLM's `tools=`
+        parameter and structured `tool_calls` come back, so nothing has to be
+        scraped out of the text.
+        """
+        target_model = model or os.getenv("DEFAULT_MODEL", "groq/llama-3.3-70b-versatile")
+
+        if supports_prompt_caching(target_model):
+            messages = self._with_cache_hints(messages)
+
+        started = time.monotonic()
+        try:
+            kwargs = {"timeout": timeout} if timeout else {}
+            response = self._complete(
+                model=target_model,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                **kwargs
+            )
+            self._report_usage(response, target_model, messages, started)
+            message = response.choices[0].message
+        except Exception as e:
+            self._report_usage(None, target_model, messages, started, status="error")
+            return LLMReply(content=f"❌ LLM Error ({target_model}): {str(e)}")
+
+        calls = []
+        for raw in getattr(message, "tool_calls", None) or []:
+            try:
+                arguments = json.loads(raw.function.arguments or "{}")
+            except (TypeError, ValueError):
+                arguments = {}
+            calls.append(ToolCall(id=raw.id, name=raw.function.name, arguments=arguments))
+
+        return LLMReply(content=message.content or "", tool_calls=calls)
+
+    @classmethod
+    def _complete(cls, **kwargs):
+        """
+        One provider call. While a cassette is active (`--record` / `--replay`)
+        the call is recorded, or answered from the recording without any network.
+        """
+        tape = cassette.active()
+        if tape is None:
+            return cls._provider_call(**kwargs)
+
+        response = tape.through(
+            "llm", kwargs["model"], kwargs, lambda: cls._provider_call(**kwargs),
+            encode=lambda r: r.model_dump() if hasattr(r, "model_dump") else None,
+            decode=lambda data: ModelResponse(**data)
+        )
+        if tape.replaying and bus.wants(TOKEN):
+            # The recording has the finished answer, so it arrives as one delta
+            text = response.choices[0].message.content if response.choices else None
+            if text:
+                bus.publish(TOKEN, agent=get_agent_id(), text=text)
+        return response
+
+    @staticmethod
+    def _provider_call(**kwargs):
+        """
+        LiteLLM `completion()`, streamed while someone subscribes to token deltas
+        (e.g. Orchestrator.stream()). Each delta is published as it arrives and
+        the chunks are then rebuilt into a normal response (content, tool calls
+        and usage), so callers can't tell the difference.
+        """
+        if not bus.wants(TOKEN):
+            return completion(**kwargs)
+
+        chunks = []
+        agent_id = get_agent_id()
+        for chunk in completion(stream=True, **kwargs):
+            chunks.append(chunk)
+            delta = chunk.choices[0].delta if chunk.choices else None
+            text = getattr(delta, "content", None) if delta is not None else None
+            if text:
+                bus.publish(TOKEN, agent=agent_id, text=text)
+        return stream_chunk_builder(chunks, messages=kwargs.get("messages"))
+
+    @staticmethod
+    def _report_usage(response, model: str, messages: List[Dict[str, Any]], started: float,
+                      status: str = "ok"):
+        """
+        Feeds token counts to the console dashboard (for the agent making the call)
+        and records the call in the usage table (except during a replay).
+        """
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None) if usage else None
+        if total:
+            ui.log_usage(None, total)
+        if cassette.replaying():
+            # Recorded latencies and tokens would be counted twice by the estimator
+            return
+
+        # Cached prompt tokens are reported differently per provider
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) if details else None) \
+            or getattr(usage, "cache_read_input_tokens", None)
+        prompt_chars = sum(
+            len(m["content"]) if isinstance(m.get("content"), str)
+            else sum(len(block.get("text", "")) for block in m.get("content") or [] if isinstance(block, dict))
+            for m in messages
+        )
+        try:
+            db.record_usage(
+                model=model,
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                completion_tokens=getattr(usage, "completion_tokens", None),
+                total_tokens=total,
+                cached_tokens=cached,
+                prompt_chars=prompt_chars,
+                latency_ms=(time.monotonic() - started) * 1000,
+                status=status
+            )
+        except Exception as e:
+            # Metrics must never break an LLM call
+            ui.print_error(f"Could not record LLM usage: {e}")
+
+    @staticmethod
+    def _with_cache_hints(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Converts the system message into a content block carrying a cache breakpoint."""
+        hinted = []
+        for msg in messages:
+            if msg["role"] == "system" and isinstance(msg["content"], str):
+                msg = {
+                    "role": "system",
+                    "content": [{
+                        "type": "text",
+                        "text": msg["content"],
+                        "cache_control": {"type": "ephemeral"}
+                    }]
+                }
+            hinted.append(msg)
+        return hinted
+
 # Singleton Instance
-llm_client = LLMEngine()
\ No newline at end of file
+llm_client = LLMEngine()
@@ -1,103 +1,687 @@
+import asyncio
 import concurrent.futures
-from typing import List, Dict, Any
-from src.schema import OrchestrationConfig, WorkflowConfig
-from src.engine.agent_runner import AgentRunner
+import contextvars
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Callable, Tuple, TYPE_CHECKING
+from src.schema import OrchestrationConfig, WorkflowConfig, AgentConfig, WorkflowStep, ForEach
+from src.engine.agent_runner import AgentRunner, AgentCancelled, AgentTimeout
+from src.engine.routing import choose_route, condition_matches
+from src.engine.fanout import OrderedCollector, iter_items, render_task
+from src.engine.condense import estimate_tokens, group_near_duplicates, pack_entries, render_groups
 from src.interface.console import ui
+from src.interface.database import db
+from src.interface.context import run_scope
+from src.interface.events import Event, FINAL, TOKEN, bus
+from src.interface import cassette
+
+if TYPE_CHECKING:
+    from src.engine.distributed import QueueDispatcher
+
+# Marks the end of a stream() / astream() run
+_STREAM_END = object()
+
+# Partial aggregation gives up after this many levels, even if the entries still don't fit
+MAX_AGGREGATE_LEVELS = 4
 
 class Orchestrator:
-    def __init__(self, config: OrchestrationConfig):
+    def __init__(self, config: OrchestrationConfig, dispatcher: Optional["QueueDispatcher"] = None):
         self.config = config
+        # When set, agents run on queue workers instead of local threads
+        self.dispatcher = dispatcher
         self.agents_map = {a.id: a for a in config.agents}
+        # Absolute (time.monotonic) deadline of the whole workflow, set by run()
+        self._workflow_deadline: Optional[float] = None
+        self.run_id: Optional[str] = None
 
-    def run(self):
+    def run(self, run_id: Optional[str] = None):
         """
         Main entry point. Decides which workflow strategy to use.
         """
-        workflow_type = self.config.workflow.type
-        ui.log_workflow_start("Main Workflow", workflow_type)
+        # Every run gets its own id, which scopes run-level memory and tags its events
+        self.run_id = run_id or (("replay-" if cassette.replaying() else "") + uuid.uuid4().hex[:12])
 
-        final_result = ""
+        with run_scope(self.run_id):
+            workflow_type = self.config.workflow.type
+            ui.log_workflow_start("Main Workflow", workflow_type)
 
-        if workflow_type == "sequential":
-            final_result = self._run_sequential()
-        elif workflow_type == "parallel":
-            final_result = self._run_parallel()
-        else:
-            ui.print_error(f"Unknown workflow type: {workflow_type}")
+            timeout = self.config.workflow.timeout
+            self._workflow_deadline = time.monotonic() + timeout if timeout else None
+
+            final_result = ""
+
+            if workflow_type == "sequential":
+                final_result = self._run_sequential()
+            elif workflow_type == "parallel":
+                final_result = self._run_parallel()
+            else:
+                ui.print_error(f"Unknown workflow type: {workflow_type}")
+
+            bus.publish(FINAL, output=final_result)
 
         return final_result
 
+    # --- STREAMING ---
+
+    def stream(self, tokens: bool = True) -> Iterator[Event]:
+        """
+        Runs the workflow in a background thread and yields its events as they
+        happen (see src/interface/events.py for the types), ending with 'final'.
+        `tokens=False` leaves out token deltas, so LLM calls aren't streamed.
+        Errors from the run are raised after the last event. Stopping early
+        only stops the delivery: the run itself finishes in the background.
+        """
+        events: "queue.Queue" = queue.Queue()
+        thread, errors = self._start_streaming(events.put, tokens)
+        while True:
+            event = events.get()
+            if event is _STREAM_END:
+                break
+            yield event
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    async def astream(self, tokens: bool = True) -> AsyncIterator[Event]:
+        """The async iterator version of stream(), for asyncio applications."""
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue" = asyncio.Queue()
+
+        def deliver(event):
+            # The consumer's loop may be gone if it stopped iterating early
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(events.put_nowait, event)
+
+        thread, errors = self._start_streaming(deliver, tokens)
+        while True:
+            event = await events.get()
+            if event is _STREAM_END:
+                break
+            yield event
+        if errors:
+            raise errors[0]
+
+    def _start_streaming(self, deliver: Callable[[Any], None],
+                         tokens: bool) -> Tuple[threading.Thread, List[BaseException]]:
+        """
+        Subscribes to this run's events and starts run() on its own thread.
+        The run id is picked up front so events of other runs can be filtered out.
+        """
+        run_id = uuid.uuid4().hex[:12]
+        subscription = bus.subscribe(
+            lambda event: deliver(event) if event.run_id == run_id else None,
+            opt_in=[TOKEN] if tokens else ()
+        )
+        errors: List[BaseException] = []
+
+        def target():
+            try:
+                self.run(run_id=run_id)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                bus.unsubscribe(subscription)
+                deliver(_STREAM_END)
+
+        thread = threading.Thread(target=target, name=f"run-{run_id}", daemon=True)
+        thread.start()
+        return thread, errors
+
+    @staticmethod
+    def _submit(executor: concurrent.futures.Executor, fn, **kwargs) -> concurrent.futures.Future:
+        """
+        Submits work to a pool, carrying over the current context (run id etc.).
+        Worker threads don't inherit ContextVars on their own.
+        """
+        ctx = contextvars.copy_context()
+        return executor.submit(ctx.run, fn, **kwargs)
+
+    def _dispatch(self, executor: Optional[concurrent.futures.Executor], agent: AgentConfig,
+                  context: str, task_input: str, cancel_event: threading.Event,
+                  deadline: Optional[float]) -> concurrent.futures.Future:
+        """Starts one agent run, either on the local pool or on the distributed queue."""
+        if self.dispatcher is not None:
+            return self.dispatcher.submit(agent, context, task_input, deadline=deadline)
+        return self._submit(
+            executor, AgentRunner.run, agent=agent, context=context, task_input=task_input,
+            cancel_event=cancel_event, deadline=deadline
+        )
+
+    # --- DEADLINES ---
+
+    def _agent_deadline(self, agent: AgentConfig, start: Optional[float] = None) -> Optional[float]:
+        """The earlier of the agent's own deadline and the workflow deadline."""
+        start = start if start is not None else time.monotonic()
+        deadlines = [d for d in (
+            start + agent.timeout if agent.timeout else None,
+            self._workflow_deadline
+        ) if d is not None]
+        return min(deadlines) if deadlines else None
+
+    def _workflow_expired(self) -> bool:
+        return self._workflow_deadline is not None and time.monotonic() >= self._workflow_deadline
+
+    def _run_agent(self, agent: AgentConfig, context: str, task_input: str) -> str:
+        """
+        Runs one agent on the calling thread's behalf, but gives up once its
+        deadline passes. Without a deadline this is a plain AgentRunner.run call.
+        """
+        deadline = self._agent_deadline(agent)
+        if deadline is None and self.dispatcher is None:
+            return AgentRunner.run(agent, context=context, task_input=task_input)
+
+        cancel_event = threading.Event()
+        executor = None if self.dispatcher else concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = self._dispatch(executor, agent, context, task_input, cancel_event, deadline)
+        try:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            raise AgentTimeout(f"Agent '{agent.id}' missed its deadline.")
+        finally:
+            # A hung call is abandoned, not awaited
+            cancel_event.set()
+            future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_completed(
+        self,
+        future_to_agent: Dict[concurrent.futures.Future, str],
+        deadlines: Dict[concurrent.futures.Future, Optional[float]]
+    ) -> Iterator[Tuple[concurrent.futures.Future, bool]]:
+        """
+        Like `as_completed`, but also honours per-future deadlines.
+        Yields (future, timed_out) pairs; a timed-out future is yielded once
+        its deadline passes and is not waited on any further.
+        """
+        pending = set(future_to_agent)
+        while pending:
+            now = time.monotonic()
+            for future in list(pending):
+                deadline = deadlines.get(future)
+                if deadline is not None and deadline <= now and not future.done():
+                    pending.discard(future)
+                    future.cancel()
+                    yield future, True
+            if not pending:
+                break
+
+            upcoming = [deadlines[f] for f in pending if deadlines.get(f) is not None]
+            wait_for = max(0.0, min(upcoming) - now) if upcoming else None
+            done, _ = concurrent.futures.wait(
+                pending, timeout=wait_for, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                pending.discard(future)
+                yield future, False
+
+    # --- WORKFLOWS ---
+
     def _run_sequential(self) -> str:
         """
-        Runs agents one by one. The output of the previous agent 
+        Runs agents one by one. The output of the previous agent
         becomes the CONTEXT for the next agent.
+        Router steps pick which agents run next; loop steps repeat theirs.
         """
-        context = "Start of workflow."
-        
-        for step in self.config.workflow.steps:
-            agent_id = step.agent
-            if agent_id not in self.agents_map:
-                ui.print_error(f"Agent '{agent_id}' not found in configuration.")
-                continue
-
-            # Run the agent
-            agent = self.agents_map[agent_id]
-            
-            # The 'task_input' is the context from the previous agent
-            output = AgentRunner.run(agent, context=context, task_input=context)
-            
-            # Update context for the next agent
-            context = output
-            
+        context, _ = self._run_steps(self.config.workflow.steps, "Start of workflow.")
         return context
 
+    def _run_steps(self, steps: List[WorkflowStep], context: str) -> Tuple[str, bool]:
+        """
+        Runs a list of steps in order, threading the context through.
+        Returns (context, ended); `ended` means a route finished the workflow early.
+        """
+        for step in steps:
+            if self._workflow_expired():
+                ui.print_error("Workflow deadline reached. Skipping the remaining steps.")
+                context += "\n[Note: the workflow deadline was reached before all steps could run.]"
+                return context, True
+
+            if step.kind == "router":
+                context, ended = self._run_router(step, context)
+                if ended:
+                    return context, True
+            elif step.kind == "loop":
+                context, ended = self._run_loop(step, context)
+                if ended:
+                    return context, True
+            elif step.kind == "foreach":
+                context = self._run_foreach(step.foreach, context)
+            else:
+                context = self._run_agent_step(step.agent, context)
+
+        return context, False
+
+    def _run_agent_step(self, agent_id: str, context: str) -> str:
+        if agent_id not in self.agents_map:
+            ui.print_error(f"Agent '{agent_id}' not found in configuration.")
+            return context
+
+        # Run the agent
+        agent = self.agents_map[agent_id]
+
+        # The 'task_input' is the context from the previous agent
+        try:
+            return self._run_agent(agent, context=context, task_input=context)
+        except AgentCancelled:
+            # Keep the last good context and tell the next agent what happened
+            ui.log_agent_status(agent_id, "⏱ timed out")
+            ui.print_error(f"Agent '{agent_id}' timed out. Continuing with the previous context.")
+            return f"{context}\n[Note: agent '{agent_id}' timed out and produced no result.]"
+
+    def _run_router(self, step: WorkflowStep, context: str) -> Tuple[str, bool]:
+        """
+        Chooses one route from the previous output and runs only its steps.
+        Agents on the other routes never make a call.
+        """
+        timeout = max(1.0, self._workflow_deadline - time.monotonic()) if self._workflow_deadline else None
+        route, how = choose_route(step, context, timeout=timeout)
+
+        if route is None:
+            ui.info("🔀 Router: no route matched, continuing.", style="dim")
+            db.log_event("router", "route", "no match")
+            return context, False
+
+        chosen = set(self._agents_in(route.steps))
+        every_route = step.routes + ([step.default] if step.default else [])
+        skipped = sorted({a for r in every_route for a in self._agents_in(r.steps)} - chosen)
+        ui.info(
+            f"🔀 Router → {route.name} ({how})" + (f" · skipping {', '.join(skipped)}" if skipped else ""),
+            style="bold magenta"
+        )
+        db.log_event("router", "route", f"{route.name} via {how}; skipped: {', '.join(skipped) or '-'}")
+
+        context, ended = self._run_steps(route.steps, context)
+        return context, ended or route.end
+
+    def _run_loop(self, step: WorkflowStep, context: str) -> Tuple[str, bool]:
+        """
+        Repeats the loop body, feeding each pass the previous pass's output,
+        until the exit condition holds, the output stops changing, or
+        `max_iterations` is reached.
+        """
+        for iteration in range(1, step.max_iterations + 1):
+            ui.info(f"🔁 Loop iteration {iteration}/{step.max_iterations}", style="bold magenta")
+            previous = context
+            context, ended = self._run_steps(step.steps, context)
+            if ended:
+                return context, True
+
+            if step.until is not None and condition_matches(step.until, context):
+                ui.info(f"✅ Loop exit condition met after {iteration} iteration(s).", style="success")
+                return context, False
+            if context == previous:
+                ui.info(f"⏹ Loop output stopped changing after {iteration} iteration(s).", style="dim")
+                return context, False
+
+        if step.until is not None:
+            ui.print_error(f"Loop hit its cap of {step.max_iterations} iterations without meeting its exit condition.")
+        return context, False
+
+    @staticmethod
+    def _agents_in(steps: List[WorkflowStep]) -> List[str]:
+        """Every agent id a step list can run, including nested routers and loops."""
+        agents = []
+        for step in steps:
+            if step.agent:
+                agents.append(step.agent)
+            if step.foreach:
+                agents += [a for a in (step.foreach.agent, step.foreach.then) if a]
+            agents += Orchestrator._agents_in(step.steps)
+            for route in step.routes + ([step.default] if step.default else []):
+                agents += Orchestrator._agents_in(route.steps)
+        return agents
+
     def _run_parallel(self) -> str:
         """
         Runs multiple agents at the same time (conceptually).
         Useful for brainstorming or voting.
+        In "race" mode the workflow moves on as soon as `quorum` branches
+        returned an acceptable answer, and the remaining branches are cancelled.
+        Branches that miss their deadline are abandoned; the aggregator gets
+        everything that did finish plus a note about the stragglers.
         """
-        branches = self.config.workflow.branches
-        results = []
+        workflow = self.config.workflow
+        if workflow.foreach:
+            return self._run_foreach(workflow.foreach, "Start of workflow.")
+
+        branches = workflow.branches
+        racing = workflow.mode == "race"
+        answers: List[Tuple[str, str]] = []  # (agent id, accepted output) for the aggregator
+        notes: List[str] = []  # Stragglers, passed on as they are
+        rejected: List[Tuple[str, str]] = []
+        winners = []
+        timed_out = []
+
+        ui.info("\n⚡ Starting Parallel Execution...")
+
+        # Shared flag that tells still-running branches to stop making LLM calls
+        cancel_event = threading.Event()
 
-        print("\n⚡ Starting Parallel Execution...")
-        
-        # We use a ThreadPool to run them truly in parallel
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_agent = {}
-            
+        # We use a ThreadPool to run them truly in parallel (or queue workers in distributed mode)
+        executor = None if self.dispatcher else concurrent.futures.ThreadPoolExecutor()
+        future_to_agent = {}
+        deadlines = {}
+        start = time.monotonic()
+        try:
             for branch_agent_id in branches:
                 if branch_agent_id in self.agents_map:
                     agent = self.agents_map[branch_agent_id]
+                    deadline = self._agent_deadline(agent, start)
                     # Submit the job
-                    future = executor.submit(
-                        AgentRunner.run, 
-                        agent=agent, 
-                        context="Parallel Task", 
-                        task_input="Execute your specific goal independently."
+                    future = self._dispatch(
+                        executor,
+                        agent,
+                        context="Parallel Task",
+                        task_input="Execute your specific goal independently.",
+                        cancel_event=cancel_event,
+                        deadline=deadline
                     )
                     future_to_agent[future] = branch_agent_id
-            
-            # Collect results as they finish
-            for future in concurrent.futures.as_completed(future_to_agent):
+                    deadlines[future] = deadline
+
+            # Collect results as they finish (or as their deadlines pass)
+            for future, expired in self._iter_completed(future_to_agent, deadlines):
                 agent_id = future_to_agent[future]
+                if expired:
+                    timed_out.append(agent_id)
+                    ui.log_agent_status(agent_id, "⏱ timed out")
+                    ui.print_error(f"Agent '{agent_id}' missed its deadline and was abandoned.")
+                    continue
+
                 try:
                     res = future.result()
-                    results.append(f"Agent {agent_id} said: {res}")
+                except AgentTimeout:
+                    timed_out.append(agent_id)
+                    ui.log_agent_status(agent_id, "⏱ timed out")
+                    continue
+                except (AgentCancelled, concurrent.futures.CancelledError):
+                    ui.log_agent_status(agent_id, "✗ cancelled")
+                    continue
                 except Exception as e:
-                    results.append(f"Agent {agent_id} failed: {e}")
+                    # A failure is not an answer: it neither counts toward the quorum nor reaches the output
+                    ui.log_agent_status(agent_id, "✗ failed")
+                    ui.print_error(f"Agent '{agent_id}' failed: {e}")
+                    db.log_event(agent_id, "branch_failed", str(e))
+                    continue
+
+                if racing and not self._is_acceptable(res):
+                    rejected.append((agent_id, res))
+                    continue
+
+                answers.append((agent_id, res))
+                winners.append(res)
+
+                if racing and len(answers) >= workflow.quorum:
+                    pending = len(future_to_agent) - sum(f.done() for f in future_to_agent)
+                    ui.info(
+                        f"🏁 Quorum of {workflow.quorum} reached "
+                        f"(last: {agent_id}). Cancelling {pending} branch(es).",
+                        style="bold magenta"
+                    )
+                    break
+        finally:
+            # We never wait for losers or stragglers: queued branches are dropped
+            # and running ones stop at their next step boundary.
+            cancel_event.set()
+            if executor is not None:
+                executor.shutdown(wait=not (racing or timed_out), cancel_futures=True)
+            for future, agent_id in future_to_agent.items():
+                if not future.done() and agent_id not in timed_out:
+                    future.cancel()  # Drops queued tasks in distributed mode
+                    ui.log_agent_status(agent_id, "✗ cancelled")
+
+        if racing and len(answers) < workflow.quorum:
+            ui.print_error(
+                f"Only {len(answers)} of {workflow.quorum} required answers were acceptable. "
+                "Continuing with every answer received."
+            )
+            answers.extend(rejected)
+
+        if timed_out:
+            notes.append(
+                f"[Note: {len(timed_out)} branch(es) timed out and returned no result: "
+                f"{', '.join(timed_out)}]"
+            )
 
         # Aggregation Step (if a 'then' step exists)
-        aggregated_context = "\n".join(results)
-        
-        if self.config.workflow.then:
-            final_agent_id = self.config.workflow.then.agent
-            ui.console.print(f"\n[bold magenta]🔄 Aggregating results with {final_agent_id}...[/bold magenta]")
-            
+        entries = self._condense_outputs(answers, workflow) + notes
+        aggregated_context = "\n".join(entries)
+
+        if workflow.then:
+            final_agent_id = workflow.then.agent
             final_agent = self.agents_map[final_agent_id]
-            return AgentRunner.run(
-                final_agent, 
-                context=aggregated_context, 
-                task_input="Summarize these parallel results."
+
+            budget = workflow.aggregate.max_tokens
+            if budget and estimate_tokens(aggregated_context) > budget:
+                aggregated_context = self._aggregate_in_groups(final_agent, entries, budget)
+
+            ui.info(f"\n🔄 Aggregating results with {final_agent_id}...", style="bold magenta")
+            try:
+                return self._run_agent(
+                    final_agent,
+                    context=aggregated_context,
+                    task_input="Summarize these parallel results."
+                )
+            except AgentCancelled:
+                ui.print_error(f"Aggregator '{final_agent_id}' timed out. Returning the raw branch results.")
+                return aggregated_context
+
+        # A single race winner is the answer itself
+        if racing and workflow.quorum == 1 and winners:
+            return winners[0]
+
+        return aggregated_context
+
+    def _condense_outputs(self, answers: List[Tuple[str, str]], workflow: WorkflowConfig) -> List[str]:
+        """
+        Turns branch outputs into aggregator entries, in branch order (not
+        completion order, so the same answers always make the same prompt).
+        With `aggregate.dedupe`, near-identical outputs are merged into one
+        entry that lists its agents as votes.
+        """
+        order = {agent_id: i for i, agent_id in enumerate(workflow.branches)}
+        answers = sorted(answers, key=lambda answer: order.get(answer[0], len(order)))
+        aggregate = workflow.aggregate
+        if not aggregate.dedupe or len(answers) < 2:
+            return [f"Agent {agent_id} said: {res}" for agent_id, res in answers]
+
+        groups = group_near_duplicates(answers, aggregate.threshold)
+        merged = len(answers) - len(groups)
+        if merged:
+            ui.info(f"🧹 Merged {merged} near-identical branch output(s) into {len(groups)} entries.", style="dim")
+            db.log_event("orchestrator", "condense", json.dumps([g.agents for g in groups if g.votes > 1]))
+        return render_groups(groups)
+
+    def _aggregate_in_groups(self, aggregator: AgentConfig, entries: List[str], budget: int) -> str:
+        """
+        Hierarchical aggregation: while the entries exceed `budget` tokens, the
+        aggregator summarizes batches of them (in parallel) and the summaries
+        replace them. Stops as soon as a level doesn't make the text shorter
+        (e.g. every entry is too big to share a batch and the summaries are no
+        smaller), and after MAX_AGGREGATE_LEVELS at the latest.
+        Returns what the final aggregator call gets to see.
+        """
+        tokens = estimate_tokens("\n".join(entries))
+        for level in range(1, MAX_AGGREGATE_LEVELS + 1):
+            if tokens <= budget or self._workflow_expired():
+                break
+            batches = pack_entries(entries, budget)
+            if len(batches) < 2:
+                break  # A single oversized entry can't be split any further
+            ui.info(f"\n🪜 Partial aggregation (level {level}): {len(entries)} entries in {len(batches)} groups...",
+                    style="bold magenta")
+            summaries = self._summarize_batches(aggregator, batches, level)
+            condensed = [f"Summary of group {i + 1} (level {level}): {summary}" for i, summary in enumerate(summaries)]
+            condensed_tokens = estimate_tokens("\n".join(condensed))
+            if condensed_tokens >= tokens:
+                ui.print_error(f"Partial aggregation (level {level}) didn't shorten the results. Stopping here.")
+                break
+            entries, tokens = condensed, condensed_tokens
+        return "\n".join(entries)
+
+    def _summarize_batches(self, aggregator: AgentConfig, batches: List[List[str]], level: int) -> List[str]:
+        """One aggregator call per batch, all at once. A batch whose call fails is kept as it is."""
+        def summarize(i: int, batch: List[str]) -> str:
+            return self._run_agent(
+                aggregator, context="\n".join(batch),
+                task_input=(f"Summarize these parallel results (group {i + 1} of {len(batches)}). "
+                            "Keep every distinct point, note where results disagree, and keep vote counts.")
             )
-            
-        return aggregated_context
\ No newline at end of file
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(batches), 8)) as executor:
+            futures = [self._submit(executor, summarize, i=i, batch=batch) for i, batch in enumerate(batches)]
+            summaries = []
+            for i, future in enumerate(futures):
+                try:
+                    summaries.append(future.result())
+                except Exception as e:
+                    ui.print_error(f"Partial aggregation of group {i + 1} (level {level}) failed: {e}. Keeping it as is.")
+                    summaries.append("\n".join(batches[i]))
+        return summaries
+
+    def _run_foreach(self, spec: ForEach, context: str) -> str:
+        """
+        Runs one agent over every item, at most `concurrency` at a time.
+        Results are released in input order; with a `then` aggregator they are
+        folded into a running summary chunk by chunk while later items are
+        still running, so thousands of items never form one giant prompt.
+        Items are pulled lazily and only a small window runs ahead of the
+        oldest unfinished item, which keeps memory bounded.
+        """
+        if spec.agent not in self.agents_map:
+            ui.print_error(f"Agent '{spec.agent}' not found in configuration.")
+            return context
+        if spec.then and spec.then not in self.agents_map:
+            ui.print_error(f"Aggregator '{spec.then}' not found in configuration.")
+            return context
+
+        agent = self.agents_map[spec.agent]
+        aggregator = self.agents_map[spec.then] if spec.then else None
+        items = iter_items(spec, context)
+        collector = OrderedCollector(aggregate=aggregator is not None, output_path=spec.output)
+        window = spec.concurrency * 4  # How far submission may run ahead of the oldest pending item
+
+        ui.info(f"\n📦 Fan-out: {agent.id} over items ({spec.concurrency} at a time)...")
+
+        cancel_event = threading.Event()
+        executor = None if self.dispatcher else concurrent.futures.ThreadPoolExecutor(max_workers=spec.concurrency)
+        in_flight: Dict[concurrent.futures.Future, Tuple[int, str]] = {}
+        deadlines: Dict[concurrent.futures.Future, Optional[float]] = {}
+        submitted = 0
+        exhausted = False
+        failed = []
+        timed_out = []
+        summary = None
+        try:
+            while True:
+                # 1. Keep `concurrency` items in flight
+                while (not exhausted and len(in_flight) < spec.concurrency
+                       and submitted < collector.next_index + window and not self._workflow_expired()):
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    except (ValueError, OSError) as e:
+                        ui.print_error(f"foreach: {e}")
+                        exhausted = True
+                        break
+                    deadline = self._agent_deadline(agent)
+                    future = self._dispatch(
+                        executor, agent,
+                        context=f"Item {submitted + 1} of a fan-out.",
+                        task_input=render_task(spec.task, item, submitted),
+                        cancel_event=cancel_event, deadline=deadline
+                    )
+                    in_flight[future] = (submitted, item)
+                    deadlines[future] = deadline
+                    submitted += 1
+
+                if not in_flight:
+                    break
+
+                # 2. Take the next finished (or expired) item
+                future, expired = next(self._iter_completed(in_flight, deadlines))
+                index, item = in_flight.pop(future)
+                deadlines.pop(future, None)
+                if expired:
+                    timed_out.append(index + 1)
+                    result = "[timed out]"
+                else:
+                    try:
+                        result = future.result()
+                    except (AgentCancelled, concurrent.futures.CancelledError):
+                        timed_out.append(index + 1)
+                        result = "[cancelled]"
+                    except Exception as e:
+                        failed.append(index + 1)
+                        result = f"[failed: {e}]"
+                collector.add(index, item, result)
+
+                # 3. Stream full chunks to the aggregator in input order
+                if aggregator is not None and collector.chunk_ready():
+                    summary = self._fold_results(aggregator, summary, *collector.take_chunk())
+
+            if aggregator is not None and collector.has_chunk():
+                summary = self._fold_results(aggregator, summary, *collector.take_chunk())
+            # No items (or a deadline before the first one) leaves no summary: start from empty text
+            output = summary if summary is not None else collector.read_all()
+        finally:
+            cancel_event.set()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            for future in in_flight:
+                future.cancel()
+            collector.close()
+
+        ui.info(f"📦 Fan-out finished: {collector.released} item(s).", style="success")
+        notes = []
+        if failed:
+            notes.append(f"{len(failed)} item(s) failed: {self._short_list(failed)}")
+        if timed_out:
+            notes.append(f"{len(timed_out)} item(s) timed out: {self._short_list(timed_out)}")
+        if not exhausted:
+            ui.print_error("Workflow deadline reached. Remaining fan-out items were skipped.")
+            notes.append(f"the workflow deadline stopped the fan-out after {collector.released} item(s)")
+        for note in notes:
+            output += f"\n[Note: {note}]"
+        return output
+
+    def _fold_results(self, aggregator: AgentConfig, summary: Optional[str],
+                      first: int, last: int, chunk: str) -> str:
+        """One rolling aggregation step: the summary so far plus the next ordered chunk."""
+        ui.info(f"\n🔄 Aggregating items {first}-{last} with {aggregator.id}...", style="bold magenta")
+        if summary is None:
+            context = f"Results for items {first}-{last}:\n{chunk}"
+            task_input = "Summarize these parallel results."
+        else:
+            context = f"Summary of items 1-{first - 1}:\n{summary}\n\nResults for items {first}-{last}:\n{chunk}"
+            task_input = "Update the summary so that it covers all of these results."
+        try:
+            return self._run_agent(aggregator, context=context, task_input=task_input)
+        except AgentCancelled:
+            ui.print_error(f"Aggregator '{aggregator.id}' timed out. Keeping the raw results for items {first}-{last}.")
+            return f"{summary}\n{chunk}" if summary else chunk
+
+    @staticmethod
+    def _short_list(numbers: List[int], limit: int = 20) -> str:
+        shown = ", ".join(str(n) for n in numbers[:limit])
+        return shown + (f" and {len(numbers) - limit} more" if len(numbers) > limit else "")
+
+    def _is_acceptable(self, output: str) -> bool:
+        """
+        Acceptance check used by race mode: a real answer, matching `accept` if configured.
+        The pattern is used as written (add `(?i)` for a case-insensitive match).
+        """
+        if not output or not output.strip() or output.startswith("❌ LLM Error"):
+            return False
+        pattern = self.config.workflow.accept
+        if pattern and not re.search(pattern, output, re.DOTALL):
+            return False
+        return True
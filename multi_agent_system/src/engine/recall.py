@@ -0,0 +1,106 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from src.schema import AgentConfig
+from src.interface.database import db
+from src.interface import blobs
+from src.interface.context import visible_namespaces
+
+# Words that say nothing about which memory is relevant
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "your", "you", "are", "was", "were",
+    "have", "has", "had", "not", "but", "all", "any", "can", "will", "should", "would", "could",
+    "about", "what", "which", "when", "where", "who", "how", "why", "their", "there", "then", "than",
+    "them", "they", "its", "our", "out", "use", "using", "make", "sure", "each", "more", "most",
+    "some", "such", "only", "also", "very", "just", "follow", "provided", "instructions", "task",
+    "complete", "assigned", "current", "context", "please", "answer", "write", "give", "based",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Scores: a key named in the goal/task beats any keyword overlap
+MENTION_SCORE = 100.0
+KEY_WORD_SCORE = 3.0
+VALUE_WORD_SCORE = 1.0
+# An entry needs one matching key word or two matching value words
+MIN_SCORE = 2.0
+
+# Only the start of a value is scanned for keywords
+VALUE_SCAN_CHARS = 4000
+
+
+def keywords(text: str) -> Set[str]:
+    """Lower-case content words, with a naive plural 's' stripped."""
+    words = set()
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+def key_mentioned(key: str, text: str) -> bool:
+    """'user_prefs' counts as mentioned by 'user_prefs' as well as 'user prefs'."""
+    variants = {key.lower(), re.sub(r"[_\-.]+", " ", key.lower())}
+    return any(re.search(rf"(?<![\w]){re.escape(v)}(?![\w])", text) for v in variants if v.strip())
+
+
+def score_entry(key: str, value: Optional[str], query: Set[str], query_text: str) -> float:
+    """Relevance of one memory entry; `value` is None when it is still a blob reference."""
+    if key_mentioned(key, query_text):
+        return MENTION_SCORE
+    score = KEY_WORD_SCORE * len(keywords(key) & query)
+    if value:
+        score += VALUE_WORD_SCORE * len(keywords(value[:VALUE_SCAN_CHARS]) & query)
+    return score
+
+
+def select_memories(agent: AgentConfig, task_input: str) -> List[Tuple[str, str, str]]:
+    """
+    Picks the memory entries worth showing to an agent, best first, as
+    (namespace, key, value) within the agent's recall budget.
+    Large values stay blob references while scoring (by key only) and are
+    loaded only if selected.
+    """
+    recall = agent.recall
+    query_text = " ".join(filter(None, [agent.goal, agent.instructions, task_input])).lower()
+    query = keywords(query_text)
+
+    # The most specific namespace wins for a key (agent, then run, then global)
+    namespaces = visible_namespaces()
+    rank = {ns: i for i, ns in enumerate(namespaces)}
+    entries: Dict[str, Tuple[str, str]] = {}
+    for namespace, key, value, _ in db.list_memory(namespaces, resolve=False):
+        if key not in entries or rank[namespace] < rank[entries[key][0]]:
+            entries[key] = (namespace, value)
+
+    scored = []
+    for key, (namespace, value) in entries.items():
+        if key in recall.keys:
+            score = float("inf")
+        else:
+            score = score_entry(key, None if blobs.parse_ref(value) else value, query, query_text)
+        if score >= MIN_SCORE:
+            scored.append((-score, rank[namespace], key, namespace, value))
+    scored.sort()
+
+    selected, used = [], 0
+    for _, _, key, namespace, value in scored[:recall.max_entries]:
+        remaining = recall.max_chars - used - len(key) - 4
+        if remaining < 40:
+            break
+        # Only as much of a blob as fits the budget is decompressed
+        text = (db.resolve(value, max_chars=remaining + 1) or "").strip()
+        if len(text) > remaining:
+            text = text[:remaining - 3].rstrip() + "..."
+        selected.append((namespace, key, text))
+        used += len(key) + 4 + len(text)
+    return selected
+
+
+def render_memories(selected: List[Tuple[str, str, str]]) -> str:
+    """The block added to the agent's user message."""
+    lines = ["Relevant memory (already loaded, no need to call read_memory for these keys):"]
+    lines += [f"- {key}: {value}" for _, key, value in selected]
+    return "\n".join(lines)
@@ -0,0 +1,121 @@
+import difflib
+import re
+from typing import Any, List, Optional, Tuple
+from src.schema import Condition, Route, WorkflowStep
+from src.engine.llm import llm_client
+from src.engine.jsonscan import find_json
+
+# How much of the previous output the classifier gets to see
+CLASSIFIER_MAX_INPUT = 4000
+
+_MISSING = object()
+
+
+def extract_json_object(text: str) -> Optional[dict]:
+    """Returns the first JSON object embedded in an agent's output, if any."""
+    return find_json(text, lambda value: isinstance(value, dict), openers="{")
+
+
+def _lookup(obj: Any, path: str) -> Any:
+    """Follows a dotted path ('review.scores.0') through dicts and lists."""
+    for part in path.split("."):
+        if isinstance(obj, dict) and part in obj:
+            obj = obj[part]
+        elif isinstance(obj, list) and part.isdigit() and int(part) < len(obj):
+            obj = obj[int(part)]
+        else:
+            return _MISSING
+    return obj
+
+
+def _normalize(value: Any) -> str:
+    # YAML true / JSON true / "True" all compare equal
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value).strip().lower()
+
+
+def condition_matches(condition: Condition, output: str) -> bool:
+    """Checks an output against a regex and/or a JSON field rule."""
+    matched = True
+    if condition.pattern:
+        matched = re.search(condition.pattern, output, re.IGNORECASE | re.DOTALL) is not None
+
+    if matched and condition.path:
+        obj = extract_json_object(output)
+        value = _lookup(obj, condition.path) if obj is not None else _MISSING
+        if value is _MISSING:
+            matched = False
+        elif condition.equals:
+            matched = _normalize(value) in {_normalize(v) for v in condition.equals}
+        else:
+            matched = bool(value)
+
+    return matched != condition.negate
+
+
+def classify(step: WorkflowStep, output: str, timeout: Optional[float] = None) -> Optional[Route]:
+    """
+    One short call to the router's (cheap) classifier model that names a route.
+    The options go in the system prompt so it stays identical between runs.
+    """
+    options = "\n".join(
+        f"- {route.name}: {route.description or ', '.join(s.agent for s in route.steps if s.agent) or 'no action'}"
+        for route in step.routes
+    )
+    system = (
+        "You are a router. Read the input and pick the single option that fits it best.\n"
+        f"Options:\n{options}\n"
+        "Reply with the option name only."
+    )
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": output[:CLASSIFIER_MAX_INPUT]}
+    ]
+    reply = llm_client.chat(messages, model=step.classifier, timeout=timeout)
+    if reply.startswith("❌ LLM Error"):
+        return None
+    return match_route_name(reply, step.routes)
+
+
+def match_route_name(reply: str, routes: List[Route]) -> Optional[Route]:
+    """Maps a free-text classifier reply onto a route name."""
+    by_name = {route.name.lower(): route for route in routes}
+    answer = reply.strip().strip("`'\".").lower()
+
+    # 1. Exact answer
+    if answer in by_name:
+        return by_name[answer]
+
+    # 2. A route name mentioned in a chattier reply (earliest mention wins)
+    mentions = []
+    for name, route in by_name.items():
+        found = re.search(rf"\b{re.escape(name)}\b", answer)
+        if found:
+            mentions.append((found.start(), route))
+    if mentions:
+        return min(mentions, key=lambda m: m[0])[1]
+
+    # 3. Typos
+    close = difflib.get_close_matches(answer, list(by_name), n=1, cutoff=0.6)
+    return by_name[close[0]] if close else None
+
+
+def choose_route(step: WorkflowStep, output: str,
+                 timeout: Optional[float] = None) -> Tuple[Optional[Route], str]:
+    """
+    Picks the route for a router step. Returns (route, how it was chosen).
+    Rules cost nothing, so they are tried before the classifier.
+    """
+    for route in step.routes:
+        if route.when is not None and condition_matches(route.when, output):
+            return route, "rule"
+
+    if step.classifier:
+        route = classify(step, output, timeout=timeout)
+        if route is not None:
+            return route, f"classifier {step.classifier}"
+
+    if step.default is not None:
+        return step.default, "default"
+    return None, "no match"
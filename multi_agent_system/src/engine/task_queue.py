@@ -0,0 +1,391 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+# =============================================================================
+#  DURABLE AGENT TASK QUEUE
+#  The coordinator (Orchestrator) enqueues agent tasks; worker processes on
+#  any machine claim them with a time-limited lease and post results back.
+#  A task whose lease runs out (crashed/hung worker) is handed out again
+#  until it has used up `max_attempts`.
+#  Finished tasks are kept for TASK_RESULT_TTL seconds so the coordinator can
+#  collect their results, then deleted.
+# =============================================================================
+
+TASK_RESULT_TTL = float(os.getenv("TASK_RESULT_TTL", "86400"))
+
+@dataclass
+class AgentTask:
+    agent: Dict[str, Any]        # AgentConfig as a plain dict
+    context: str
+    task_input: str
+    run_id: Optional[str] = None
+    deadline: Optional[float] = None  # Wall-clock (time.time) deadline, if any
+    max_attempts: int = 3
+    attempts: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "AgentTask":
+        return cls(**json.loads(raw))
+
+
+@dataclass
+class TaskResult:
+    status: str                  # "done", "failed" or "cancelled"
+    result: Optional[str] = None
+    error: Optional[str] = None
+    worker_id: Optional[str] = None
+
+
+class TaskQueue(ABC):
+    """Interface every queue backend implements."""
+
+    @abstractmethod
+    def enqueue(self, task: AgentTask) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[AgentTask]:
+        """Atomically takes the oldest queued task and leases it to `worker_id`."""
+
+    @abstractmethod
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extends a lease. False means the task was cancelled or re-assigned: stop working on it."""
+
+    @abstractmethod
+    def complete(self, task_id: str, worker_id: str, result: Optional[str] = None,
+                 error: Optional[str] = None, status: Optional[str] = None):
+        ...
+
+    @abstractmethod
+    def cancel(self, task_id: str):
+        ...
+
+    @abstractmethod
+    def results(self, task_ids: List[str]) -> Dict[str, TaskResult]:
+        """Final results for whichever of `task_ids` have finished."""
+
+    @abstractmethod
+    def requeue_expired(self) -> Tuple[int, int]:
+        """Re-queues tasks with expired leases. Returns (requeued, given_up)."""
+
+    @abstractmethod
+    def prune_finished(self, max_age_seconds: float = TASK_RESULT_TTL) -> int:
+        """Deletes tasks that finished more than `max_age_seconds` ago. Returns how many."""
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Default backend: a `tasks` table in a SQLite file. Works for any number of
+    worker processes on the same machine (or sharing a local volume).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker_id TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                result TEXT,
+                error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks (status, lease_until)')
+        conn.commit()
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, task: AgentTask) -> str:
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO tasks (id, payload, status, attempts, max_attempts, created_at, updated_at) '
+            'VALUES (?, ?, ?, 0, ?, ?, ?)',
+            (task.id, task.to_json(), "queued", task.max_attempts, now, now)
+        )
+        conn.commit()
+        conn.close()
+        return task.id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[AgentTask]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE status = 'queued' "
+                "ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if not row:
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', worker_id = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row[0])
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        task = AgentTask.from_json(row[1])
+        task.attempts = row[2] + 1
+        return task
+
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE tasks SET lease_until = ?, updated_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+            (time.time() + lease_seconds, time.time(), task_id, worker_id)
+        )
+        conn.commit()
+        conn.close()
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: str, worker_id: str, result: Optional[str] = None,
+                 error: Optional[str] = None, status: Optional[str] = None):
+        status = status or ("failed" if error else "done")
+        conn = self._connect()
+        # Only the current lease holder may post; a worker whose lease expired
+        # (and whose task was handed to someone else) is ignored.
+        conn.execute(
+            "UPDATE tasks SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+            (status, result, error, time.time(), task_id, worker_id)
+        )
+        conn.commit()
+        conn.close()
+
+    def cancel(self, task_id: str):
+        conn = self._connect()
+        conn.execute(
+            "UPDATE tasks SET status = 'cancelled', updated_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'leased')",
+            (time.time(), task_id)
+        )
+        conn.commit()
+        conn.close()
+
+    def results(self, task_ids: List[str]) -> Dict[str, TaskResult]:
+        if not task_ids:
+            return {}
+        conn = self._connect()
+        placeholders = ",".join("?" for _ in task_ids)
+        rows = conn.execute(
+            f"SELECT id, status, result, error, worker_id FROM tasks "
+            f"WHERE id IN ({placeholders}) AND status IN ('done', 'failed', 'cancelled')",
+            tuple(task_ids)
+        ).fetchall()
+        conn.close()
+        return {r[0]: TaskResult(status=r[1], result=r[2], error=r[3], worker_id=r[4]) for r in rows}
+
+    def requeue_expired(self) -> Tuple[int, int]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            given_up = conn.execute(
+                "UPDATE tasks SET status = 'failed', error = 'Lease expired after ' || attempts || ' attempt(s)', "
+                "updated_at = ? WHERE status = 'leased' AND lease_until < ? AND attempts >= max_attempts",
+                (now, now)
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE tasks SET status = 'queued', worker_id = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_until < ?",
+                (now, now)
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return requeued, given_up
+
+    def prune_finished(self, max_age_seconds: float = TASK_RESULT_TTL) -> int:
+        conn = self._connect()
+        deleted = conn.execute(
+            "DELETE FROM tasks WHERE status IN ('done', 'failed', 'cancelled') AND updated_at < ?",
+            (time.time() - max_age_seconds,)
+        ).rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+
+
+class RedisTaskQueue(TaskQueue):
+    """
+    Network backend for workers on other machines. Needs the optional
+    `redis` package (pip install redis).
+    Layout: a list of queued ids, a sorted set of leases scored by expiry,
+    and one hash per task. Finished task hashes expire after TASK_RESULT_TTL.
+    """
+
+    # Pop the next id and lease it in one atomic step
+    _CLAIM = """
+    local id = redis.call('RPOP', KEYS[1])
+    if not id then return nil end
+    local key = ARGV[3] .. id
+    redis.call('HSET', key, 'status', 'leased', 'worker_id', ARGV[1])
+    redis.call('HINCRBY', key, 'attempts', 1)
+    redis.call('ZADD', KEYS[2], ARGV[2], id)
+    return {id, redis.call('HGET', key, 'payload'), redis.call('HGET', key, 'attempts')}
+    """
+
+    def __init__(self, url: str, prefix: str = "maq:", result_ttl: float = TASK_RESULT_TTL):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis queue backend needs the 'redis' package: pip install redis")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.queue_key = f"{prefix}queue"
+        self.lease_key = f"{prefix}leases"
+        self.result_ttl = max(1, int(result_ttl))
+        self._claim = self.client.register_script(self._CLAIM)
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.prefix}task:{task_id}"
+
+    def enqueue(self, task: AgentTask) -> str:
+        pipe = self.client.pipeline()
+        pipe.hset(self._task_key(task.id), mapping={
+            "payload": task.to_json(), "status": "queued",
+            "attempts": 0, "max_attempts": task.max_attempts
+        })
+        pipe.lpush(self.queue_key, task.id)
+        pipe.execute()
+        return task.id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[AgentTask]:
+        while True:
+            found = self._claim(
+                keys=[self.queue_key, self.lease_key],
+                args=[worker_id, time.time() + lease_seconds, f"{self.prefix}task:"]
+            )
+            if not found:
+                return None
+            task_id, payload, attempts = found
+            if payload is None:
+                # Cancelled and cleaned up while queued
+                self.client.zrem(self.lease_key, task_id)
+                continue
+            task = AgentTask.from_json(payload)
+            task.attempts = int(attempts)
+            return task
+
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        key = self._task_key(task_id)
+        status, owner = self.client.hmget(key, "status", "worker_id")
+        if status != "leased" or owner != worker_id:
+            return False
+        self.client.zadd(self.lease_key, {task_id: time.time() + lease_seconds})
+        return True
+
+    def complete(self, task_id: str, worker_id: str, result: Optional[str] = None,
+                 error: Optional[str] = None, status: Optional[str] = None):
+        key = self._task_key(task_id)
+        current, owner = self.client.hmget(key, "status", "worker_id")
+        if current != "leased" or owner != worker_id:
+            return
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={
+            "status": status or ("failed" if error else "done"),
+            "result": result or "", "error": error or ""
+        })
+        pipe.zrem(self.lease_key, task_id)
+        pipe.expire(key, self.result_ttl)
+        pipe.execute()
+
+    def cancel(self, task_id: str):
+        key = self._task_key(task_id)
+        if self.client.hget(key, "status") in ("queued", "leased"):
+            pipe = self.client.pipeline()
+            pipe.hset(key, "status", "cancelled")
+            pipe.lrem(self.queue_key, 0, task_id)
+            pipe.zrem(self.lease_key, task_id)
+            pipe.expire(key, self.result_ttl)
+            pipe.execute()
+
+    def results(self, task_ids: List[str]) -> Dict[str, TaskResult]:
+        pipe = self.client.pipeline()
+        for task_id in task_ids:
+            pipe.hmget(self._task_key(task_id), "status", "result", "error", "worker_id")
+        finished = {}
+        for task_id, (status, result, error, worker_id) in zip(task_ids, pipe.execute()):
+            if status in ("done", "failed", "cancelled"):
+                finished[task_id] = TaskResult(status, result or None, error or None, worker_id)
+        return finished
+
+    def requeue_expired(self) -> Tuple[int, int]:
+        requeued = given_up = 0
+        for task_id in self.client.zrangebyscore(self.lease_key, 0, time.time()):
+            # Whoever removes the lease first owns the retry decision
+            if not self.client.zrem(self.lease_key, task_id):
+                continue
+            key = self._task_key(task_id)
+            attempts, max_attempts = self.client.hmget(key, "attempts", "max_attempts")
+            if int(attempts or 0) >= int(max_attempts or 1):
+                self.client.hset(key, mapping={
+                    "status": "failed", "error": f"Lease expired after {attempts} attempt(s)"
+                })
+                self.client.expire(key, self.result_ttl)
+                given_up += 1
+            else:
+                self.client.hset(key, mapping={"status": "queued", "worker_id": ""})
+                self.client.rpush(self.queue_key, task_id)  # Retry goes to the front
+                requeued += 1
+        return requeued, given_up
+
+    def prune_finished(self, max_age_seconds: float = TASK_RESULT_TTL) -> int:
+        # Finished hashes carry a Redis TTL and disappear on their own
+        return 0
+
+
+# Backends by URL scheme. Register your own with register_queue_backend().
+QUEUE_BACKENDS: Dict[str, Type[TaskQueue]] = {
+    "sqlite": SQLiteTaskQueue,
+    "redis": RedisTaskQueue,
+    "rediss": RedisTaskQueue,
+}
+
+
+def register_queue_backend(scheme: str, backend: Type[TaskQueue]):
+    """Makes `<scheme>://...` queue URLs open `backend(url)`."""
+    QUEUE_BACKENDS[scheme] = backend
+
+
+def open_queue(url: Optional[str] = None) -> TaskQueue:
+    """
+    Opens a queue from a URL:
+        sqlite:///data/queue.db   (default: the orchestrator database)
+        redis://host:6379/0
+    """
+    url = url or os.getenv("TASK_QUEUE_URL") or f"sqlite:///{os.getenv('DB_PATH', 'orchestrator.db')}"
+    scheme = url.split("://", 1)[0].lower() if "://" in url else "sqlite"
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown task queue backend '{scheme}'. Expected one of: {list(QUEUE_BACKENDS)}")
+    if scheme == "sqlite":
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        path = url.split("://", 1)[1] if "://" in url else url
+        return SQLiteTaskQueue(path[1:] if path.startswith("/") else path)
+    return QUEUE_BACKENDS[scheme](url)
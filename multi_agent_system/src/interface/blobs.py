@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+import zlib
+from typing import Optional, Tuple
+
+# Rows point at a blob with "blob:sha256:<hex digest of the UTF-8 text>"
+BLOB_PREFIX = "blob:sha256:"
+_BLOB_REF = re.compile(r'^blob:sha256:([0-9a-f]{64})$')
+
+# Values at least this large (UTF-8 bytes) are moved into the blob store; 0 disables it
+BLOB_MIN_BYTES = int(os.getenv("BLOB_MIN_BYTES", "4096"))
+
+# 'auto' uses zstd when the optional `zstandard` package is installed, zlib otherwise
+BLOB_CODEC = os.getenv("BLOB_CODEC", "auto").lower()
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def default_codec() -> str:
+    if BLOB_CODEC == "zstd" and _zstd() is None:
+        raise ImportError("BLOB_CODEC=zstd needs the optional 'zstandard' package: pip install zstandard")
+    if BLOB_CODEC in ("zstd", "zlib"):
+        return BLOB_CODEC
+    return "zstd" if _zstd() is not None else "zlib"
+
+
+def blob_ref(digest: str) -> str:
+    return BLOB_PREFIX + digest
+
+
+def parse_ref(value) -> Optional[str]:
+    """The digest if `value` is a blob reference, else None."""
+    if isinstance(value, str) and value.startswith(BLOB_PREFIX):
+        match = _BLOB_REF.match(value)
+        return match.group(1) if match else None
+    return None
+
+
+def should_store(text: Optional[str]) -> bool:
+    # Cheap length check first: a UTF-8 string is never shorter in bytes than in characters
+    return bool(BLOB_MIN_BYTES) and text is not None and (
+        len(text) >= BLOB_MIN_BYTES or len(text.encode("utf-8")) >= BLOB_MIN_BYTES
+    )
+
+
+def encode(text: str) -> Tuple[str, str, int, bytes]:
+    """Returns (digest, codec, raw size, compressed bytes) for a text."""
+    raw = text.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    codec = default_codec()
+    if codec == "zstd":
+        data = _zstd().ZstdCompressor(level=3).compress(raw)
+    else:
+        data = zlib.compress(raw, 6)
+    return digest, codec, len(raw), data
+
+
+def decode(codec: str, data: bytes, max_bytes: Optional[int] = None) -> str:
+    """
+    Decompresses a blob. With `max_bytes` only that much of the start is
+    decompressed, which is all a preview (e.g. `main.py logs`) needs.
+    """
+    if max_bytes is not None and max_bytes <= 0:
+        return ""
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ImportError("This blob is zstd-compressed; install the 'zstandard' package to read it")
+        with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+            raw = reader.read(max_bytes) if max_bytes is not None else reader.read()
+    elif codec == "zlib":
+        raw = zlib.decompressobj().decompress(data, max_bytes) if max_bytes is not None else zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown blob codec '{codec}'")
+    # A prefix may end in the middle of a multi-byte character
+    return raw.decode("utf-8", errors="ignore" if max_bytes is not None else "strict")
@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.interface.context import get_agent_id
+
+# A cassette is a gzip file of JSON lines: a header, then one line per LLM or tool call:
+#   {"cassette": 1, "created": "...", "meta": {...}}
+#   {"kind": "llm", "name": "<model>", "agent": "writer", "key": "<sha256 of the request>",
+#    "seconds": 1.42, "response": {...}}                       (or "error": "..." if it raised)
+CASSETTE_VERSION = 1
+
+# Request fields that identify an LLM call (the per-call timeout depends on the deadline, so it doesn't)
+LLM_KEY_FIELDS = ("model", "messages", "tools", "tool_choice")
+
+
+class CassetteMiss(Exception):
+    """Replay reached a call the recording doesn't contain."""
+
+
+@dataclass
+class Interaction:
+    kind: str  # "llm" or "tool"
+    name: str  # Model or tool name
+    agent: Optional[str]
+    key: str
+    seconds: float
+    response: Any = None
+    error: Optional[str] = None
+    used: bool = False
+
+
+def request_key(kind: str, name: str, request: Dict[str, Any]) -> str:
+    if kind == "llm":
+        request = {k: request.get(k) for k in LLM_KEY_FIELDS}
+    payload = json.dumps([kind, name, request], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Records every LLM and tool call of a run, or plays them back.
+
+    Replay matches each call by its exact request first. If the request has
+    changed (e.g. a prompt was edited since the recording), the next unused
+    call with the same kind, model/tool and agent is used instead and counted
+    in `inexact`, so a run still completes. Calls are matched by content rather
+    than order because parallel branches finish in a different order every time.
+    """
+
+    def __init__(self, path: str, mode: str, realtime: bool = True, meta: Optional[Dict[str, Any]] = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'. Expected 'record' or 'replay'.")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.meta = meta or {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.inexact = 0
+        self.missed = 0
+        self._entries: List[Interaction] = []
+        self._by_key: Dict[str, List[Interaction]] = {}
+        self._by_name: Dict[Tuple[str, str, Optional[str]], List[Interaction]] = {}
+
+        if mode == "record":
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+            self._write({"cassette": CASSETTE_VERSION, "created": datetime.now().isoformat(), "meta": self.meta}, call=False)
+        else:
+            self._file = None
+            self._load()
+
+    @classmethod
+    def record(cls, path: str, **meta) -> "Cassette":
+        return cls(path, "record", meta=meta)
+
+    @classmethod
+    def replay(cls, path: str, realtime: bool = True) -> "Cassette":
+        """`realtime=False` skips the recorded latencies (zero-latency replay)."""
+        return cls(path, "replay", realtime=realtime)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def unused(self) -> int:
+        return sum(1 for entry in self._entries if not entry.used)
+
+    # --- RECORDING ---
+
+    def _write(self, record: Dict[str, Any], call: bool = True):
+        line = json.dumps(record, default=str, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.recorded += call
+
+    # --- REPLAY ---
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for number, line in enumerate(f):
+                    record = json.loads(line)
+                    if number == 0:
+                        if record.get("cassette") != CASSETTE_VERSION:
+                            raise ValueError(f"'{self.path}' is not a version {CASSETTE_VERSION} cassette")
+                        self.meta = record.get("meta") or {}
+                        continue
+                    entry = Interaction(kind=record["kind"], name=record["name"], agent=record.get("agent"),
+                                        key=record["key"], seconds=record.get("seconds", 0.0),
+                                        response=record.get("response"), error=record.get("error"))
+                    self._entries.append(entry)
+                    self._by_key.setdefault(entry.key, []).append(entry)
+                    self._by_name.setdefault((entry.kind, entry.name, entry.agent), []).append(entry)
+        except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError):
+            # A run that crashed while recording leaves a truncated file; keep what was written
+            pass
+
+    def _take(self, kind: str, name: str, key: str) -> Interaction:
+        agent = get_agent_id()
+        with self._lock:
+            exact = next((e for e in self._by_key.get(key, []) if not e.used), None)
+            entry = exact or next((e for e in self._by_name.get((kind, name, agent), []) if not e.used), None)
+            if entry is None:
+                self.missed += 1
+                raise CassetteMiss(f"No recorded {kind} call to '{name}' left for agent '{agent}' in {self.path}")
+            entry.used = True
+            self.replayed += 1
+            if exact is None:
+                self.inexact += 1
+        return entry
+
+    # --- BOTH ---
+
+    def through(self, kind: str, name: str, request: Dict[str, Any], call: Callable[[], Any],
+                encode: Callable[[Any], Any] = lambda result: result,
+                decode: Callable[[Any], Any] = lambda data: data) -> Any:
+        """
+        Routes one call through the cassette. Recording runs `call()` and stores
+        its (encoded) result and duration; replay waits the recorded duration
+        (unless zero-latency) and returns the decoded recorded result, or
+        raises the recorded error, without running `call()`.
+        """
+        key = request_key(kind, name, request)
+        if self.replaying:
+            entry = self._take(kind, name, key)
+            if self.realtime and entry.seconds > 0:
+                time.sleep(entry.seconds)
+            if entry.error is not None:
+                raise RuntimeError(entry.error)
+            return decode(entry.response)
+
+        record = {"kind": kind, "name": name, "agent": get_agent_id(), "key": key}
+        started = time.monotonic()
+        try:
+            result = call()
+        except Exception as e:
+            record.update(seconds=round(time.monotonic() - started, 4), error=str(e))
+            self._write(record)
+            raise
+        record.update(seconds=round(time.monotonic() - started, 4), response=encode(result))
+        self._write(record)
+        return result
+
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+                self._file = None
+
+    def summary(self) -> str:
+        if not self.replaying:
+            return f"📼 Recorded {self.recorded} calls to {self.path}"
+        text = f"📼 Replayed {self.replayed} calls from {self.path}"
+        if self.inexact:
+            text += f" ({self.inexact} matched by position because the request changed)"
+        if self.missed:
+            text += f"; {self.missed} calls had no recording"
+        if self.unused:
+            text += f"; {self.unused} recorded calls were never made"
+        return text
+
+
+# One run per process, and pool threads don't inherit ContextVars, so a plain global it is
+_active: Optional[Cassette] = None
+
+
+def active() -> Optional[Cassette]:
+    return _active
+
+
+def replaying() -> bool:
+    """True while a replay runs: its calls are not real, so they stay out of the usage metrics."""
+    return _active is not None and _active.replaying
+
+
+@contextmanager
+def use(tape: Cassette):
+    """Sends every LLM and tool call inside the block through `tape`, and closes it afterwards."""
+    global _active
+    previous, _active = _active, tape
+    try:
+        yield tape
+    finally:
+        _active = previous
+        tape.close()
@@ -1,86 +1,312 @@
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.theme import Theme
-from rich.text import Text
-from rich.spinner import Spinner
-from rich.live import Live
-from typing import Optional
-from src.interface.database import db
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Optional, Dict, Any
+from src.interface.context import get_agent_id
+from src.interface.events import Event, bus
 
 # Custom theme for consistent coloring
-custom_theme = Theme({
+THEME_STYLES = {
     "info": "cyan",
     "warning": "yellow",
     "error": "bold red",
     "success": "bold green",
     "agent": "bold blue",
     "workflow": "magenta"
-})
+}
 
-class ConsoleUI:
+
+class RichRenderer:
     """
-    Handles all terminal output using the Rich library.
-    Provides methods for logging workflow progress, agent actions, and results.
+    Draws events with Rich: panels and messages scroll above a Live
+    dashboard that shows one row per agent (state, elapsed time, tokens).
+    Only ever used from the render thread.
     """
-    
+
     def __init__(self):
-        self.console = Console(theme=custom_theme)
+        # Imported here so headless mode never loads Rich at all
+        from rich.console import Console
+        from rich.theme import Theme
+        self.console = Console(theme=Theme(THEME_STYLES))
+        self.live = None
+        self.agents: Dict[str, Dict[str, Any]] = {}
+
+    # --- Dashboard ---
+
+    def _dashboard(self):
+        from rich.table import Table
+        table = Table(title="Agents", expand=False, show_edge=True)
+        table.add_column("Agent", style="bold blue")
+        table.add_column("State")
+        table.add_column("Elapsed", justify="right")
+        table.add_column("Tokens", justify="right")
+        now = time.time()
+        for agent_id, row in self.agents.items():
+            elapsed = (row["end"] or now) - row["start"]
+            table.add_row(agent_id, row["state"], f"{elapsed:.1f}s", str(row["tokens"] or "-"))
+        return table
+
+    def _start_live(self):
+        if self.live is None:
+            from rich.live import Live
+            self.live = Live(get_renderable=self._dashboard, console=self.console,
+                             refresh_per_second=4, transient=False)
+            self.live.start()
+
+    def stop(self):
+        if self.live is not None:
+            self.live.stop()
+            self.live = None
+            self.console.print()
+
+    def _set_state(self, agent_id: Optional[str], state: str, ts: float, finished: bool = False):
+        if not agent_id:
+            return
+        row = self.agents.setdefault(agent_id, {"state": "", "start": ts, "end": None, "tokens": 0})
+        row["state"] = state
+        if finished:
+            row["end"] = ts
+
+    # --- Events ---
+
+    def handle(self, kind: str, ts: float, data: Dict[str, Any]):
+        from rich.panel import Panel
+        from rich.markdown import Markdown
+        print_ = self.console.print
+
+        if kind == "welcome":
+            print_()
+            self.console.rule("[bold magenta]Multi-Agent Orchestrator[/bold magenta]")
+            print_("🚀 Engine Initialized. Reading Configuration...", justify="center")
+            print_()
+        elif kind == "workflow_start":
+            print_(f"[workflow]► Starting Workflow:[/workflow] [bold]{data['name']}[/bold] ({data['mode']})")
+            print_()
+            self.agents.clear()
+            self._start_live()
+        elif kind == "agent_start":
+            self.agents[data["agent"]] = {"state": "🤔 thinking", "start": ts, "end": None, "tokens": 0}
+            print_(f"[agent]● Agent Active:[/agent] [bold white]{data['agent']}[/bold white] ({data['role']})")
+        elif kind == "agent_completion":
+            self._set_state(data["agent"], "[success]✓ done[/success]", ts, finished=True)
+            print_(f"[success]✓ {data['agent']} completed[/success] [dim]({data['duration']:.2f}s)[/dim]")
+            print_()
+        elif kind == "agent_status":
+            self._set_state(data["agent"], data["status"], ts, finished=True)
+        elif kind == "usage":
+            row = self.agents.get(data["agent"])
+            if row is not None:
+                row["tokens"] += data["tokens"]
+        elif kind == "agent_output":
+            panel = Panel(
+                Markdown(data["content"]),
+                title=f"[bold blue]{data['agent']}[/bold blue]",
+                border_style="blue",
+                expand=False
+            )
+            print_(panel)
+            print_()
+        elif kind == "tool_use":
+            self._set_state(data["agent"], f"🛠  {data['tool']}", ts)
+            print_(f"  [warning]🛠  Using Tool:[/warning] {data['tool']}")
+            print_(f"  [dim]Input: {data['input']}[/dim]")
+        elif kind == "tool_result":
+            self._set_state(data["agent"], "🤔 thinking", ts)
+            # Truncate long results for display
+            result = data["result"]
+            display_result = result[:200] + "..." if len(result) > 200 else result
+            print_(f"  [success]➔ Result:[/success] [dim]{display_result}[/dim]")
+            print_()
+        elif kind == "info":
+            style = data.get("style")
+            print_(f"[{style}]{data['message']}[/{style}]" if style else data["message"])
+        elif kind == "result":
+            self.stop()
+            print_(Panel(data["content"], title=data["title"], border_style="green"))
+        elif kind == "error":
+            print_(f"[error]ERROR:[/error] {data['message']}")
+
+
+class JsonRenderer:
+    """Headless mode: one compact JSON object per event on stdout, no Rich."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def handle(self, kind: str, ts: float, data: Dict[str, Any]):
+        if self.stream is None:
+            return
+        record = {"ts": round(ts, 3), "event": kind, **data}
+        try:
+            self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self.stream.flush()
+        except BrokenPipeError:
+            # The reader went away (e.g. `| head`); keep the workflow running quietly
+            self.stream = None
+
+    def stop(self):
+        pass
+
+
+class ConsoleUI:
+    """
+    Handles all terminal output.
+    The logging methods publish events on the event bus; the console is one
+    subscriber among others (see Orchestrator.stream()). Received events
+    only go on a queue, so worker threads never pay for rendering and
+    parallel agents can't interleave half-printed panels.
+    A single render thread draws the events, either with Rich (a Live
+    dashboard with one row per agent) or as JSON lines in headless mode.
+    """
+
+    def __init__(self, headless: Optional[bool] = None):
+        if headless is None:
+            headless = os.getenv("HEADLESS", "0").lower() in ("1", "true", "yes")
+        self.headless = headless
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._renderer = None
+        self._lock = threading.Lock()
         self.current_spinner = None
+        self._stderr_console = None
+        self._subscription = None
+        self.attach()
+
+    def attach(self):
+        """Starts drawing events from the bus (the default)."""
+        if self._subscription is None:
+            self._subscription = bus.subscribe(self._enqueue)
+
+    def detach(self):
+        """Stops drawing, e.g. when an embedding application renders the events itself."""
+        if self._subscription is not None:
+            bus.unsubscribe(self._subscription)
+            self._subscription = None
+
+    def configure(self, headless: bool):
+        """Switches between Rich and headless output (call before the first event)."""
+        self.shutdown()
+        self.headless = headless
+        self._renderer = None
+
+    @property
+    def console(self):
+        """
+        The underlying Rich console (for callers that print Rich renderables directly).
+        Headless mode gets a plain console on stderr, so stdout stays pure JSON lines.
+        """
+        renderer = self._get_renderer()
+        if hasattr(renderer, "console"):
+            return renderer.console
+        if self._stderr_console is None:
+            from rich.console import Console
+            self._stderr_console = Console(stderr=True)
+        return self._stderr_console
+
+    def _get_renderer(self):
+        if self._renderer is None:
+            self._renderer = JsonRenderer() if self.headless else RichRenderer()
+        return self._renderer
+
+    # --- Render thread ---
+
+    def _emit(self, kind: str, **data):
+        bus.publish(kind, **data)
+
+    def _enqueue(self, event: Event):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._render_loop, name="console-render", daemon=True)
+                self._thread.start()
+        self._queue.put((event.type, event.ts, event.data))
+
+    def _render_loop(self):
+        renderer = self._get_renderer()
+        while True:
+            kind, ts, data = self._queue.get()
+            try:
+                if kind == "_stop":
+                    renderer.stop()
+                    return
+                renderer.handle(kind, ts, data)
+            except Exception as e:
+                # Rendering problems must never take down the workflow
+                sys.stderr.write(f"[console] failed to render {kind}: {e}\n")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Blocks until every queued event has been drawn."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def shutdown(self):
+        """Draws everything still queued and stops the render thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(("_stop", time.time(), {}))
+            thread.join()
+
+    # --- Events ---
 
     def print_welcome(self):
         """Prints the startup banner."""
-        self.console.print()
-        self.console.rule("[bold magenta]Multi-Agent Orchestrator[/bold magenta]")
-        self.console.print("🚀 Engine Initialized. Reading Configuration...", justify="center")
-        self.console.print()
+        self._emit("welcome")
 
     def log_workflow_start(self, name: str, mode: str):
         """Logs the start of a workflow sequence."""
-        self.console.print(f"[workflow]► Starting Workflow:[/workflow] [bold]{name}[/bold] ({mode})")
-        self.console.print()
+        self._emit("workflow_start", name=name, mode=mode)
 
     def log_agent_start(self, agent_id: str, role: str):
         """
         Logs that an agent is beginning its task.
         """
-        self.console.print(f"[agent]● Agent Active:[/agent] [bold white]{agent_id}[/bold white] ({role})")
-        
+        self._emit("agent_start", agent=agent_id, role=role)
+
     def log_agent_completion(self, agent_id: str, duration: float = 0.0):
         """Logs that an agent has finished."""
-        self.console.print(f"[success]✓ {agent_id} completed[/success] [dim]({duration:.2f}s)[/dim]")
-        self.console.print()
+        self._emit("agent_completion", agent=agent_id, duration=duration)
+
+    def log_agent_status(self, agent_id: str, status: str):
+        """Marks an agent as finished without an answer (e.g. 'timed out', 'cancelled')."""
+        self._emit("agent_status", agent=agent_id, status=status)
+
+    def log_usage(self, agent_id: Optional[str], tokens: int):
+        """Adds tokens used by an LLM call to the agent's dashboard row."""
+        self._emit("usage", agent=agent_id or get_agent_id(), tokens=tokens)
 
     def stream_output(self, agent_id: str, content: str):
         """
         Renders AI output in a nice Markdown panel.
         """
-        md = Markdown(content)
-        panel = Panel(
-            md,
-            title=f"[bold blue]{agent_id}[/bold blue]",
-            border_style="blue",
-            expand=False
-        )
-        self.console.print(panel)
-        self.console.print()
+        self._emit("agent_output", agent=agent_id, content=content)
 
     def log_tool_use(self, tool_name: str, input_data: str):
         """Logs when an agent uses a tool."""
-        self.console.print(f"  [warning]🛠  Using Tool:[/warning] {tool_name}")
-        self.console.print(f"  [dim]Input: {input_data}[/dim]")
-        db.log_event("system", "tool_use", f"Tool: {tool_name}, Input: {input_data}")
+        self._emit("tool_use", agent=get_agent_id(), tool=tool_name, input=input_data)
 
-    def log_tool_result(self, result: str):
+    def log_tool_result(self, result: str, tool_name: Optional[str] = None):
         """Logs the output of a tool."""
-        # Truncate long results for display
-        display_result = result[:200] + "..." if len(result) > 200 else result
-        self.console.print(f"  [success]➔ Result:[/success] [dim]{display_result}[/dim]")
-        self.console.print()
+        self._emit("tool_result", agent=get_agent_id(), tool=tool_name, result=result)
+
+    def info(self, message: str, style: Optional[str] = None):
+        """Prints a plain status line (style is a theme name like 'workflow')."""
+        self._emit("info", message=message, style=style)
+
+    def print_result(self, content: str, title: str = "Final Output"):
+        """Shows the final workflow output."""
+        self._emit("result", content=content, title=title)
 
     def print_error(self, message: str):
         """Prints error messages prominently."""
-        self.console.print(f"[error]ERROR:[/error] {message}")
+        self._emit("error", message=message)
 
     def status_spinner(self, message: str):
         """
@@ -88,28 +314,32 @@ class ConsoleUI:
         Usage:
             with ui.status_spinner("Thinking..."):
                 do_work()
+        No spinner in headless mode or while the dashboard is live.
         """
-        return self.console.status(f"[bold cyan]{message}[/bold cyan]", spinner="dots")
+        if self.headless:
+            return nullcontext()
+        self.flush()
+        renderer = self._get_renderer()
+        if renderer.live is not None:
+            return nullcontext()
+        return renderer.console.status(f"[bold cyan]{message}[/bold cyan]", spinner="dots")
 
 # Create a singleton instance to be used throughout the app
 ui = ConsoleUI()
+atexit.register(ui.shutdown)
 
 # Simple test to run this file directly and see the colors
 if __name__ == "__main__":
-    import time
-    
     ui.print_welcome()
     ui.log_workflow_start("Research Team", "Sequential")
-    
-    with ui.status_spinner("Initializing agents..."):
-        time.sleep(1.5)
-        
+
     ui.log_agent_start("researcher", "Analyst")
-    with ui.status_spinner("Researcher is thinking..."):
-        time.sleep(1)
-        ui.log_tool_use("google_search", "Electric Vehicle Sales 2024")
-        time.sleep(0.5)
-        ui.log_tool_result("Found 14,000 results...")
-    
+    time.sleep(1)
+    ui.log_tool_use("google_search", "Electric Vehicle Sales 2024")
+    time.sleep(0.5)
+    ui.log_tool_result("Found 14,000 results...")
+    ui.log_usage("researcher", 512)
+
     ui.stream_output("researcher", "# Analysis Report\n* EV sales are up **40%**.\n* key player is Tesla.")
-    ui.log_agent_completion("researcher", 2.5)
\ No newline at end of file
+    ui.log_agent_completion("researcher", 2.5)
+    ui.shutdown()
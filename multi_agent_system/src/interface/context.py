@@ -0,0 +1,73 @@
+import contextvars
+from contextlib import contextmanager
+from typing import List, Optional
+
+# Who is currently running. Tools use this to pick the right memory namespace.
+# ContextVars are per-thread, so the Orchestrator copies the context into
+# every worker it starts (see Orchestrator._submit).
+_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("run_id", default=None)
+_agent_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("agent_id", default=None)
+
+GLOBAL_NAMESPACE = "global"
+
+
+def get_run_id() -> Optional[str]:
+    return _run_id.get()
+
+
+def get_agent_id() -> Optional[str]:
+    return _agent_id.get()
+
+
+@contextmanager
+def run_scope(run_id: str):
+    """Marks everything inside the block as belonging to one workflow run."""
+    token = _run_id.set(run_id)
+    try:
+        yield
+    finally:
+        _run_id.reset(token)
+
+
+@contextmanager
+def agent_scope(agent_id: str):
+    """Marks everything inside the block as done by one agent."""
+    token = _agent_id.set(agent_id)
+    try:
+        yield
+    finally:
+        _agent_id.reset(token)
+
+
+def namespace_for(scope: str) -> str:
+    """
+    Maps a memory scope to a namespace:
+        global -> "global"
+        run    -> "run:<run_id>"
+        agent  -> "agent:<agent_id>"
+    Outside of a workflow run (or agent) those scopes don't exist, and using
+    them is an error rather than a silent write to the shared global memory.
+    """
+    scope = (scope or GLOBAL_NAMESPACE).lower()
+    if scope == "global":
+        return GLOBAL_NAMESPACE
+    if scope == "run":
+        if not get_run_id():
+            raise ValueError("Memory scope 'run' is only available inside a workflow run; use scope 'global'")
+        return f"run:{get_run_id()}"
+    if scope == "agent":
+        if not get_agent_id():
+            raise ValueError("Memory scope 'agent' is only available while an agent runs; use scope 'global'")
+        return f"agent:{get_agent_id()}"
+    raise ValueError(f"Unknown memory scope '{scope}'. Expected: global, run, agent")
+
+
+def visible_namespaces() -> List[str]:
+    """Namespaces an agent can read, most specific first (agent, run, global)."""
+    namespaces = []
+    if get_agent_id():
+        namespaces.append(f"agent:{get_agent_id()}")
+    if get_run_id():
+        namespaces.append(f"run:{get_run_id()}")
+    namespaces.append(GLOBAL_NAMESPACE)
+    return namespaces
@@ -1,8 +1,11 @@
 import sqlite3
 import os
 import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from src.interface.context import get_run_id, get_agent_id
+from src.interface import blobs
 
 class DatabaseHandler:
     def __init__(self, db_path: Optional[str] = None):
@@ -11,19 +14,38 @@ class DatabaseHandler:
         self.db_path = db_path
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Opens a connection that waits for concurrent writers instead of failing."""
+        return sqlite3.connect(self.db_path, timeout=30)
+
     def _init_db(self):
         """Creates the necessary tables if they don't exist."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+
+        # Set compatibility pragmas for Docker volumes
+        # (must happen before any statement opens a transaction)
+        # Incremental auto-vacuum only takes effect on a brand-new file;
+        # older databases are switched over by vacuum(full=True).
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
         
-        # Table 1: Long-term Memory (Key-Value Store)
+        # Table 1: Long-term Memory (Namespaced Key-Value Store)
+        # namespace is "global", "run:<run_id>" or "agent:<agent_id>".
+        # version is bumped on every write, which enables compare-and-swap.
+        self._migrate_memory_table(cursor)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS memory (
-                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL DEFAULT 'global',
+                key TEXT NOT NULL,
                 value TEXT,
-                updated_at TIMESTAMP
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (namespace, key)
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_memory_key ON memory (key)')
         
         # Table 2: Audit Logs (Record everything agents do)
         cursor.execute('''
@@ -32,60 +54,714 @@ class DatabaseHandler:
                 timestamp TIMESTAMP,
                 agent_id TEXT,
                 action TEXT,
-                details TEXT
+                details TEXT,
+                run_id TEXT
             )
         ''')
-        
-        # Set compatibility pragmas for Docker volumes
-        cursor.execute('PRAGMA journal_mode=WAL')
-        cursor.execute('PRAGMA synchronous=NORMAL')
+        log_columns = [row[1] for row in cursor.execute('PRAGMA table_info(logs)')]
+        if 'run_id' not in log_columns:
+            cursor.execute('ALTER TABLE logs ADD COLUMN run_id TEXT')
+        # Lookups by run/agent and time-based pruning both stay index scans
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_run_agent_ts ON logs (run_id, agent_id, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_agent_ts ON logs (agent_id, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)')
+
+        # Table 3: Model cascade outcomes, one row per agent / tier / model
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cascade_stats (
+                agent_id TEXT NOT NULL,
+                tier INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                accepted INTEGER NOT NULL DEFAULT 0,
+                total_seconds REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (agent_id, tier, model)
+            )
+        ''')
+
+        # Table 4: One row per LLM call (tokens, prompt size, latency)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TIMESTAMP,
+                run_id TEXT,
+                agent_id TEXT,
+                model TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                total_tokens INTEGER,
+                cached_tokens INTEGER,
+                prompt_chars INTEGER,
+                latency_ms REAL,
+                status TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage (timestamp)')
+
+        # Table 5: Timed spans for agent runs and tool calls
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS spans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TIMESTAMP,
+                run_id TEXT,
+                agent_id TEXT,
+                kind TEXT,
+                name TEXT,
+                duration_ms REAL,
+                status TEXT,
+                input_chars INTEGER,
+                output_chars INTEGER
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_spans_timestamp ON spans (timestamp)')
+
+        # Table 6: Content-addressed, compressed payloads.
+        # Large memory values and log details are stored once here and the
+        # rows only keep a "blob:sha256:<hash>" reference.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                created_at TIMESTAMP
+            )
+        ''')
+        # Partial indexes holding only the rows that point at a blob, so garbage
+        # collection reads those instead of scanning the whole memory and logs tables
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_blob_refs ON memory (value) "
+                       "WHERE value LIKE 'blob:sha256:%'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_blob_refs ON logs (details) "
+                       "WHERE details LIKE 'blob:sha256:%'")
         
         conn.commit()
         conn.close()
 
+    @staticmethod
+    def _migrate_memory_table(cursor: sqlite3.Cursor):
+        """Moves a pre-namespace memory table (key PRIMARY KEY) into the global namespace."""
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(memory)')]
+        if not columns or 'namespace' in columns:
+            return
+        cursor.execute('ALTER TABLE memory RENAME TO memory_legacy')
+        cursor.execute('''
+            CREATE TABLE memory (
+                namespace TEXT NOT NULL DEFAULT 'global',
+                key TEXT NOT NULL,
+                value TEXT,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO memory (namespace, key, value, version, updated_at)
+            SELECT 'global', key, value, 1, updated_at FROM memory_legacy
+        ''')
+        cursor.execute('DROP TABLE memory_legacy')
+        cursor.connection.commit()
+
     # --- MEMORY OPERATIONS ---
     
-    def save_memory(self, key: str, value: str):
-        """Upsert (Update or Insert) a memory item."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO memory (key, value, updated_at)
-            VALUES (?, ?, ?)
-        ''', (key, value, datetime.now()))
-        conn.commit()
-        conn.close()
+    def save_memory(self, key: str, value: str, namespace: str = "global") -> int:
+        """Upsert (Update or Insert) a memory item. Returns the new version."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''
+                INSERT INTO memory (namespace, key, value, version, updated_at)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (namespace, key) DO UPDATE SET
+                    value = excluded.value,
+                    version = memory.version + 1,
+                    updated_at = excluded.updated_at
+            ''', (namespace, key, self._pack(conn, value), datetime.now()))
+            version = self._version(conn, namespace, key)
+            conn.commit()
+            return version
+        finally:
+            conn.close()
 
-    def get_memory(self, key: str) -> str:
+    def get_memory(self, key: str, namespace: str = "global") -> Optional[str]:
         """Retrieves a specific memory item."""
-        conn = sqlite3.connect(self.db_path)
+        entry = self.get_memory_entry(key, namespace)
+        return entry[0] if entry else None
+
+    def get_memory_entry(self, key: str, namespace: str = "global") -> Optional[Tuple[str, int]]:
+        """Retrieves (value, version) for a memory item, for use with compare_and_swap."""
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT value FROM memory WHERE key = ?', (key,))
+        cursor.execute(
+            'SELECT value, version FROM memory WHERE namespace = ? AND key = ?',
+            (namespace, key)
+        )
         result = cursor.fetchone()
+        value = self._unpack(conn, result[0]) if result else None
         conn.close()
-        return result[0] if result else None
+        return (value, result[1]) if result else None
 
-    def get_all_memory(self) -> Dict[str, str]:
-        """Returns all memory as a dictionary."""
-        conn = sqlite3.connect(self.db_path)
+    def find_memory(self, key: str, namespaces: List[str]) -> Optional[Tuple[str, str]]:
+        """Looks a key up in several namespaces (in order). Returns (namespace, value)."""
+        if not namespaces:
+            return None
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT key, value FROM memory')
+        placeholders = ",".join("?" for _ in namespaces)
+        cursor.execute(
+            f'SELECT namespace, value FROM memory WHERE key = ? AND namespace IN ({placeholders})',
+            (key, *namespaces)
+        )
+        found = dict(cursor.fetchall())
+        try:
+            for namespace in namespaces:
+                if namespace in found:
+                    return namespace, self._unpack(conn, found[namespace])
+            return None
+        finally:
+            conn.close()
+
+    def compare_and_swap(self, key: str, value: str, expected_version: int,
+                         namespace: str = "global") -> bool:
+        """
+        Writes `value` only if the item is still at `expected_version`
+        (0 means "must not exist yet"). Returns False if someone else won.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if expected_version == 0:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO memory (namespace, key, value, version, updated_at)
+                    VALUES (?, ?, ?, 1, ?)
+                ''', (namespace, key, self._pack(conn, value), datetime.now()))
+            else:
+                cursor = conn.execute('''
+                    UPDATE memory SET value = ?, version = version + 1, updated_at = ?
+                    WHERE namespace = ? AND key = ? AND version = ?
+                ''', (self._pack(conn, value), datetime.now(), namespace, key, expected_version))
+            swapped = cursor.rowcount == 1
+            conn.commit()
+            return swapped
+        finally:
+            conn.close()
+
+    def append_memory(self, key: str, value: str, namespace: str = "global",
+                      separator: str = "\n") -> int:
+        """Atomically appends to a memory item (creating it if needed). Returns the new version."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT value FROM memory WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            if row and blobs.parse_ref(row[0]) is None and not blobs.should_store(
+                    (row[0] or "") + separator + value):
+                # Small values are still concatenated inside SQLite
+                conn.execute('''
+                    UPDATE memory SET value = COALESCE(value || ?, '') || ?,
+                        version = version + 1, updated_at = ?
+                    WHERE namespace = ? AND key = ?
+                ''', (separator, value, datetime.now(), namespace, key))
+            else:
+                # The value is (or becomes) a blob: the write lock is held, so read-modify-write is safe
+                current = self._unpack(conn, row[0]) if row else None
+                combined = value if current is None else current + separator + value
+                conn.execute('''
+                    INSERT INTO memory (namespace, key, value, version, updated_at)
+                    VALUES (?, ?, ?, 1, ?)
+                    ON CONFLICT (namespace, key) DO UPDATE SET
+                        value = excluded.value,
+                        version = memory.version + 1,
+                        updated_at = excluded.updated_at
+                ''', (namespace, key, self._pack(conn, combined), datetime.now()))
+            version = self._version(conn, namespace, key)
+            conn.commit()
+            return version
+        finally:
+            conn.close()
+
+    def merge_memory(self, key: str, updates: Dict[str, Any], namespace: str = "global") -> Dict[str, Any]:
+        """
+        Atomically merges `updates` into a JSON object stored under `key`.
+        A missing or non-JSON value is replaced by a fresh object.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT value FROM memory WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            try:
+                current = json.loads(self._unpack(conn, row[0])) if row and row[0] else {}
+            except ValueError:
+                current = {}
+            if not isinstance(current, dict):
+                current = {}
+            current.update(updates)
+            conn.execute('''
+                INSERT INTO memory (namespace, key, value, version, updated_at)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (namespace, key) DO UPDATE SET
+                    value = excluded.value,
+                    version = memory.version + 1,
+                    updated_at = excluded.updated_at
+            ''', (namespace, key, self._pack(conn, json.dumps(current)), datetime.now()))
+            conn.commit()
+            return current
+        finally:
+            conn.close()
+
+    def list_memory(self, namespaces: Optional[List[str]] = None,
+                    resolve: bool = True) -> List[Tuple[str, str, str, int]]:
+        """
+        Returns (namespace, key, value, version) rows, optionally limited to some namespaces.
+        With `resolve=False` large values stay blob references (see resolve()),
+        so callers that filter first only load the values they keep.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        if namespaces:
+            placeholders = ",".join("?" for _ in namespaces)
+            cursor.execute(
+                f'SELECT namespace, key, value, version FROM memory '
+                f'WHERE namespace IN ({placeholders}) ORDER BY namespace, key',
+                tuple(namespaces)
+            )
+        else:
+            cursor.execute('SELECT namespace, key, value, version FROM memory ORDER BY namespace, key')
         rows = cursor.fetchall()
+        if resolve:
+            rows = [(ns, key, self._unpack(conn, value), version) for ns, key, value, version in rows]
         conn.close()
-        return {row[0]: row[1] for row in rows}
+        return rows
+
+    def get_all_memory(self, namespace: str = "global") -> Dict[str, str]:
+        """Returns all memory of one namespace as a dictionary."""
+        return {key: value for _, key, value, _ in self.list_memory([namespace])}
+
+    @staticmethod
+    def _version(conn: sqlite3.Connection, namespace: str, key: str) -> int:
+        row = conn.execute(
+            'SELECT version FROM memory WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        return row[0] if row else 0
 
     # --- LOGGING OPERATIONS (Bonus Feature) ---
 
-    def log_event(self, agent_id: str, action: str, details: str):
-        """Records an event for debugging/auditing."""
-        conn = sqlite3.connect(self.db_path)
+    def log_event(self, agent_id: str, action: str, details: str, run_id: Optional[str] = None):
+        """Records an event for debugging/auditing (tagged with the current run)."""
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO logs (timestamp, agent_id, action, details)
-            VALUES (?, ?, ?, ?)
-        ''', (datetime.now(), agent_id, action, details))
+            INSERT INTO logs (timestamp, run_id, agent_id, action, details)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (datetime.now(), run_id or get_run_id(), agent_id, action, self._pack(conn, details)))
         conn.commit()
         conn.close()
 
+    def iter_logs(self, run_id: Optional[str] = None, agent_id: Optional[str] = None,
+                  action: Optional[str] = None, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, limit: Optional[int] = None,
+                  newest_first: bool = False, batch_size: int = 500,
+                  details_chars: Optional[int] = None, resolve: bool = True) -> Iterator[Tuple]:
+        """
+        Streams (id, timestamp, run_id, agent_id, action, details) rows.
+        Rows are fetched in batches from an open cursor, so even a huge log
+        is never loaded into memory at once. With `details_chars` only the
+        start of blob-stored details is decompressed (enough for a preview);
+        with `resolve=False` they stay blob references, loaded later with resolve().
+        """
+        clauses, params = [], []
+        for column, value in (("run_id", run_id), ("agent_id", agent_id), ("action", action)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+
+        query = "SELECT id, timestamp, run_id, agent_id, action, details FROM logs"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY timestamp {'DESC' if newest_first else 'ASC'}, id"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[:5] + (self._unpack(conn, row[5], max_chars=details_chars) if resolve else row[5],)
+        finally:
+            conn.close()
+
+    # --- BLOB STORE ---
+
+    def put_blob(self, text: str) -> str:
+        """Stores a text once (deduplicated by hash, compressed) and returns its reference."""
+        conn = self._connect()
+        try:
+            ref = self._put_blob(conn, text)
+            conn.commit()
+            return ref
+        finally:
+            conn.close()
+
+    def get_blob(self, ref: str, max_chars: Optional[int] = None) -> Optional[str]:
+        """The text behind a blob reference (or just its start), None if it is gone."""
+        conn = self._connect()
+        try:
+            return self._read_blob(conn, blobs.parse_ref(ref), max_chars)
+        finally:
+            conn.close()
+
+    def resolve(self, value: Optional[str], max_chars: Optional[int] = None) -> Optional[str]:
+        """Loads a value that may be a blob reference; plain values come back unchanged."""
+        if blobs.parse_ref(value) is None:
+            return value
+        conn = self._connect()
+        try:
+            return self._unpack(conn, value, max_chars)
+        finally:
+            conn.close()
+
+    def blob_stats(self) -> Tuple[int, int, int]:
+        """(blobs, raw bytes, stored bytes) for the whole store."""
+        conn = self._connect()
+        row = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs').fetchone()
+        conn.close()
+        return row
+
+    @staticmethod
+    def _put_blob(conn: sqlite3.Connection, text: str) -> str:
+        digest, codec, size, data = blobs.encode(text)
+        # Identical content is already there: nothing to write
+        conn.execute('''
+            INSERT OR IGNORE INTO blobs (hash, codec, size, data, created_at) VALUES (?, ?, ?, ?, ?)
+        ''', (digest, codec, size, data, datetime.now()))
+        return blobs.blob_ref(digest)
+
+    @staticmethod
+    def _read_blob(conn: sqlite3.Connection, digest: Optional[str], max_chars: Optional[int] = None) -> Optional[str]:
+        if digest is None:
+            return None
+        row = conn.execute('SELECT codec, data FROM blobs WHERE hash = ?', (digest,)).fetchone()
+        if row is None:
+            return None
+        # A character is at most 4 UTF-8 bytes
+        text = blobs.decode(row[0], row[1], max_bytes=max_chars * 4 if max_chars else None)
+        return text[:max_chars] if max_chars else text
+
+    def _pack(self, conn: sqlite3.Connection, value: Optional[str]) -> Optional[str]:
+        """What goes into the row: the value itself, or a blob reference if it is large."""
+        if blobs.should_store(value):
+            return self._put_blob(conn, value)
+        return value
+
+    def _unpack(self, conn: sqlite3.Connection, value: Optional[str],
+                max_chars: Optional[int] = None) -> Optional[str]:
+        digest = blobs.parse_ref(value)
+        if digest is None:
+            return value
+        text = self._read_blob(conn, digest, max_chars)
+        # A reference whose blob is missing is shown as is rather than as nothing
+        return text if text is not None else value
+
+    def _unpack_row(self, conn: sqlite3.Connection, row: Tuple, indexes: List[int]) -> Tuple:
+        if not any(blobs.parse_ref(row[i]) for i in indexes):
+            return row
+        values = list(row)
+        for i in indexes:
+            values[i] = self._unpack(conn, values[i])
+        return tuple(values)
+
+    def _collect_blobs(self, conn: sqlite3.Connection) -> int:
+        """
+        Deletes blobs no memory value or log row points at any more. Returns blobs deleted.
+        The LIKE terms must match the partial indexes' WHERE clauses word for word,
+        otherwise SQLite won't use them.
+        """
+        prefix_len = len(blobs.BLOB_PREFIX)
+        cursor = conn.execute(f'''
+            DELETE FROM blobs WHERE hash NOT IN (
+                SELECT substr(value, {prefix_len + 1}) FROM memory WHERE value LIKE 'blob:sha256:%'
+                UNION
+                SELECT substr(details, {prefix_len + 1}) FROM logs WHERE details LIKE 'blob:sha256:%'
+            )
+        ''')
+        conn.commit()
+        return cursor.rowcount
+
+    # --- METRICS (usage + spans) ---
+
+    # Columns of the tables that `main.py export` can write, in export order
+    EXPORT_TABLES = {
+        "logs": ("id", "timestamp", "run_id", "agent_id", "action", "details"),
+        "usage": ("id", "timestamp", "run_id", "agent_id", "model", "prompt_tokens", "completion_tokens",
+                  "total_tokens", "cached_tokens", "prompt_chars", "latency_ms", "status"),
+        "spans": ("id", "timestamp", "run_id", "agent_id", "kind", "name", "duration_ms", "status",
+                  "input_chars", "output_chars"),
+    }
+    # Export columns that may hold a blob reference instead of the text itself
+    BLOB_COLUMNS = {"logs": ("details",)}
+
+    def record_usage(self, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                     total_tokens: Optional[int], cached_tokens: Optional[int], prompt_chars: int,
+                     latency_ms: float, status: str = "ok", agent_id: Optional[str] = None,
+                     run_id: Optional[str] = None):
+        """Records one LLM call (tagged with the current run and agent)."""
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO usage (timestamp, run_id, agent_id, model, prompt_tokens, completion_tokens,
+                               total_tokens, cached_tokens, prompt_chars, latency_ms, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (datetime.now(), run_id or get_run_id(), agent_id or get_agent_id(), model, prompt_tokens,
+              completion_tokens, total_tokens, cached_tokens, prompt_chars, latency_ms, status))
+        conn.commit()
+        conn.close()
+
+    def record_span(self, kind: str, name: str, started: datetime, duration_ms: float, status: str = "ok",
+                    input_chars: Optional[int] = None, output_chars: Optional[int] = None,
+                    agent_id: Optional[str] = None, run_id: Optional[str] = None):
+        """Records a finished span ('agent' run or 'tool' call); `started` is its wall-clock start."""
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO spans (timestamp, run_id, agent_id, kind, name, duration_ms, status,
+                               input_chars, output_chars)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (started, run_id or get_run_id(), agent_id or get_agent_id(), kind, name, duration_ms,
+              status, input_chars, output_chars))
+        conn.commit()
+        conn.close()
+
+    def model_usage_stats(self) -> List[Tuple[str, int, float, float, float, int, int]]:
+        """
+        Per model over successful calls: (model, calls, avg prompt tokens,
+        avg completion tokens, avg latency ms, prompt chars, prompt tokens),
+        the last two summed over calls that reported both.
+        """
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT model, COUNT(*), AVG(prompt_tokens), AVG(completion_tokens), AVG(latency_ms),
+                   SUM(CASE WHEN prompt_tokens > 0 THEN prompt_chars ELSE 0 END),
+                   SUM(CASE WHEN prompt_tokens > 0 THEN prompt_tokens ELSE 0 END)
+            FROM usage WHERE status = 'ok' GROUP BY model ORDER BY model
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    def agent_span_stats(self) -> List[Tuple[str, str, str, int, float, float, int]]:
+        """
+        Per agent and span: (agent id, kind, name, count, avg duration ms,
+        avg output chars, LLM calls made by that agent). Tool spans count how
+        often an agent really used each tool.
+        """
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT s.agent_id, s.kind, s.name, COUNT(*), AVG(s.duration_ms), AVG(s.output_chars),
+                   (SELECT COUNT(*) FROM usage u WHERE u.agent_id = s.agent_id)
+            FROM spans s WHERE s.agent_id IS NOT NULL AND (s.status = 'ok' OR s.kind = 'tool')
+            GROUP BY s.agent_id, s.kind, s.name ORDER BY s.agent_id, s.kind, s.name
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    def iter_chunks(self, table: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    chunk_size: int = 50000) -> Iterator[List[Tuple]]:
+        """
+        Streams an export table in timestamp order, `chunk_size` rows at a time
+        (columns as in EXPORT_TABLES). Only one chunk is ever held in memory.
+        Blob-stored values come back as their full text, not as references.
+        """
+        if table not in self.EXPORT_TABLES:
+            raise ValueError(f"Unknown table '{table}'. Expected: {list(self.EXPORT_TABLES)}")
+
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        query = f"SELECT {', '.join(self.EXPORT_TABLES[table])} FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY timestamp, id"
+        columns = self.EXPORT_TABLES[table]
+        blob_columns = [columns.index(c) for c in self.BLOB_COLUMNS.get(table, ())]
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if blob_columns:
+                    rows = [self._unpack_row(conn, row, blob_columns) for row in rows]
+                yield rows
+        finally:
+            conn.close()
+
+    # --- CASCADE STATS ---
+
+    def record_cascade(self, agent_id: str, tier: int, model: str, accepted: bool, seconds: float):
+        """Counts one attempt of a cascade tier (accepted = its answer was used)."""
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO cascade_stats (agent_id, tier, model, attempts, accepted, total_seconds, updated_at)
+            VALUES (?, ?, ?, 1, ?, ?, ?)
+            ON CONFLICT (agent_id, tier, model) DO UPDATE SET
+                attempts = cascade_stats.attempts + 1,
+                accepted = cascade_stats.accepted + excluded.accepted,
+                total_seconds = cascade_stats.total_seconds + excluded.total_seconds,
+                updated_at = excluded.updated_at
+        ''', (agent_id, tier, model, int(accepted), seconds, datetime.now()))
+        conn.commit()
+        conn.close()
+
+    def cascade_stats(self, agent_id: Optional[str] = None) -> List[Tuple[str, int, str, int, int, float]]:
+        """Rows of (agent_id, tier, model, attempts, accepted, total_seconds)."""
+        conn = self._connect()
+        sql = 'SELECT agent_id, tier, model, attempts, accepted, total_seconds FROM cascade_stats'
+        params: Tuple = ()
+        if agent_id:
+            sql += ' WHERE agent_id = ?'
+            params = (agent_id,)
+        rows = conn.execute(sql + ' ORDER BY agent_id, tier, model', params).fetchall()
+        conn.close()
+        return rows
+
+    def reset_cascade_stats(self, agent_id: Optional[str] = None):
+        """Forgets recorded cascade outcomes (after retuning a cascade)."""
+        conn = self._connect()
+        if agent_id:
+            conn.execute('DELETE FROM cascade_stats WHERE agent_id = ?', (agent_id,))
+        else:
+            conn.execute('DELETE FROM cascade_stats')
+        conn.commit()
+        conn.close()
+
+    # --- RETENTION ---
+
+    def prune_logs(self, max_age_days: Optional[float] = None, max_rows: Optional[int] = None,
+                   batch_size: int = 5000) -> int:
+        """
+        Deletes logs (plus usage and span rows) older than `max_age_days`, and
+        logs beyond the newest `max_rows`, then (if any went) blobs nothing refers to any more.
+        Deletes run in small batches so agents writing logs are never blocked
+        for long. Freed pages are then returned to the OS. Returns rows deleted.
+        """
+        deleted = 0
+        conn = self._connect()
+        try:
+            if max_age_days:
+                cutoff = datetime.now() - timedelta(days=max_age_days)
+                # Usage and span rows follow the same retention as the logs
+                for table in ("logs", "usage", "spans"):
+                    deleted += self._delete_in_batches(
+                        conn, f'SELECT id FROM {table} WHERE timestamp < ? LIMIT ?', (cutoff,),
+                        batch_size, table=table
+                    )
+
+            if max_rows:
+                # id of the oldest row we keep; everything before it goes
+                row = conn.execute(
+                    'SELECT id FROM logs ORDER BY id DESC LIMIT 1 OFFSET ?', (int(max_rows) - 1,)
+                ).fetchone()
+                if row:
+                    deleted += self._delete_in_batches(
+                        conn, 'SELECT id FROM logs WHERE id < ? LIMIT ?', (row[0],), batch_size
+                    )
+
+            # Payloads of deleted logs that nothing shares any more. Only worth a
+            # pass when rows went away; blobs of overwritten memory values are
+            # picked up by the next pass.
+            if deleted:
+                deleted += self._collect_blobs(conn)
+        finally:
+            conn.close()
+
+        if deleted:
+            self.vacuum()
+        return deleted
+
+    @staticmethod
+    def _delete_in_batches(conn: sqlite3.Connection, select_sql: str,
+                           params: Tuple, batch_size: int, table: str = "logs") -> int:
+        deleted = 0
+        while True:
+            cursor = conn.execute(
+                f'DELETE FROM {table} WHERE id IN ({select_sql})', (*params, batch_size)
+            )
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+    def vacuum(self, pages: int = 0, full: bool = False) -> bool:
+        """
+        Returns up to `pages` (0 = all) free pages to the OS with an incremental
+        vacuum, which never blocks writers for long.
+        Databases created before incremental auto-vacuum can only be switched
+        over by a full VACUUM, which locks the whole file while it rewrites it.
+        That only happens with `full=True` (`main.py logs --vacuum`), never from
+        the background maintenance. Returns whether a full VACUUM ran.
+        """
+        conn = self._connect()
+        conn.isolation_level = None  # VACUUM can't run inside a transaction
+        try:
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            ran_full = False
+            if mode == 2:  # 2 = INCREMENTAL
+                # Each step of this pragma frees one page, but execute() steps a statement
+                # without result columns only once; executescript() runs it to the end
+                conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+            if full:
+                if mode != 2:
+                    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+                ran_full = True
+            # A passive checkpoint doesn't wait for (or hold up) other connections
+            conn.execute(f'PRAGMA wal_checkpoint({"TRUNCATE" if full else "PASSIVE"})')
+            return ran_full
+        finally:
+            conn.close()
+
+    def start_log_maintenance(self, interval: Optional[float] = None) -> Optional[threading.Event]:
+        """
+        Starts a background thread that prunes logs right away and then every
+        `interval` seconds, using LOG_RETENTION_DAYS and LOG_MAX_ROWS.
+        Returns an Event that stops the thread when set.
+        """
+        max_age_days = float(os.getenv("LOG_RETENTION_DAYS", "30") or 0)
+        max_rows = int(os.getenv("LOG_MAX_ROWS", "1000000") or 0)
+        interval = interval or float(os.getenv("LOG_PRUNE_INTERVAL", "3600"))
+        if not max_age_days and not max_rows:
+            return None
+
+        stop = threading.Event()
+
+        def _maintain():
+            while True:
+                try:
+                    self.prune_logs(max_age_days=max_age_days, max_rows=max_rows)
+                except sqlite3.Error:
+                    pass  # Busy database: try again on the next round
+                if stop.wait(interval):
+                    return
+
+        threading.Thread(target=_maintain, name="log-maintenance", daemon=True).start()
+        return stop
+
 # Singleton Instance
-db = DatabaseHandler()
\ No newline at end of file
+db = DatabaseHandler()
@@ -0,0 +1,98 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+from src.interface.context import get_agent_id, get_run_id
+
+# Event types published while a workflow runs (the `type` of an Event):
+#   workflow_start    name, mode
+#   agent_start       agent, role
+#   token             agent, text            (one LLM output delta; opt-in, see below)
+#   tool_use          agent, tool, input
+#   tool_result       agent, tool, result
+#   agent_output      agent, content         (an agent's finished answer, e.g. a parallel branch)
+#   agent_completion  agent, duration
+#   agent_status      agent, status          (finished without an answer: timed out, cancelled)
+#   usage             agent, tokens
+#   info / error      message
+#   final             output                 (the workflow result; always the last event of a run)
+TOKEN = "token"
+FINAL = "final"
+
+# High-volume types a subscriber only gets when it names them.
+# Token deltas also switch LLM calls to streaming, so nobody pays for them unasked.
+OPT_IN_TYPES: FrozenSet[str] = frozenset({TOKEN})
+
+
+@dataclass
+class Event:
+    """One thing that happened during a run, tagged with the run and agent it belongs to."""
+    type: str
+    ts: float
+    run_id: Optional[str] = None
+    agent: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Subscription:
+    callback: Callable[[Event], None]
+    types: Optional[FrozenSet[str]] = None
+    opt_in: FrozenSet[str] = frozenset()
+
+    def accepts(self, kind: str) -> bool:
+        if self.types is None:
+            return kind not in OPT_IN_TYPES or kind in self.opt_in
+        return kind in self.types
+
+
+class EventBus:
+    """
+    Fans events out to subscribers (the console, Orchestrator.stream(), ...).
+    Callbacks run on the publishing thread, so they must be quick and
+    non-blocking: put the event on a queue and return.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscription] = []
+
+    def subscribe(self, callback: Callable[[Event], None], types: Optional[Iterable[str]] = None,
+                  opt_in: Iterable[str] = ()) -> Subscription:
+        """
+        `types=None` receives every event except the opt-in ones (token deltas),
+        unless they are named in `opt_in`; otherwise only the listed types are delivered.
+        """
+        subscription = Subscription(callback, frozenset(types) if types is not None else None,
+                                    frozenset(opt_in))
+        with self._lock:
+            # Copy on write, so publish() can iterate without holding the lock
+            self._subscribers = self._subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+
+    def wants(self, kind: str) -> bool:
+        """Whether anyone listens for this type (lets producers skip expensive work)."""
+        return any(s.accepts(kind) for s in self._subscribers)
+
+    def publish(self, kind: str, **data):
+        subscribers = [s for s in self._subscribers if s.accepts(kind)]
+        if not subscribers:
+            return
+        # Timestamp now, not when consumed, so elapsed times stay accurate
+        event = Event(type=kind, ts=time.time(), run_id=get_run_id(),
+                      agent=data.get("agent") or get_agent_id(), data=data)
+        for subscription in subscribers:
+            try:
+                subscription.callback(event)
+            except Exception as e:
+                # A broken consumer must never take down the workflow
+                sys.stderr.write(f"[events] subscriber failed on {kind}: {e}\n")
+
+
+# Create a singleton instance to be used throughout the app
+bus = EventBus()
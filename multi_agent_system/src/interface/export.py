@@ -0,0 +1,197 @@
+import csv
+import gzip
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.interface.database import DatabaseHandler
+
+# Column types for Parquet; anything not listed is a string
+COLUMN_TYPES = {
+    "id": "int", "timestamp": "timestamp",
+    "prompt_tokens": "int", "completion_tokens": "int", "total_tokens": "int",
+    "cached_tokens": "int", "prompt_chars": "int", "input_chars": "int", "output_chars": "int",
+    "latency_ms": "float", "duration_ms": "float",
+}
+
+
+def _partition_date(timestamp) -> str:
+    # SQLite hands timestamps back as 'YYYY-MM-DD HH:MM:SS[.ffffff]'
+    return str(timestamp)[:10] if timestamp else "unknown"
+
+
+def _to_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class PartitionWriter(ABC):
+    """
+    Writes rows into `<out>/<table>/date=YYYY-MM-DD/` partitions.
+    Rows arrive in timestamp order, so only one partition file is open at a time.
+    """
+    extension = ""
+
+    def __init__(self, out_dir: str, table: str, columns: Tuple[str, ...], stamp: str):
+        self.out_dir = out_dir
+        self.table = table
+        self.columns = columns
+        self.stamp = stamp
+        self.files: List[str] = []
+        self._date: Optional[str] = None
+        self._parts: Dict[str, int] = {}
+
+    def write(self, rows: List[Tuple]):
+        """Splits an ordered chunk into runs of the same date."""
+        date_index = self.columns.index("timestamp")
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or _partition_date(rows[i][date_index]) != _partition_date(rows[start][date_index]):
+                date = _partition_date(rows[start][date_index])
+                if date != self._date:
+                    self._close_file()
+                    self._open_file(date)
+                self._write_rows(rows[start:i])
+                start = i
+
+    def _path_for(self, date: str) -> str:
+        # A date can come back (unordered legacy rows), so parts are numbered
+        part = self._parts.get(date, 0)
+        self._parts[date] = part + 1
+        directory = os.path.join(self.out_dir, self.table, f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"part-{self.stamp}-{part:04d}{self.extension}")
+
+    def _open_file(self, date: str):
+        self._date = date
+        path = self._path_for(date)
+        self.files.append(path)
+        self._open(path)
+
+    def _close_file(self):
+        if self._date is not None:
+            self._close()
+            self._date = None
+
+    def close(self):
+        self._close_file()
+
+    # Implemented by the format-specific writers
+    @abstractmethod
+    def _open(self, path: str):
+        ...
+
+    @abstractmethod
+    def _write_rows(self, rows: List[Tuple]):
+        ...
+
+    @abstractmethod
+    def _close(self):
+        ...
+
+
+class ParquetPartitionWriter(PartitionWriter):
+    """Compressed Parquet through pyarrow; each chunk becomes a row group."""
+    extension = ".parquet"
+
+    def __init__(self, *args, compression: str = "zstd", **kwargs):
+        super().__init__(*args, **kwargs)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa, self._pq = pa, pq
+        types = {"int": pa.int64(), "float": pa.float64(), "timestamp": pa.timestamp("us")}
+        self.schema = pa.schema([(c, types.get(COLUMN_TYPES.get(c), pa.string())) for c in self.columns])
+        self.compression = compression
+        self._writer = None
+
+    def _open(self, path: str):
+        self._writer = self._pq.ParquetWriter(path, self.schema, compression=self.compression)
+
+    def _write_rows(self, rows: List[Tuple]):
+        pa = self._pa
+        arrays = []
+        for i, column in enumerate(self.columns):
+            values = [row[i] for row in rows]
+            kind = COLUMN_TYPES.get(column)
+            if kind == "timestamp":
+                values = [_to_datetime(v) for v in values]
+            elif kind is None:
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(pa.array(values, type=self.schema.field(column).type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def _close(self):
+        self._writer.close()
+        self._writer = None
+
+
+class CsvPartitionWriter(PartitionWriter):
+    """Gzip-compressed CSV with a header row; used when pyarrow isn't installed."""
+    extension = ".csv.gz"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._file = None
+        self._csv = None
+
+    def _open(self, path: str):
+        self._file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(self.columns)
+
+    def _write_rows(self, rows: List[Tuple]):
+        self._csv.writerows(rows)
+
+    def _close(self):
+        self._file.close()
+        self._file = self._csv = None
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def export_tables(db: DatabaseHandler, out_dir: str, tables: Iterable[str],
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  fmt: str = "auto", chunk_size: int = 50000,
+                  compression: str = "zstd") -> Dict[str, Tuple[int, List[str]]]:
+    """
+    Streams each table out of SQLite chunk by chunk into date-partitioned files.
+    `fmt` is 'parquet', 'csv' or 'auto' (Parquet when pyarrow is installed).
+    Returns {table: (rows written, files written)}.
+    """
+    if fmt == "auto":
+        fmt = "parquet" if pyarrow_available() else "csv"
+    if fmt == "parquet" and not pyarrow_available():
+        raise ImportError("Parquet export needs the optional 'pyarrow' package: pip install pyarrow "
+                          "(or use --format csv)")
+    if fmt not in ("parquet", "csv"):
+        raise ValueError(f"Unknown export format '{fmt}'. Expected: parquet, csv")
+
+    # Every export gets its own file names, so re-exports never overwrite
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    summary = {}
+    for table in tables:
+        columns = db.EXPORT_TABLES[table]
+        if fmt == "parquet":
+            writer: PartitionWriter = ParquetPartitionWriter(out_dir, table, columns, stamp, compression=compression)
+        else:
+            writer = CsvPartitionWriter(out_dir, table, columns, stamp)
+        rows_written = 0
+        try:
+            for chunk in db.iter_chunks(table, since=since, until=until, chunk_size=chunk_size):
+                writer.write(chunk)
+                rows_written += len(chunk)
+        finally:
+            writer.close()
+        summary[table] = (rows_written, writer.files)
+    return summary
@@ -1,8 +1,15 @@
 import yaml
 import os
+import re
+import sys
 import difflib
-from typing import Dict, Any, List
-from src.schema import OrchestrationConfig, AgentConfig, WorkflowConfig, WorkflowStep
+from typing import Dict, Any, List, Optional
+from src.schema import OrchestrationConfig, AgentConfig, WorkflowConfig, WorkflowStep, Route, Condition, CascadeConfig, ForEach, RecallConfig, AggregateConfig
+
+def _notice(message: str):
+    """Auto-corrections go to stderr, so headless mode's stdout stays pure JSON lines."""
+    sys.stderr.write(f"[Notice] {message}\n")
+
 
 class ConfigParser:
     """
@@ -88,22 +95,178 @@ class ConfigParser:
         if isinstance(tools, str):
             tools = [tools]
 
+        # 5. Tool calling: 'tool_mode', 'tool_calling' (auto / native / text)
+        tool_mode = str(data.get('tool_mode') or
+                        data.get('tool_calling') or
+                        os.getenv("TOOL_CALLING_MODE", "auto")).lower()
+        if tool_mode not in ('auto', 'native', 'text'):
+            raise ValueError(f"Agent '{data['id']}': unknown tool_mode '{tool_mode}'. Expected: auto, native, text")
+
+        # 6. Model cascade: 'cascade' / 'models', or simply a list under 'model'
+        model = data.get('model', os.getenv("DEFAULT_MODEL", "groq/llama-3.3-70b-versatile"))
+        raw_cascade = data.get('cascade') or data.get('models')
+        tiers = None
+        if isinstance(model, list):
+            tiers, model = model, None
+        cascade = ConfigParser._parse_cascade(raw_cascade or tiers, data['id'],
+                                              final_model=data.get('model') and model, default_models=tiers)
+        if cascade:
+            # The strongest model stands for the agent wherever a single model is needed
+            model = cascade.models[-1]
+
+        # 7. Memory recall: 'recall', 'auto_memory', 'memory_recall' (true, a budget, keys or a dict)
+        raw_recall = next((data[k] for k in ('recall', 'auto_memory', 'memory_recall') if k in data), None)
+        recall = ConfigParser._parse_recall(raw_recall, data['id'])
+
         return AgentConfig(
             id=data['id'],
             role=role,
             goal=goal,
-            model=data.get('model', os.getenv("DEFAULT_MODEL", "groq/llama-3.3-70b-versatile")),
+            model=model,
             tools=tools,
             instructions=instructions,
-            sub_agents=data.get('sub_agents', [])
+            sub_agents=data.get('sub_agents', []),
+            timeout=ConfigParser._parse_duration(data.get('timeout') or data.get('deadline')),
+            tool_mode=tool_mode,
+            cascade=cascade,
+            recall=recall
+        )
+
+    @staticmethod
+    def _parse_cascade(raw: Any, agent_id: str, final_model: Optional[str] = None,
+                       default_models: Optional[List[str]] = None) -> Optional[CascadeConfig]:
+        """
+        Accepts a list of models (cheapest first) or a dict with 'models' plus
+        'check(s)' / 'escalate_if', 'min_confidence', 'verifier' and 'json_keys'.
+        An explicit 'model' that isn't in the list becomes the last tier;
+        a list under 'model' supplies the tiers for a dict without 'models'.
+        """
+        if not raw:
+            return None
+        if not isinstance(raw, dict):
+            raw = {'models': raw}
+
+        models = raw.get('models') or raw.get('tiers') or default_models or []
+        if isinstance(models, str):
+            models = [models]
+        models = [str(m) for m in models]
+        if final_model and final_model not in models:
+            models.append(final_model)
+        if len(models) < 2:
+            raise ValueError(f"Agent '{agent_id}': a cascade needs at least two models, got {models}")
+
+        verifier = raw.get('verifier') or raw.get('verifier_model') or raw.get('judge')
+        json_keys = raw.get('json_keys') or raw.get('required_keys') or []
+        if isinstance(json_keys, str):
+            json_keys = [json_keys]
+
+        raw_checks = raw.get('checks') or raw.get('check') or raw.get('escalate_if') or raw.get('escalate_on')
+        if not raw_checks:
+            # Infer the check from whatever options were given
+            raw_checks = (['verifier'] if verifier else []) + (['json'] if json_keys else []) or ['confidence']
+        if isinstance(raw_checks, str):
+            raw_checks = [c.strip() for c in raw_checks.split(',')]
+
+        aliases = {'valid_json': 'json', 'json_valid': 'json', 'schema': 'json',
+                   'self_confidence': 'confidence', 'low_confidence': 'confidence', 'self_report': 'confidence',
+                   'verify': 'verifier', 'judge': 'verifier', 'verifier_call': 'verifier'}
+        valid_checks = ['json', 'confidence', 'verifier']
+        checks = []
+        for raw_check in raw_checks:
+            check = aliases.get(str(raw_check).lower(), str(raw_check).lower())
+            if check not in valid_checks:
+                matches = difflib.get_close_matches(check, valid_checks, n=1, cutoff=0.6)
+                if not matches:
+                    raise ValueError(f"Agent '{agent_id}': unknown cascade check '{raw_check}'. Expected: {valid_checks}")
+                _notice(f"Auto-corrected cascade check '{raw_check}' to '{matches[0]}'")
+                check = matches[0]
+            if check not in checks:
+                checks.append(check)
+        # Cheap checks first, the verifier call last
+        checks.sort(key=valid_checks.index)
+
+        raw_confidence = raw.get('min_confidence', raw.get('confidence', raw.get('threshold', 0.7)))
+        try:
+            min_confidence = float(str(raw_confidence).rstrip('%'))
+        except ValueError:
+            raise ValueError(f"Agent '{agent_id}': 'min_confidence' must be a number, got: '{raw_confidence}'")
+        if min_confidence > 1:
+            min_confidence /= 100
+
+        return CascadeConfig(
+            models=models, checks=checks, min_confidence=min_confidence,
+            verifier=str(verifier) if verifier else None, json_keys=[str(k) for k in json_keys]
         )
 
+    @staticmethod
+    def _parse_recall(raw: Any, agent_id: str) -> Optional[RecallConfig]:
+        """
+        Accepts true/'auto' (defaults), a character budget (1500 or '1500'), a list
+        of keys that are always included, or a dict with 'max_chars' / 'budget',
+        'max_entries' / 'top_k' and 'keys' / 'always'.
+        """
+        if raw is None or raw is False or str(raw).lower() in ('false', 'no', 'off', 'none'):
+            return None
+        default_budget = int(os.getenv("RECALL_MAX_CHARS", "2000"))
+        if raw is True or str(raw).lower() in ('true', 'yes', 'on', 'auto'):
+            return RecallConfig(max_chars=default_budget)
+        if isinstance(raw, list):
+            return RecallConfig(max_chars=default_budget, keys=[str(k) for k in raw])
+        if not isinstance(raw, dict):
+            raw = {'max_chars': raw}
+
+        keys = raw.get('keys') or raw.get('always') or raw.get('include') or []
+        if isinstance(keys, str):
+            keys = [keys]
+        try:
+            max_chars = int(raw.get('max_chars') or raw.get('budget') or raw.get('chars') or default_budget)
+            max_entries = int(raw.get('max_entries') or raw.get('top_k') or raw.get('limit') or 8)
+        except (TypeError, ValueError):
+            raise ValueError(f"Agent '{agent_id}': recall budget and entry limit must be whole numbers, got {raw}")
+        if max_chars <= 0 or max_entries <= 0:
+            raise ValueError(f"Agent '{agent_id}': recall budget and entry limit must be positive, got {raw}")
+        return RecallConfig(max_chars=max_chars, max_entries=max_entries, keys=[str(k) for k in keys])
+
+    @staticmethod
+    def _parse_aggregate(raw: Any) -> AggregateConfig:
+        """
+        Accepts true/false (near-duplicate merging on/off), a token budget
+        (6000) or a dict with 'dedupe', 'threshold' / 'similarity' and
+        'max_tokens' / 'token_budget'. The budget defaults to AGGREGATE_MAX_TOKENS.
+        Merging is opt-in: it is off unless asked for or a threshold is given.
+        """
+        env_budget = int(os.getenv("AGGREGATE_MAX_TOKENS", "0") or 0)
+        if raw is None or isinstance(raw, bool) or str(raw).lower() in ('true', 'false', 'yes', 'no', 'on', 'off'):
+            dedupe = raw is True or str(raw).lower() in ('true', 'yes', 'on')
+            return AggregateConfig(dedupe=dedupe, max_tokens=env_budget or None)
+        if not isinstance(raw, dict):
+            raw = {'max_tokens': raw}
+
+        asked = 'threshold' in raw or 'similarity' in raw
+        dedupe = raw.get('dedupe', raw.get('dedup', raw.get('merge_duplicates', asked)))
+        dedupe = str(dedupe).lower() not in ('false', 'no', 'off', '0')
+
+        raw_threshold = raw.get('threshold', raw.get('similarity', 0.8))
+        raw_budget = raw.get('max_tokens') or raw.get('token_budget') or raw.get('budget') or env_budget
+        try:
+            threshold = float(str(raw_threshold).rstrip('%'))
+            max_tokens = int(raw_budget) if raw_budget else None
+        except ValueError:
+            raise ValueError(f"'aggregate' needs a numeric threshold and token budget, got: {raw}")
+        if threshold > 1:
+            threshold /= 100
+        if not 0 < threshold <= 1:
+            raise ValueError(f"'aggregate' threshold must be between 0 and 1, got: {raw_threshold}")
+        if max_tokens is not None and max_tokens < 100:
+            raise ValueError(f"'aggregate' token budget is too small to be useful: {max_tokens}")
+        return AggregateConfig(dedupe=dedupe, threshold=threshold, max_tokens=max_tokens)
+
     @staticmethod
     def _parse_workflow(data: Dict[str, Any]) -> WorkflowConfig:
         raw_type = data.get('type', 'sequential')
         
         # --- SPELLING CORRECTION ---
-        valid_types = ['sequential', 'parallel']
+        valid_types = ['sequential', 'parallel', 'router', 'loop']
         # 1. Exact match
         if raw_type.lower() in valid_types:
             w_type = raw_type.lower()
@@ -111,7 +274,7 @@ class ConfigParser:
             # 2. Fuzzy match (e.g. "sequntial" -> "sequential")
             matches = difflib.get_close_matches(raw_type.lower(), valid_types, n=1, cutoff=0.6)
             if matches:
-                print(f"[Notice] Auto-corrected workflow type '{raw_type}' to '{matches[0]}'")
+                _notice(f"Auto-corrected workflow type '{raw_type}' to '{matches[0]}'")
                 w_type = matches[0]
             else:
                 raise ValueError(f"Unknown workflow type: '{raw_type}'. Expected: {valid_types}")
@@ -120,18 +283,22 @@ class ConfigParser:
         branches = []
         then_step = None
 
-        if w_type == 'sequential':
+        # Deadline for the whole workflow: 'timeout', 'deadline'
+        timeout = ConfigParser._parse_duration(data.get('timeout') or data.get('deadline'))
+
+        if w_type in ('router', 'loop'):
+            # A lone router/loop is a one-step sequential workflow
+            steps = [ConfigParser._parse_step({**data, 'type': w_type})]
+            w_type = 'sequential'
+
+        elif w_type == 'sequential':
             # Handle 'steps', 'sequence', 'flow'
             raw_steps = (data.get('steps') or 
                          data.get('sequence') or 
                          data.get('flow') or 
                          [])
             
-            for s in raw_steps:
-                if isinstance(s, dict) and 'agent' in s:
-                    steps.append(WorkflowStep(agent=s['agent']))
-                elif isinstance(s, str):
-                    steps.append(WorkflowStep(agent=s))
+            steps = ConfigParser._parse_steps(raw_steps)
 
         elif w_type == 'parallel':
             # Handle 'branches', 'parallel_tasks'
@@ -145,5 +312,311 @@ class ConfigParser:
                     then_step = WorkflowStep(agent=raw_then['agent'])
                 elif isinstance(raw_then, str):
                     then_step = WorkflowStep(agent=raw_then)
+
+            # Fan-out instead of distinct branches: 'foreach', 'for_each', 'map'
+            foreach = None
+            fan_data = data
+            if isinstance(branches, dict):
+                # branches: {foreach: ..., agent: ...}
+                fan_data, branches = {**branches, 'then': raw_then}, []
+            fan_out_key = next((k for k in ('foreach', 'for_each', 'map', 'fan_out') if k in fan_data), None)
+            if fan_out_key:
+                foreach = ConfigParser._parse_foreach(fan_data, fan_out_key)
+                if not foreach.then and then_step:
+                    foreach.then = then_step.agent
+
+            # Completion policy: 'mode', 'strategy' (all / race)
+            raw_quorum = data.get('quorum')
+            raw_mode = data.get('mode') or data.get('strategy') or ('race' if raw_quorum else 'all')
+            mode = ConfigParser._parse_parallel_mode(str(raw_mode))
+
+            quorum = 1
+            if raw_quorum is not None:
+                try:
+                    quorum = int(raw_quorum)
+                except (TypeError, ValueError):
+                    raise ValueError(f"'quorum' must be a whole number, got: '{raw_quorum}'")
+                if quorum < 1:
+                    raise ValueError(f"'quorum' must be at least 1, got: {quorum}")
+                if branches and quorum > len(branches):
+                    raise ValueError(
+                        f"'quorum' is {quorum} but there are only {len(branches)} branches, so it could never be reached"
+                    )
+
+            accept = data.get('accept') or data.get('accept_if')
+            if accept:
+                try:
+                    re.compile(accept)
+                except re.error as e:
+                    raise ValueError(f"Invalid 'accept' pattern '{accept}': {e}")
+
+            # Pre-aggregation: 'aggregate', 'condense', 'pre_aggregate'
+            raw_aggregate = next((data[k] for k in ('aggregate', 'condense', 'pre_aggregate') if k in data), None)
+            aggregate = ConfigParser._parse_aggregate(raw_aggregate)
+
+            return WorkflowConfig(
+                type=w_type, branches=branches, then=then_step,
+                mode=mode, quorum=quorum, accept=accept, timeout=timeout, foreach=foreach,
+                aggregate=aggregate
+            )
         
-        return WorkflowConfig(type=w_type, steps=steps, branches=branches, then=then_step)
\ No newline at end of file
+        return WorkflowConfig(type=w_type, steps=steps, branches=branches, then=then_step, timeout=timeout)
+
+    @staticmethod
+    def _parse_steps(raw_steps: Any) -> List[WorkflowStep]:
+        """A step list; a single agent id or step dict is a list of one."""
+        if raw_steps is None:
+            return []
+        if isinstance(raw_steps, (str, dict)):
+            raw_steps = [raw_steps]
+        return [ConfigParser._parse_step(s) for s in raw_steps]
+
+    @staticmethod
+    def _parse_step(s: Any) -> WorkflowStep:
+        """
+        Accepts 'writer', {agent: writer}, {router: {...}}, {loop: {...}}
+        or {type: router, ...} / {type: loop, ...}.
+        """
+        if isinstance(s, str):
+            return WorkflowStep(agent=s)
+        if not isinstance(s, dict):
+            raise ValueError(f"Invalid workflow step: {s!r}")
+        # Fan-out: {foreach: [...], agent: x} or {foreach: {agent: x, items: ...}}
+        for key in ('foreach', 'for_each', 'map', 'fan_out'):
+            if key in s:
+                return WorkflowStep(kind='foreach', foreach=ConfigParser._parse_foreach(s, key))
+        if 'agent' in s:
+            return WorkflowStep(agent=s['agent'])
+
+        # Nested form: {router: {...}} / {loop: {...}} (plus synonyms)
+        for kind, keys in (('router', ('router', 'route', 'switch', 'branch')),
+                           ('loop', ('loop', 'repeat'))):
+            for key in keys:
+                if isinstance(s.get(key), dict):
+                    return ConfigParser._parse_router(s[key]) if kind == 'router' else ConfigParser._parse_loop(s[key])
+
+        # Flat form: {type: router, routes: [...]}
+        kind = str(s.get('type') or s.get('kind') or '').lower()
+        if kind in ('foreach', 'for_each', 'map', 'fan_out'):
+            return WorkflowStep(kind='foreach', foreach=ConfigParser._parse_foreach({'foreach': s}, 'foreach'))
+        if kind in ('router', 'route', 'switch'):
+            return ConfigParser._parse_router(s)
+        if kind in ('loop', 'repeat'):
+            return ConfigParser._parse_loop(s)
+        raise ValueError(f"Workflow step needs 'agent', 'router' or 'loop': {s}")
+
+    @staticmethod
+    def _parse_foreach(data: Dict[str, Any], key: str) -> ForEach:
+        """
+        The items may sit under the fan-out key itself (a list, 'previous' or a
+        file path) or in a nested dict with 'items' / 'file' / 'from'.
+        """
+        spec = data[key]
+        if isinstance(spec, dict):
+            data = {**data, **spec}
+            source = spec.get('items', spec.get('in', spec.get('over', spec.get('from'))))
+        else:
+            source = spec
+
+        agent = data.get('agent') or data.get('run')
+        if not agent:
+            raise ValueError(f"'{key}' needs the 'agent' to run for every item")
+
+        items, file, from_previous = [], data.get('file') or data.get('items_file'), False
+        if isinstance(source, list):
+            items = source
+        elif isinstance(source, str):
+            if source.lower() in ('previous', 'prev', 'last', 'context', 'previous_output'):
+                from_previous = True
+            elif not file:
+                # Any other string is a file with one item per line
+                file = source
+        elif source is not None and not file:
+            raise ValueError(f"'{key}' items must be a list, 'previous' or a file path, got: {source!r}")
+        if not items and not file and not from_previous:
+            raise ValueError(f"'{key}' for agent '{agent}' has no items")
+
+        raw_concurrency = (data.get('concurrency') or data.get('max_concurrency') or
+                           data.get('parallelism') or os.getenv("FOREACH_CONCURRENCY", "4"))
+        try:
+            concurrency = int(raw_concurrency)
+        except (TypeError, ValueError):
+            raise ValueError(f"'concurrency' must be a whole number, got: '{raw_concurrency}'")
+        if concurrency < 1:
+            raise ValueError(f"'concurrency' must be at least 1, got: {concurrency}")
+
+        then = data.get('then') or data.get('aggregator') or data.get('reduce')
+        if isinstance(then, dict):
+            then = then.get('agent')
+
+        return ForEach(
+            agent=agent, items=items, file=file, from_previous=from_previous, concurrency=concurrency,
+            task=data.get('task') or data.get('task_input') or data.get('prompt') or ForEach.task,
+            then=then, output=data.get('output') or data.get('output_file')
+        )
+
+    @staticmethod
+    def _parse_router(data: Dict[str, Any]) -> WorkflowStep:
+        raw_routes = data.get('routes') or data.get('cases') or data.get('options') or []
+        # Routes may also be a mapping of name -> spec
+        if isinstance(raw_routes, dict):
+            raw_routes = [
+                {'name': name, **(spec if isinstance(spec, dict) else {'to': spec})}
+                for name, spec in raw_routes.items()
+            ]
+        if not raw_routes:
+            raise ValueError("Router step needs at least one entry in 'routes'")
+
+        routes = [ConfigParser._parse_route(r, i) for i, r in enumerate(raw_routes)]
+
+        # Default: an existing route name, an agent id / step list, or a route spec
+        default = None
+        raw_default = data.get('default') or data.get('otherwise') or data.get('fallback')
+        if raw_default:
+            by_name = {r.name: r for r in routes}
+            if isinstance(raw_default, str) and raw_default in by_name:
+                default = by_name[raw_default]
+            elif isinstance(raw_default, dict) and not ({'agent', 'router', 'loop', 'type'} & raw_default.keys()):
+                default = ConfigParser._parse_route({'name': 'default', **raw_default}, len(routes))
+            else:
+                default = Route(name='default', steps=ConfigParser._parse_steps(raw_default))
+
+        # Classifier: a model name, true (ROUTER_MODEL) or false. Routes without
+        # a rule can only be picked by the classifier, so they switch it on.
+        raw_classifier = data.get('classifier', data.get('model'))
+        if raw_classifier is None and any(r.when is None for r in routes):
+            raw_classifier = True
+        classifier = None
+        if raw_classifier is True:
+            classifier = os.getenv("ROUTER_MODEL", "groq/llama-3.1-8b-instant")
+        elif raw_classifier:
+            classifier = str(raw_classifier)
+
+        return WorkflowStep(kind='router', routes=routes, default=default, classifier=classifier)
+
+    @staticmethod
+    def _parse_route(data: Any, index: int) -> Route:
+        # A bare agent id / list of ids is a classifier-only route
+        if not isinstance(data, dict):
+            steps = ConfigParser._parse_steps(data)
+            return Route(name=steps[0].agent if steps and steps[0].agent else f"route_{index + 1}", steps=steps)
+
+        raw_steps = None
+        for key in ('to', 'steps', 'agents', 'then', 'run'):
+            if key in data:
+                raw_steps = data[key]
+                break
+        steps = ConfigParser._parse_steps(raw_steps)
+        end = bool(data.get('end') or data.get('stop') or data.get('finish'))
+        if not steps and not end and 'agent' in data:
+            steps = [WorkflowStep(agent=data['agent'])]
+
+        name = data.get('name') or data.get('label') or (steps[0].agent if steps and steps[0].agent else None)
+
+        # Rule: under 'when', or inline on the route itself
+        when = ConfigParser._parse_condition(data['when']) if 'when' in data else ConfigParser._parse_condition(
+            {k: v for k, v in data.items() if k in ConfigParser._CONDITION_KEYS} or None
+        )
+
+        return Route(
+            name=str(name or f"route_{index + 1}"),
+            steps=steps,
+            when=when,
+            description=data.get('description') or data.get('desc') or data.get('if'),
+            end=end
+        )
+
+    @staticmethod
+    def _parse_loop(data: Dict[str, Any]) -> WorkflowStep:
+        body = ConfigParser._parse_steps(data.get('steps') or data.get('body') or data.get('do') or data.get('agents'))
+        if not body:
+            raise ValueError("Loop step needs at least one entry in 'steps'")
+
+        # Exit condition: 'until' / 'exit_when' / 'stop_when', or 'while' (negated)
+        until = ConfigParser._parse_condition(data.get('until') or data.get('exit_when') or data.get('stop_when'))
+        if until is None and data.get('while'):
+            until = ConfigParser._parse_condition(data['while'])
+            until.negate = not until.negate
+
+        raw_max = (data.get('max_iterations') or data.get('max_iter') or
+                   data.get('iterations') or data.get('max') or 3)
+        try:
+            max_iterations = int(raw_max)
+        except (TypeError, ValueError):
+            raise ValueError(f"'max_iterations' must be a whole number, got: '{raw_max}'")
+        if max_iterations < 1:
+            raise ValueError(f"'max_iterations' must be at least 1, got: {max_iterations}")
+
+        return WorkflowStep(kind='loop', steps=body, until=until, max_iterations=max_iterations)
+
+    # Keys that make up a condition (also accepted inline on a route)
+    _CONDITION_KEYS = ('match', 'regex', 'pattern', 'contains', 'field', 'path', 'json',
+                       'equals', 'in', 'is', 'value', 'not')
+
+    @staticmethod
+    def _parse_condition(raw: Any) -> Optional[Condition]:
+        """
+        A bare string is a regex. A dict may combine a regex ('match'/'regex'/'pattern',
+        or 'contains' for plain text) with a JSON check ('field'/'path' plus 'equals'/'in').
+        """
+        if raw is None or raw == '':
+            return None
+        if isinstance(raw, str):
+            raw = {'match': raw}
+        if not isinstance(raw, dict):
+            raise ValueError(f"Invalid condition: {raw!r}. Use a regex or a dict with 'match' / 'field'.")
+
+        pattern = raw.get('match') or raw.get('regex') or raw.get('pattern')
+        if not pattern and raw.get('contains'):
+            pattern = re.escape(str(raw['contains']))
+        if pattern:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid condition pattern '{pattern}': {e}")
+
+        path = raw.get('field') or raw.get('path') or raw.get('json')
+        equals = next((raw[k] for k in ('equals', 'in', 'is', 'value') if k in raw), [])
+        if not isinstance(equals, list):
+            equals = [equals]
+
+        if not pattern and not path:
+            raise ValueError(f"Condition needs a pattern ('match') or a JSON 'field': {raw}")
+
+        return Condition(pattern=pattern, path=path, equals=equals, negate=bool(raw.get('not')))
+
+    @staticmethod
+    def _parse_duration(raw: Any) -> Optional[float]:
+        """
+        Turns '30', 30, '30s', '2m' or '1h' into seconds.
+        Empty values mean "no deadline".
+        """
+        if raw is None or raw == '':
+            return None
+        if isinstance(raw, (int, float)):
+            seconds = float(raw)
+        else:
+            match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*', str(raw).lower())
+            if not match:
+                raise ValueError(f"Invalid duration: '{raw}'. Use seconds or a suffix like '30s', '2m', '1h'.")
+            factor = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[match.group(2) or 's']
+            seconds = float(match.group(1)) * factor
+        if seconds <= 0:
+            raise ValueError(f"Duration must be positive, got: '{raw}'")
+        return seconds
+
+    @staticmethod
+    def _parse_parallel_mode(raw_mode: str) -> str:
+        # Synonyms for racing branches against each other
+        aliases = {'first': 'race', 'fastest': 'race', 'any': 'race', 'wait_all': 'all'}
+        mode = aliases.get(raw_mode.lower(), raw_mode.lower())
+
+        valid_modes = ['all', 'race']
+        if mode in valid_modes:
+            return mode
+
+        matches = difflib.get_close_matches(mode, valid_modes, n=1, cutoff=0.6)
+        if matches:
+            _notice(f"Auto-corrected parallel mode '{raw_mode}' to '{matches[0]}'")
+            return matches[0]
+        raise ValueError(f"Unknown parallel mode: '{raw_mode}'. Expected: {valid_modes}")
\ No newline at end of file
@@ -1,28 +1,110 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
 import inspect
-from typing import Callable, Dict, Any, List
+import json
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, List, Optional
 from src.interface.database import db
+from src.interface.context import namespace_for, visible_namespaces
+from src.interface import cassette
 import os
 
+# Scope used by the memory tools when the agent doesn't pass one
+DEFAULT_MEMORY_SCOPE = os.getenv("MEMORY_DEFAULT_SCOPE", "global")
+
+# Execution classes a tool can be registered with
+TOOL_KINDS = ("inline", "io", "cpu")
+
+# Pool sizes and the default time an agent waits for a tool
+TOOL_IO_WORKERS = int(os.getenv("TOOL_IO_WORKERS", "16"))
+TOOL_CPU_WORKERS = int(os.getenv("TOOL_CPU_WORKERS", str(os.cpu_count() or 2)))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60") or 0) or None
+
+
+@dataclass
+class ToolSpec:
+    """A registered tool plus how (and how often at once) it may run."""
+    name: str
+    func: Callable
+    kind: str = "inline"
+    is_async: bool = False
+    max_concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+    limiter: Optional[threading.BoundedSemaphore] = None
+    # Metrics
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    running: int = 0
+    waiting: int = 0  # Queue depth: calls held back by the concurrency limit
+    max_waiting: int = 0
+    total_seconds: float = 0.0
+    total_wait_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
 class ToolRegistry:
     """
     A central registry for all tools (functions) that agents can use.
     Maps string names (from YAML) to actual Python callables.
+    Each tool has an execution class:
+        inline -> runs on the agent's own thread (cheap, pure functions)
+        io     -> a dedicated thread pool (DB, files, HTTP); async tools use a background event loop
+        cpu    -> a process pool (heavy computation, isolated from the GIL)
+    Tools never share a pool with agents, so a slow tool can't starve LLM calls.
     """
     _registry: Dict[str, Callable] = {}
+    _specs: Dict[str, ToolSpec] = {}
+
+    _io_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _cpu_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _pool_lock = threading.Lock()
 
     @classmethod
-    def register_tool(cls, name: str):
+    def register_tool(cls, name: str, kind: str = "inline", max_concurrency: Optional[int] = None,
+                      timeout: Optional[float] = None):
         """
         Decorator to register a function as a tool.
         Usage:
             @ToolRegistry.register_tool("my_tool")
             def my_function(...): ...
+
+            @ToolRegistry.register_tool("fetch", kind="io", max_concurrency=4)
+            async def fetch(url: str): ...
+        `cpu` tools must be module-level functions (they are pickled to a worker process).
         """
+        if kind not in TOOL_KINDS:
+            raise ValueError(f"Unknown tool kind '{kind}'. Expected: {TOOL_KINDS}")
+
         def decorator(func: Callable):
+            is_async = inspect.iscoroutinefunction(func)
+            if is_async and kind == "cpu":
+                raise ValueError(f"Tool '{name}': async tools can't run in the cpu process pool")
             cls._registry[name] = func
+            cls._specs[name] = ToolSpec(
+                name=name, func=func,
+                # Coroutines always run on the event loop
+                kind="io" if is_async else kind,
+                is_async=is_async,
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+                limiter=threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+            )
             return func
         return decorator
 
+    @classmethod
+    def unregister_tool(cls, name: str):
+        """Removes a tool (e.g. one registered by a test). Unknown names are ignored."""
+        cls._registry.pop(name, None)
+        cls._specs.pop(name, None)
+
     @classmethod
     def get_tool(cls, name: str) -> Callable:
         """Retrieves a tool function by name."""
@@ -35,24 +117,252 @@ class ToolRegistry:
         """Returns a list of all registered tool names."""
         return list(cls._registry.keys())
 
+    @classmethod
+    def get_schema(cls, name: str) -> Dict[str, Any]:
+        """
+        Builds an OpenAI-style function schema from the tool's signature.
+        Parameters without a default are required; the docstring's first
+        paragraph becomes the description.
+        """
+        func = cls.get_tool(name)
+        type_names = {str: "string", int: "integer", float: "number",
+                      bool: "boolean", list: "array", dict: "object"}
+
+        properties = {}
+        required = []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            properties[param.name] = {"type": type_names.get(param.annotation, "string")}
+            if param.default is inspect.Parameter.empty:
+                required.append(param.name)
+
+        doc = inspect.getdoc(func) or name
+        description = " ".join(doc.split("\n\n")[0].split())
+
+        return {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": {"type": "object", "properties": properties, "required": required}
+            }
+        }
+
+    @classmethod
+    def get_schemas(cls, names: List[str]) -> List[Dict[str, Any]]:
+        """Schemas for the given tools, skipping names that aren't registered."""
+        return [cls.get_schema(n) for n in names if n in cls._registry]
+
     @classmethod
     def execute(cls, tool_name: str, **kwargs) -> Any:
         """
         Safely executes a tool with the provided arguments.
         """
+        return cls.run(tool_name, kwargs)
+
+    @classmethod
+    def run(cls, tool_name: str, args: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """
+        Executes a tool on the executor of its class and waits for the result.
+        `timeout` (e.g. the time left before the agent's deadline) caps the
+        tool's own timeout; a tool that runs over it is abandoned with an error.
+        While a cassette is active the result is recorded, or replayed without running the tool.
+        """
+        tape = cassette.active()
+        if tape is None:
+            return cls._run(tool_name, args, timeout)
+        try:
+            return tape.through("tool", tool_name, args, lambda: cls._run(tool_name, args, timeout),
+                                encode=cls._recordable)
+        except cassette.CassetteMiss as e:
+            return f"Error executing tool '{tool_name}': {e}"
+
+    @staticmethod
+    def _recordable(result: Any) -> Any:
+        """Tool results go into the cassette as JSON; anything else as its text."""
+        try:
+            json.dumps(result)
+            return result
+        except (TypeError, ValueError):
+            return str(result)
+
+    @classmethod
+    def _run(cls, tool_name: str, args: Dict[str, Any], timeout: Optional[float]) -> Any:
+        try:
+            spec = cls._specs.get(tool_name) or ToolSpec(name=tool_name, func=cls.get_tool(tool_name))
+        except Exception as e:
+            return f"Error executing tool '{tool_name}': {str(e)}"
+
+        limits = [t for t in (timeout, spec.timeout, TOOL_TIMEOUT if spec.kind != "inline" else None) if t]
+        timeout = min(limits) if limits else None
+
+        # 1. Per-tool concurrency limit (callers queue here)
+        queued = time.monotonic()
+        if spec.limiter is not None:
+            with spec.lock:
+                spec.waiting += 1
+                spec.max_waiting = max(spec.max_waiting, spec.waiting)
+            acquired = spec.limiter.acquire(timeout=timeout)
+            with spec.lock:
+                spec.waiting -= 1
+            if not acquired:
+                cls._count(spec, started=queued, queued=queued, timed_out=True)
+                return f"Error executing tool '{tool_name}': still queued after {timeout:g}s (limit {spec.max_concurrency})"
+
+        started = time.monotonic()
+        with spec.lock:
+            spec.running += 1
+        failed = timed_out = False
+        future = None
         try:
-            func = cls.get_tool(tool_name)
-            # You could add argument validation here if needed
-            return func(**kwargs)
+            # 2. Dispatch to the tool's executor
+            if spec.kind == "inline":
+                return spec.func(**args)
+            pool = cls._cpu_executor() if spec.kind == "cpu" and not spec.is_async else None
+            future = cls._submit(spec, args, pool)
+            # The slot is freed when the work really ends: cancel() can't stop a
+            # tool that is already running, so a timed-out call keeps its slot
+            future.add_done_callback(lambda _: cls._release(spec))
+            try:
+                return future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                timed_out = True
+                if not future.cancel() and pool is not None:
+                    # A process can be stopped (a thread can't): don't let a runaway tool keep its worker
+                    cls._recycle_cpu_pool(pool)
+                return f"Error executing tool '{tool_name}': timed out after {timeout:g}s"
         except Exception as e:
+            failed = True
             return f"Error executing tool '{tool_name}': {str(e)}"
+        finally:
+            if future is None:
+                cls._release(spec)
+            cls._count(spec, started, queued, failed=failed, timed_out=timed_out)
+
+    @staticmethod
+    def _release(spec: ToolSpec):
+        """The call stopped executing: one less running, and its concurrency slot is free again."""
+        with spec.lock:
+            spec.running -= 1
+        if spec.limiter is not None:
+            spec.limiter.release()
+
+    @classmethod
+    def _submit(cls, spec: ToolSpec, args: Dict[str, Any],
+                pool: Optional[concurrent.futures.ProcessPoolExecutor] = None) -> concurrent.futures.Future:
+        if spec.is_async:
+            # The calling thread's context (run / agent scope) travels with the task
+            return asyncio.run_coroutine_threadsafe(spec.func(**args), cls._event_loop())
+        if spec.kind == "io":
+            # Pool threads don't inherit ContextVars on their own
+            ctx = contextvars.copy_context()
+            return cls._io_executor().submit(ctx.run, spec.func, **args)
+        return (pool or cls._cpu_executor()).submit(spec.func, **args)
+
+    @staticmethod
+    def _count(spec: ToolSpec, started: float, queued: float, failed: bool = False, timed_out: bool = False):
+        with spec.lock:
+            spec.calls += 1
+            spec.errors += int(failed)
+            spec.timeouts += int(timed_out)
+            spec.total_seconds += time.monotonic() - started
+            spec.total_wait_seconds += started - queued
+
+    # --- Executors (created on first use) ---
+
+    @classmethod
+    def _io_executor(cls) -> concurrent.futures.ThreadPoolExecutor:
+        with cls._pool_lock:
+            if cls._io_pool is None:
+                cls._io_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=TOOL_IO_WORKERS, thread_name_prefix="tool-io"
+                )
+            return cls._io_pool
+
+    @classmethod
+    def _cpu_executor(cls) -> concurrent.futures.ProcessPoolExecutor:
+        with cls._pool_lock:
+            if cls._cpu_pool is None:
+                # Never plain fork: this process is full of threads, and a child
+                # forked while one of them holds a lock deadlocks on it. forkserver
+                # and spawn need an `if __name__ == "__main__":` guard in the script.
+                method = os.getenv("TOOL_CPU_START_METHOD") or (
+                    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                )
+                cls._cpu_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=TOOL_CPU_WORKERS, mp_context=multiprocessing.get_context(method)
+                )
+            return cls._cpu_pool
+
+    @classmethod
+    def _recycle_cpu_pool(cls, pool: concurrent.futures.ProcessPoolExecutor):
+        """
+        Kills the worker processes of `pool` and lets the next cpu call start a
+        new pool. Other calls still running in it fail with an error.
+        """
+        with cls._pool_lock:
+            if cls._cpu_pool is not pool:
+                return  # Already replaced after an earlier timeout
+            cls._cpu_pool = None
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    @classmethod
+    def _event_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._pool_lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(target=cls._loop.run_forever, name="tool-loop", daemon=True).start()
+            return cls._loop
+
+    @classmethod
+    def shutdown(cls):
+        """Stops the tool executors (registered with atexit)."""
+        with cls._pool_lock:
+            if cls._io_pool is not None:
+                cls._io_pool.shutdown(wait=False, cancel_futures=True)
+                cls._io_pool = None
+            if cls._cpu_pool is not None:
+                cls._cpu_pool.shutdown(wait=False, cancel_futures=True)
+                cls._cpu_pool = None
+            if cls._loop is not None:
+                cls._loop.call_soon_threadsafe(cls._loop.stop)
+                cls._loop = None
+
+    # --- Metrics ---
+
+    @classmethod
+    def metrics(cls) -> Dict[str, Dict[str, Any]]:
+        """Per-tool counters for every tool that has been called at least once."""
+        snapshot = {}
+        for name, spec in cls._specs.items():
+            with spec.lock:
+                if not spec.calls and not spec.running and not spec.waiting:
+                    continue
+                snapshot[name] = {
+                    "kind": spec.kind + (" (async)" if spec.is_async else ""),
+                    "calls": spec.calls,
+                    "errors": spec.errors,
+                    "timeouts": spec.timeouts,
+                    "running": spec.running,
+                    "queue_depth": spec.waiting,
+                    "max_queue_depth": spec.max_waiting,
+                    "avg_seconds": round(spec.total_seconds / spec.calls, 4) if spec.calls else 0.0,
+                    "avg_wait_seconds": round(spec.total_wait_seconds / spec.calls, 4) if spec.calls else 0.0,
+                }
+        return snapshot
+
+atexit.register(ToolRegistry.shutdown)
 
 # =============================================================================
 #  DEFAULT TOOLS
 #  (These are available to any agent immediately)
 # =============================================================================
 
-@ToolRegistry.register_tool("python")
+@ToolRegistry.register_tool("python", kind="cpu")
 def run_python_repl(code: str) -> str:
     """
     A simple (unsafe) Python REPL for demonstration.
@@ -81,7 +391,7 @@ def run_python_repl(code: str) -> str:
         sys.stdout = sys.__stdout__ # Ensure stdout is restored even on error
         return f"Python Execution Error: {e}"
 
-@ToolRegistry.register_tool("file_read")
+@ToolRegistry.register_tool("file_read", kind="io")
 def read_file(file_path: str = None, filename: str = None) -> str:
     """
     Reads a file from the filesystem.
@@ -108,30 +418,51 @@ def read_file(file_path: str = None, filename: str = None) -> str:
     except Exception as e:
         return f"❌ Error reading file: {str(e)}"
 
-@ToolRegistry.register_tool("read_memory")
-def read_knowledge(key: str) -> str:
-    """Retrieves a fact from the database."""
-    val = db.get_memory(key)
-    if val:
-        return f"📖 Found: {val}"
+@ToolRegistry.register_tool("read_memory", kind="io")
+def read_knowledge(key: str, scope: str = None) -> str:
+    """
+    Retrieves a fact from the database.
+    scope: 'agent', 'run' or 'global'. Without a scope the most specific
+    match wins (agent, then run, then global).
+    """
+    if scope:
+        namespaces = [namespace_for(scope)]
+    else:
+        namespaces = visible_namespaces()
+
+    found = db.find_memory(key, namespaces)
+    if found:
+        return f"📖 Found: {found[1]}"
     return f"🤷‍♂️ Nothing found for '{key}'"
 
-@ToolRegistry.register_tool("save_memory")
-def save_knowledge(key: str, value: str) -> str:
-    """Saves a fact to the database for future use."""
-    db.save_memory(key, str(value))
+@ToolRegistry.register_tool("save_memory", kind="io")
+def save_knowledge(key: str, value: str, scope: str = None) -> str:
+    """
+    Saves a fact to the database for future use.
+    scope: 'global' (shared, default), 'run' (this workflow run only) or 'agent' (private).
+    """
+    namespace = namespace_for(scope or DEFAULT_MEMORY_SCOPE)
+    db.save_memory(key, str(value), namespace=namespace)
     return f"✅ Successfully saved '{key}' to memory."
 
-# In src/interface/tools.py
+@ToolRegistry.register_tool("append_memory", kind="io")
+def append_knowledge(key: str, value: str, scope: str = None) -> str:
+    """
+    Atomically appends a line to a fact, so parallel agents never overwrite each other.
+    scope: 'global' (default), 'run' or 'agent'.
+    """
+    namespace = namespace_for(scope or DEFAULT_MEMORY_SCOPE)
+    db.append_memory(key, str(value), namespace=namespace)
+    return f"✅ Appended to '{key}' in memory."
 
-@ToolRegistry.register_tool("recall_everything")
+@ToolRegistry.register_tool("recall_everything", kind="io")
 def read_all_knowledge(key: str = None, query: str = None) -> str:
     """
     Retrieves memories from the database. 
     Can filter by 'key' or 'query' if provided.
     """
-    # 1. Fetch all raw data
-    memories = db.get_all_memory() # Returns list of (id, key, value, timestamp)
+    # 1. Fetch everything this agent can see (agent, run and global namespaces)
+    memories = db.list_memory(visible_namespaces())
     
     if not memories:
         return "No memories found in database."
@@ -140,17 +471,14 @@ def read_all_knowledge(key: str = None, query: str = None) -> str:
     results = []
     search_term = key or query  # Agent might call it 'key' or 'query'
     
-    for mem in memories:
-        # mem structure: (id, key, value, timestamp)
-        m_key = mem[1]
-        m_val = mem[2]
-        
+    for namespace, m_key, m_val, _ in memories:
+        m_val = m_val or ""
         # If agent asked for a specific key, filter for it
         if search_term:
             if search_term.lower() not in m_key.lower() and search_term.lower() not in m_val.lower():
                 continue # Skip this memory if it doesn't match
         
-        results.append(f"{m_key}: {m_val}")
+        results.append(f"[{namespace}] {m_key}: {m_val}")
 
     if not results:
         return f"No memories found matching '{search_term}'."
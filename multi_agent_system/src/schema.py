@@ -1,7 +1,21 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Union, Any
 
 # 1. Defines what an Agent looks like
+@dataclass
+class CascadeConfig:
+    models: List[str]  # Tried in order, cheapest first; the last one always answers
+    checks: List[str] = field(default_factory=lambda: ["confidence"])  # "json", "confidence", "verifier"
+    min_confidence: float = 0.7  # Self-reported confidence needed to stop escalating
+    verifier: Optional[str] = None  # Model for the "verifier" check (default: the first tier)
+    json_keys: List[str] = field(default_factory=list)  # Keys the "json" check requires
+
+@dataclass
+class RecallConfig:
+    max_chars: int = 2000  # Budget for the memory block added to the user message
+    max_entries: int = 8  # At most this many memory entries
+    keys: List[str] = field(default_factory=list)  # Always included when they exist
+
 @dataclass
 class AgentConfig:
     id: str
@@ -11,25 +25,90 @@ class AgentConfig:
     tools: List[str] = field(default_factory=list)
     instructions: Optional[str] = None
     sub_agents: List[str] = field(default_factory=list)
+    timeout: Optional[float] = None  # Seconds this agent may run before it is abandoned
+    tool_mode: str = "auto"  # "auto" (native if supported), "native" or "text"
+    cascade: Optional[CascadeConfig] = None  # Cheap model first, escalate when a check fails
+    recall: Optional[RecallConfig] = None  # Inject relevant memory before the first call
 
-# 2. Defines a single step in a sequential workflow
+# 2. A check on an agent's output (used by router rules and loop exits)
+@dataclass
+class Condition:
+    pattern: Optional[str] = None  # Regex the output must match
+    path: Optional[str] = None  # Dotted path into a JSON object in the output, e.g. "review.status"
+    equals: List[Any] = field(default_factory=list)  # Accepted values at `path` (empty: any truthy value)
+    negate: bool = False  # Flip the result ("while" instead of "until")
+
+# 3. One way out of a router step
+@dataclass
+class Route:
+    name: str
+    steps: List["WorkflowStep"] = field(default_factory=list)  # What runs when chosen (empty: skip)
+    when: Optional[Condition] = None  # Rule on the previous output; None means classifier-only
+    description: Optional[str] = None  # Shown to the classifier
+    end: bool = False  # Finish the workflow after this route
+
+# 4. Runs one agent over many inputs (a list, a file of lines or the previous output's JSON array)
+@dataclass
+class ForEach:
+    agent: str
+    items: List[Any] = field(default_factory=list)  # Inline items
+    file: Optional[str] = None  # One item per line, read lazily
+    from_previous: bool = False  # Items come from a JSON array in the previous output
+    concurrency: int = 4  # Items in flight at once
+    task: str = "Process this item: {item}"  # Task template ({item}, {index})
+    then: Optional[str] = None  # Aggregator, fed the results in input order
+    output: Optional[str] = None  # Also write every result to this JSON-lines file
+
+# 5. Defines a single step in a sequential workflow
 @dataclass
 class WorkflowStep:
-    agent: str  # The ID of the agent to run in this step
+    agent: Optional[str] = None  # The ID of the agent to run in this step
+    kind: str = "agent"  # "agent", "router", "loop" or "foreach"
+
+    # Used if kind == "router": the first route whose rule matches wins,
+    # then the classifier (if any) picks among the rest, then the default
+    routes: List[Route] = field(default_factory=list)
+    default: Optional[Route] = None
+    classifier: Optional[str] = None  # Model for the classification call
+
+    # Used if kind == "loop": repeat `steps` until `until` holds on their output
+    steps: List["WorkflowStep"] = field(default_factory=list)
+    until: Optional[Condition] = None
+    max_iterations: int = 3
+
+    # Used if kind == "foreach"
+    foreach: Optional[ForEach] = None
+
+# 6. Defines the structure of the workflow (Sequential or Parallel)
+@dataclass
+class AggregateConfig:
+    dedupe: bool = False  # Put outputs in branch order and merge near-identical ones, with vote counts
+    threshold: float = 0.8  # Estimated similarity (Jaccard of word shingles) that counts as near-identical
+    max_tokens: Optional[int] = None  # Above this, the aggregator first summarizes groups of outputs
 
-# 3. Defines the structure of the workflow (Sequential or Parallel)
 @dataclass
 class WorkflowConfig:
     type: str  # "sequential" or "parallel"
     
-    # Used if type == "sequential"
+    # Used if type == "sequential" (steps may be agents, routers or loops)
     steps: List[WorkflowStep] = field(default_factory=list)
     
     # Used if type == "parallel"
     branches: List[str] = field(default_factory=list) # List of Agent IDs to run simultaneously
     then: Optional[WorkflowStep] = None # The aggregator agent that runs after branches finish
+    foreach: Optional[ForEach] = None # Fan one agent out over many inputs instead of `branches`
+
+    # Parallel completion policy:
+    #   "all"  -> wait for every branch (default)
+    #   "race" -> continue as soon as `quorum` branches return an acceptable answer
+    mode: str = "all"
+    quorum: int = 1
+    accept: Optional[str] = None # Regex an answer must match to count towards the quorum
+    aggregate: AggregateConfig = field(default_factory=AggregateConfig) # How branch outputs reach `then`
+
+    timeout: Optional[float] = None # Seconds the whole workflow may run
 
-# 4. The Root object that holds everything
+# 7. The Root object that holds everything
 @dataclass
 class OrchestrationConfig:
     agents: List[AgentConfig]
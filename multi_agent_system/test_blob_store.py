@@ -0,0 +1,51 @@
+import os
+import tempfile
+from src.interface import blobs
+from src.interface.database import DatabaseHandler
+
+def test_blob_store():
+    print("🗜️ --- TESTING BLOB STORE ---")
+    db = DatabaseHandler(os.path.join(tempfile.mkdtemp(), "blob_test.db"))
+    big = "search result line\n" * 1000
+
+    # 1. Large values become references to one shared, compressed blob
+    db.save_memory("report", big)
+    db.save_memory("copy", big, namespace="run:r1")
+    db.log_event("researcher", "tool_result", big)
+    conn = db._connect()
+    stored = [row[0] for row in conn.execute("SELECT value FROM memory")]
+    conn.close()
+    assert all(blobs.parse_ref(value) for value in stored), stored
+    count, raw_bytes, stored_bytes = db.blob_stats()
+    assert count == 1 and raw_bytes == len(big) and stored_bytes < raw_bytes / 10
+    print("✅ Identical payloads are stored once, compressed.")
+
+    # 2. Reads are transparent; previews only decompress the start
+    assert db.get_memory("report") == big
+    assert db.find_memory("copy", ["run:r1", "global"]) == ("run:r1", big)
+    _, _, _, _, _, details = next(db.iter_logs(details_chars=50))
+    assert details == big[:50]
+    ref = next(db.iter_logs(resolve=False))[5]
+    assert blobs.parse_ref(ref) and db.resolve(ref) == big  # Loaded only when asked for
+    db.append_memory("report", "one more line")
+    assert db.get_memory("report") == big + "\none more line"
+    db.save_memory("small", "kept inline")
+    assert db.get_memory_entry("small") == ("kept inline", 1)
+    print("✅ Values load on demand, in full or as a preview.")
+
+    # 3. Blobs nothing refers to are removed when logs are pruned
+    db.save_memory("copy", "short now", namespace="run:r1")
+    db.save_memory("scratch", big + "draft")
+    db.save_memory("scratch", "short")  # orphans the draft's blob
+    assert db.prune_logs(max_age_days=365) == 0 and db.blob_stats()[0] == 3  # nothing pruned: no GC pass
+    db.prune_logs(max_rows=0, max_age_days=-1)
+    assert db.blob_stats()[0] == 1  # only the appended report is left
+    conn = db._connect()
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT details FROM logs WHERE details LIKE 'blob:sha256:%'"))
+    conn.close()
+    assert "idx_logs_blob_refs" in plan, plan  # GC reads only rows that hold a reference
+    print("✅ Unreferenced blobs are garbage-collected.")
+
+if __name__ == "__main__":
+    test_blob_store()
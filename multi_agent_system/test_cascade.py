@@ -0,0 +1,36 @@
+from src.engine.cascade import split_confidence, check_answer
+from src.engine.jsonscan import find_json, parse_json_answer
+from src.schema import AgentConfig, CascadeConfig
+
+def test_cascade_checks():
+    print("🪜 --- TESTING CASCADE CHECKS ---")
+    agent = AgentConfig(id="extractor", role="Extractor", goal="Extract names")
+
+    # 1. Confidence line is parsed (0-1 or percent) and removed from the answer
+    assert split_confidence("Ada Lovelace\nConfidence: 0.9") == ("Ada Lovelace", 0.9)
+    assert split_confidence("Ada\n**Confidence: 85%**")[1] == 0.85
+    assert split_confidence("No score here")[1] is None
+    print("✅ Confidence lines parsed.")
+
+    # 2. JSON answers may be fenced or wrapped in prose
+    assert parse_json_answer('```json\n{"name": "Ada"}\n```') == {"name": "Ada"}
+    assert parse_json_answer('Here you go: [1, 2]') == [1, 2]
+    assert find_json('Set {1} then [{"a": 1}] and {"b": 2}', lambda v: isinstance(v, dict), openers="{") == {"a": 1}
+    assert find_json("no json here") is None
+    print("✅ JSON answers found.")
+
+    # 3. Checks decide whether to escalate
+    cascade = CascadeConfig(models=["small", "large"], checks=["json", "confidence"],
+                            min_confidence=0.8, json_keys=["name"])
+    passed, reason, answer = check_answer(cascade, agent, "task", '{"name": "Ada"}\nConfidence: 0.95')
+    assert passed and answer == '{"name": "Ada"}'
+    assert check_answer(cascade, agent, "task", '{"name": "Ada"}\nConfidence: 0.4')[1] == "confidence 0.40 < 0.80"
+    assert check_answer(cascade, agent, "task", '{"title": "x"}\nConfidence: 1')[1] == "JSON missing name"
+    assert check_answer(cascade, agent, "task", "not json\nConfidence: 1")[1] == "invalid JSON"
+    assert not check_answer(cascade, agent, "task", "❌ LLM Error (small): rate limit")[0]
+    print("✅ Failing answers escalate.")
+
+    print("\n🎉 CASCADE TEST COMPLETE")
+
+if __name__ == "__main__":
+    test_cascade_checks()
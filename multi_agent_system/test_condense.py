@@ -0,0 +1,111 @@
+from src.engine import llm
+from src.engine.condense import group_near_duplicates, pack_entries
+from src.engine.orchestrator import Orchestrator
+from src.interface.parser import ConfigParser
+from src.schema import AgentConfig, AggregateConfig, OrchestrationConfig, WorkflowConfig, WorkflowStep
+
+ANSWER = "The main risk is supplier concentration: two vendors provide most of the parts, so any outage stops production for weeks."
+
+def test_near_duplicate_groups():
+    print("🧹 --- TESTING NEAR-DUPLICATE MERGING ---")
+    outputs = [
+        ("a", "Prices will rise next quarter because demand keeps growing faster than supply."),
+        ("b", ANSWER),
+        ("c", ANSWER.replace("weeks", "several weeks")),
+        ("d", ANSWER.upper()),
+    ]
+    groups = group_near_duplicates(outputs, threshold=0.7)
+    assert [g.agents for g in groups] == [["b", "c", "d"], ["a"]]
+    assert groups[0].text == ANSWER
+    assert group_near_duplicates(list(reversed(outputs)), threshold=0.7)[0].votes == 3
+    assert pack_entries(["x" * 40, "y" * 40, "z" * 40], max_tokens=25) == [["x" * 40, "y" * 40], ["z" * 40]]
+    print("✅ Near-identical outputs are merged with vote counts.")
+
+def test_parallel_condensing():
+    print("🪜 --- TESTING CONDENSED AGGREGATION ---")
+    branches = [f"analyst{i}" for i in range(6)]
+    agents = [AgentConfig(id=b, role=f"Analyst {i}", goal="Find risks") for i, b in enumerate(branches)]
+    agents.append(AgentConfig(id="lead", role="Lead", goal="Summarize"))
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="parallel", branches=branches, then=WorkflowStep(agent="lead"),
+        aggregate=AggregateConfig(dedupe=True, threshold=0.7, max_tokens=100)
+    ))
+    prompts = []
+
+    def fake_chat(messages, model=None, timeout=None):
+        system, user = messages[0]["content"], messages[1]["content"]
+        if "Lead" in system:
+            prompts.append(user)
+            return "group summary" if "(group " in user else "final summary"
+        number = int(system.split("Analyst ")[1][0])
+        if number < 3:
+            return ANSWER
+        return f"Distinct finding number {number}: " + "details " * 30
+
+    original = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    try:
+        result = Orchestrator(config).run()
+    finally:
+        llm.llm_client.chat = original
+
+    assert result == "final summary"
+    partials, final = prompts[:-1], prompts[-1]
+    assert len(partials) >= 2 and all("(group " in p for p in partials)
+    assert any("analyst0, analyst1, analyst2 (3 votes" in p for p in partials)
+    assert "Summary of group 1" in final and "Distinct finding" not in final
+    print("✅ Duplicates are merged and oversized input is aggregated in groups first.")
+
+def test_partial_aggregation_stops():
+    print("🛑 --- TESTING PARTIAL AGGREGATION LIMITS ---")
+    config = OrchestrationConfig(agents=[], workflow=WorkflowConfig(type="sequential"))
+    lead = AgentConfig(id="lead", role="Lead", goal="Summarize")
+    calls = []
+
+    def fake_chat(messages, model=None, timeout=None):
+        calls.append(messages[1]["content"])
+        return "padding " * 500  # Summaries no shorter than what they summarize
+
+    original = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    try:
+        orchestrator = Orchestrator(config)
+        # 1. Every entry is over half the budget (one group each) and the summaries don't shrink them:
+        #    one level of calls, then the originals go to the final aggregator instead of looping forever
+        big = [f"Agent a{i} said: " + "x" * 3000 for i in range(4)]
+        assert orchestrator._aggregate_in_groups(lead, big, budget=1000) == "\n".join(big)
+        assert len(calls) == 4, len(calls)
+
+        # 2. The same for groups of several entries
+        calls.clear()
+        medium = [f"Agent a{i} said: " + "y" * 1200 for i in range(6)]
+        assert orchestrator._aggregate_in_groups(lead, medium, budget=700) == "\n".join(medium)
+        assert len(calls) == 3, len(calls)
+    finally:
+        llm.llm_client.chat = original
+    print("✅ Partial aggregation never loops without making progress.")
+
+def test_dedupe_is_opt_in():
+    print("🎛️ --- TESTING AGGREGATE OPTIONS ---")
+    assert not ConfigParser._parse_aggregate(None).dedupe
+    assert not ConfigParser._parse_aggregate(6000).dedupe
+    assert ConfigParser._parse_aggregate(True).dedupe
+    assert ConfigParser._parse_aggregate({"threshold": 0.9}).dedupe
+    assert not ConfigParser._parse_aggregate({"similarity": "90%", "dedupe": "off"}).dedupe
+
+    # Without it nothing is merged; outputs follow the branch order of the
+    # running workflow (not the top-level one), whatever order they finished in
+    config = OrchestrationConfig(agents=[], workflow=WorkflowConfig(type="sequential"))
+    orchestrator = Orchestrator(config)
+    answers = [("b", ANSWER), ("a", ANSWER)]
+    plain = WorkflowConfig(type="parallel", branches=["a", "b"])
+    assert orchestrator._condense_outputs(answers, plain) == [f"Agent a said: {ANSWER}", f"Agent b said: {ANSWER}"]
+    merged = WorkflowConfig(type="parallel", branches=["a", "b"], aggregate=AggregateConfig(dedupe=True))
+    assert orchestrator._condense_outputs(answers, merged) == [f"Agents a, b (2 votes, near-identical) said: {ANSWER}"]
+    print("✅ Merging is opt-in and follows the workflow being run.")
+
+if __name__ == "__main__":
+    test_near_duplicate_groups()
+    test_parallel_condensing()
+    test_partial_aggregation_stops()
+    test_dedupe_is_opt_in()
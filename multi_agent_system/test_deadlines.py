@@ -0,0 +1,58 @@
+import time
+from src.engine import llm
+from src.engine.orchestrator import Orchestrator
+from src.schema import AgentConfig, OrchestrationConfig, WorkflowConfig, WorkflowStep
+
+aggregator_inputs = []
+
+def fake_chat(messages, model=None, timeout=None):
+    role = messages[0]["content"].split(".")[0].replace("You are ", "")
+    if role == "Judge":
+        aggregator_inputs.append(messages[1]["content"])
+        return "verdict"
+    if role == "Sleeper":
+        time.sleep(1.0)
+    return f"{role} answer"
+
+def _run(config: OrchestrationConfig) -> str:
+    original = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    try:
+        return Orchestrator(config).run()
+    finally:
+        llm.llm_client.chat = original
+
+def test_branch_timeout():
+    print("⏱️ --- TESTING BRANCH DEADLINES ---")
+    agents = [AgentConfig(id="quick", role="Quick", goal="Answer"),
+              AgentConfig(id="sleeper", role="Sleeper", goal="Answer", timeout=0.2),
+              AgentConfig(id="judge", role="Judge", goal="Summarize")]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="parallel", branches=["quick", "sleeper"], then=WorkflowStep(agent="judge")
+    ))
+
+    started = time.monotonic()
+    assert _run(config) == "verdict"
+    assert time.monotonic() - started < 0.8  # The sleeper was abandoned, not awaited
+    assert "Agent quick said: Quick answer" in aggregator_inputs[-1]
+    assert "[Note: 1 branch(es) timed out and returned no result: sleeper]" in aggregator_inputs[-1]
+    print("✅ The aggregator runs with a note about the branch that timed out.")
+
+def test_workflow_deadline():
+    print("⌛ --- TESTING WORKFLOW DEADLINE ---")
+    agents = [AgentConfig(id="sleeper", role="Sleeper", goal="Answer"),
+              AgentConfig(id="quick", role="Quick", goal="Answer")]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="sequential", timeout=0.2, steps=[WorkflowStep(agent="sleeper"), WorkflowStep(agent="quick")]
+    ))
+
+    started = time.monotonic()
+    result = _run(config)
+    assert time.monotonic() - started < 0.8
+    assert "Quick answer" not in result  # The remaining step was skipped
+    assert "[Note: the workflow deadline was reached before all steps could run.]" in result
+    print("✅ The workflow stops at its deadline and says so.")
+
+if __name__ == "__main__":
+    test_branch_timeout()
+    test_workflow_deadline()
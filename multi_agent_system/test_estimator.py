@@ -0,0 +1,86 @@
+import os
+import tempfile
+from datetime import datetime
+from src.engine.estimator import WorkflowEstimator
+from src.interface.database import DatabaseHandler
+from src.schema import AgentConfig, OrchestrationConfig, WorkflowConfig, WorkflowStep
+
+MODEL = "test/model"
+
+def _history() -> DatabaseHandler:
+    db = DatabaseHandler(os.path.join(tempfile.mkdtemp(), "estimate_test.db"))
+    # 2s per call, 100 completion tokens, 4 characters per prompt token
+    for _ in range(4):
+        db.record_usage(MODEL, 1000, 100, 1100, 0, 4000, 2000, agent_id="researcher", run_id="r")
+        db.record_span("agent", "researcher", datetime.now(), 5000, output_chars=800,
+                       agent_id="researcher", run_id="r")
+    return db
+
+def test_sequential_estimate():
+    print("🧮 --- TESTING WORKFLOW ESTIMATE ---")
+    agents = [
+        AgentConfig(id="researcher", role="Researcher", goal="Find facts about solar panels",
+                    model=MODEL, tools=["file_read", "web_magic"], tool_mode="text"),
+        AgentConfig(id="poet", role="Poet", goal="Compose a haiku about autumn leaves", model=MODEL),
+        AgentConfig(id="writer", role="Writer", goal="Summarize the haiku and the solar facts", model=MODEL),
+        AgentConfig(id="ghost", role="Ghost", goal="Never runs", model=MODEL),
+    ]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="sequential", steps=[WorkflowStep(agent="researcher"), WorkflowStep(agent="poet"),
+                                  WorkflowStep(agent="writer")]
+    ))
+    estimator = WorkflowEstimator(config, database=_history())
+    total = estimator.estimate()
+
+    # 1. Measured agents use their own history, the rest the model's per-call latency
+    assert estimator.rows["researcher"].source == "agent history"
+    assert estimator.rows["poet"].source == "model history"
+    assert abs(total.seconds - (5 + 2 + 2)) < 1e-6, total.seconds
+    assert total.calls == 3 and total.path == ["researcher", "poet", "writer"]
+    assert estimator.rows["writer"].completion_tokens == 100
+    print("✅ Calls, time and the critical path follow the workflow and its history.")
+
+    # 2. Waste: unknown and unused tools, idle agents, steps that could run side by side
+    warnings = "\n".join(estimator.warnings())
+    assert "web_magic" in warnings
+    assert "called no tool in 4 runs" in warnings
+    assert "'ghost' is defined but no step runs it" in warnings
+    assert "Steps researcher -> poet" in warnings and "poet -> writer" not in warnings
+    print("✅ Waste is flagged.")
+
+def test_race_estimate():
+    print("🏁 --- TESTING RACE ESTIMATE ---")
+    agents = [AgentConfig(id="fast", role="Fast", goal="Answer", model=MODEL),
+              AgentConfig(id="slow", role="Slow", goal="Answer", model="unknown/model")]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="parallel", branches=["fast", "slow"], mode="race", quorum=1
+    ))
+    total = WorkflowEstimator(config, database=_history()).estimate()
+    # The known model answers in 2s; the unknown one falls back to the 3s default
+    assert total.calls == 2 and total.path == ["fast"] and total.seconds == 2
+    print("✅ A race waits only for the fastest branch.")
+
+def test_tool_history():
+    print("🔧 --- TESTING TOOL HISTORY ---")
+    database = _history()
+    # Three quick small reads and one slow large search
+    for _ in range(3):
+        database.record_span("tool", "file_read", datetime.now(), 1000, output_chars=100,
+                             agent_id="researcher", run_id="r")
+    database.record_span("tool", "web_search", datetime.now(), 5000, output_chars=1000,
+                         agent_id="researcher", run_id="r")
+    agents = [AgentConfig(id="researcher", role="Researcher", goal="Find facts", model=MODEL)]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="sequential", steps=[WorkflowStep(agent="researcher")]
+    ))
+    stats = WorkflowEstimator(config, database=database).agent_stats["researcher"]
+    assert stats.tool_calls == {"file_read": 3, "web_search": 1}
+    # Weighted by calls, not just the last tool read back
+    assert abs(stats.tool_seconds - (3 * 1 + 5) / 4) < 1e-6, stats.tool_seconds
+    assert abs(stats.tool_output_chars - (3 * 100 + 1000) / 4) < 1e-6, stats.tool_output_chars
+    print("✅ Tool time and size average over all of the agent's tools.")
+
+if __name__ == "__main__":
+    test_sequential_estimate()
+    test_race_estimate()
+    test_tool_history()
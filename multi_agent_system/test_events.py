@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+from src.engine import llm
+from src.engine.orchestrator import Orchestrator
+from src.interface.events import TOKEN, EventBus, bus
+from src.schema import AgentConfig, OrchestrationConfig, WorkflowConfig, WorkflowStep
+
+def _config():
+    agents = [AgentConfig(id="writer", role="Writer", goal="Write"),
+              AgentConfig(id="editor", role="Editor", goal="Edit")]
+    return OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="sequential", steps=[WorkflowStep(agent="writer"), WorkflowStep(agent="editor")]
+    ))
+
+def test_bus_subscriptions():
+    print("📡 --- TESTING EVENT BUS ---")
+    local_bus = EventBus()
+    everything, tokens = [], []
+    local_bus.subscribe(everything.append)
+    assert not local_bus.wants(TOKEN)
+    sub = local_bus.subscribe(tokens.append, types=[TOKEN])
+    assert local_bus.wants(TOKEN)
+    local_bus.publish("agent_start", agent="writer", role="Writer")
+    local_bus.publish(TOKEN, agent="writer", text="Hi")
+    assert [e.type for e in everything] == ["agent_start"]  # token deltas are opt-in
+    assert [e.data["text"] for e in tokens] == ["Hi"]
+    local_bus.unsubscribe(sub)
+    assert not local_bus.wants(TOKEN)
+    print("✅ Token deltas only reach subscribers that ask for them.")
+
+def test_orchestrator_stream():
+    print("🌊 --- TESTING ORCHESTRATOR STREAM ---")
+    original = (llm.completion, llm.stream_chunk_builder)
+
+    def fake_completion(model, messages, stream=False, **kwargs):
+        text = f"draft by {'Writer' if 'Writer' in str(messages[0]['content']) else 'Editor'}"
+        if stream:
+            return iter(SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+                        for word in text.split())
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text, tool_calls=None))],
+                               usage=None)
+
+    llm.completion = fake_completion
+    llm.stream_chunk_builder = lambda chunks, messages=None: SimpleNamespace(usage=None, choices=[SimpleNamespace(
+        message=SimpleNamespace(content="".join(c.choices[0].delta.content for c in chunks), tool_calls=None))])
+    try:
+        events = list(Orchestrator(_config()).stream())
+        types = [e.type for e in events]
+        assert types[0] == "workflow_start" and types[-1] == "final"
+        assert types.count("agent_start") == 2 and types.count("agent_output") == 2
+        tokens = "".join(e.data["text"] for e in events if e.type == TOKEN and e.agent == "writer")
+        assert tokens.strip() == "draft by Writer"
+        assert events[-1].data["output"].strip() == "draft by Editor"
+        assert len({e.run_id for e in events}) == 1
+        print("✅ stream() yields typed events, token deltas included, and ends with 'final'.")
+
+        async def collect():
+            return [e async for e in Orchestrator(_config()).astream(tokens=False)]
+        async_events = asyncio.run(collect())
+        assert TOKEN not in [e.type for e in async_events] and async_events[-1].type == "final"
+        assert not bus.wants(TOKEN)  # the stream's subscription is gone again
+        print("✅ astream() works without token deltas.")
+    finally:
+        llm.completion, llm.stream_chunk_builder = original
+
+if __name__ == "__main__":
+    test_bus_subscriptions()
+    test_orchestrator_stream()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+from src.engine import llm
+from src.engine.fanout import OrderedCollector, iter_items
+from src.engine.orchestrator import Orchestrator
+from src.schema import AgentConfig, ForEach, OrchestrationConfig, WorkflowConfig, WorkflowStep
+
+def test_ordered_collector():
+    print("📦 --- TESTING ORDERED FAN-OUT RESULTS ---")
+    collector = OrderedCollector(aggregate=True, chunk_chars=20)
+    collector.add(1, "b", "second")
+    assert not collector.has_chunk() and collector.buffered == 1  # waits for item 1
+    collector.add(0, "a", "first")
+    assert collector.take_chunk() == (1, 2, "[1] first\n[2] second")
+    print("✅ Results are released in input order.")
+
+    path = os.path.join(tempfile.mkdtemp(), "items.txt")
+    with open(path, "w") as f:
+        f.write("alpha\n\nbeta\n")
+    assert list(iter_items(ForEach(agent="x", file=path), "")) == ["alpha", "beta"]
+    assert list(iter_items(ForEach(agent="x", from_previous=True), 'Items: ["a", {"b": 1}]')) == ["a", '{"b": 1}']
+    print("✅ Items come from files and from the previous output.")
+
+def test_foreach_workflow():
+    print("🔁 --- TESTING FOREACH WORKFLOW ---")
+    agents = [AgentConfig(id="lister", role="Lister", goal="List"),
+              AgentConfig(id="worker", role="Worker", goal="Work")]
+    spec = ForEach(agent="worker", from_previous=True, concurrency=3, task="Shout {item}")
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="sequential", steps=[WorkflowStep(agent="lister"), WorkflowStep(kind="foreach", foreach=spec)]
+    ))
+
+    def fake_chat(messages, model=None, timeout=None):
+        if "Lister" in messages[0]["content"]:
+            return '["one", "two", "three", "four", "five"]'
+        item = messages[1]["content"].split("Shout ")[1]
+        time.sleep(0.05 if item == "one" else 0)  # Finishes last, must still come first
+        return item.upper()
+
+    original = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    try:
+        result = Orchestrator(config).run()
+    finally:
+        llm.llm_client.chat = original
+
+    assert result == "[1] ONE\n[2] TWO\n[3] THREE\n[4] FOUR\n[5] FIVE", result
+    print("✅ Every item ran once and came back in order.")
+
+def test_empty_foreach():
+    print("🫙 --- TESTING EMPTY FOREACH ---")
+    agents = [AgentConfig(id="worker", role="Worker", goal="Work"),
+              AgentConfig(id="boss", role="Boss", goal="Summarize")]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(type="sequential", steps=[]))
+
+    def fake_chat(messages, model=None, timeout=None):
+        raise AssertionError("no item, no call")
+
+    original = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    try:
+        orchestrator = Orchestrator(config)
+        # 1. An empty previous list or item list gives empty text, with or without an aggregator
+        assert orchestrator._run_foreach(ForEach(agent="worker", from_previous=True), "[]") == ""
+        assert orchestrator._run_foreach(ForEach(agent="worker", items=[], then="boss"), "ctx") == ""
+
+        # 2. A deadline that passed before the first item only adds a note
+        orchestrator._workflow_deadline = time.monotonic() - 1
+        output = orchestrator._run_foreach(ForEach(agent="worker", items=["a"], then="boss"), "ctx")
+        assert output == "\n[Note: the workflow deadline stopped the fan-out after 0 item(s)]", output
+    finally:
+        llm.llm_client.chat = original
+    print("✅ Empty fan-outs return empty text.")
+
+if __name__ == "__main__":
+    test_ordered_collector()
+    test_foreach_workflow()
+    test_empty_foreach()
@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import sys
+import tempfile
+from src.engine import llm
+from src.engine.orchestrator import Orchestrator
+from src.interface.console import ui
+from src.interface.parser import ConfigParser
+
+CONFIG = """
+agents:
+  - id: optimist
+    role: Optimist
+    goal: Cheer
+  - id: skeptic
+    role: Skeptic
+    goal: Doubt
+  - id: judge
+    role: Judge
+    goal: Decide
+workflow:
+  type: paralel
+  branches: [optimist, skeptic]
+  then: judge
+"""
+
+def fake_chat(messages, model=None, timeout=None):
+    role = messages[0]["content"].split(".")[0].replace("You are ", "")
+    return f'{role} says **hello**\nwith [brackets] and "quotes"'
+
+def test_headless_output():
+    print("🤖 --- TESTING HEADLESS OUTPUT ---")
+    path = os.path.join(tempfile.mkdtemp(), "headless.yaml")
+    with open(path, "w") as f:
+        f.write(CONFIG)
+
+    ui.shutdown()  # Draw what earlier runs left queued before capturing
+    stdout, stderr = io.StringIO(), io.StringIO()
+    original = (sys.stdout, sys.stderr, llm.llm_client.chat)
+    sys.stdout, sys.stderr = stdout, stderr
+    llm.llm_client.chat = fake_chat
+    try:
+        ui.configure(headless=True)
+        config = ConfigParser.load_config(path)  # The typo triggers an auto-correct notice
+        ui.print_welcome()
+        result = Orchestrator(config).run()
+        ui.console.print("[bold]Rich output[/bold] goes elsewhere")
+        ui.print_result(result, title="Final Output")
+        ui.shutdown()
+    finally:
+        sys.stdout, sys.stderr, llm.llm_client.chat = original
+        ui.configure(headless=False)
+
+    # 1. Every stdout line is a JSON event, drawn by the single render thread in order
+    lines = stdout.getvalue().splitlines()
+    bad = [line for line in lines if not line.startswith("{")]
+    assert not bad, bad[:5]
+    events = [json.loads(line) for line in lines]
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "welcome" and kinds[-1] == "result", kinds
+    assert kinds.count("agent_start") == 3 and "final" in kinds
+    assert events[-1]["content"] == 'Judge says **hello**\nwith [brackets] and "quotes"'
+    print(f"✅ {len(lines)} stdout lines, all valid JSON.")
+
+    # 2. Notices and direct Rich output went to stderr
+    assert "[Notice] Auto-corrected workflow type 'paralel' to 'parallel'" in stderr.getvalue()
+    assert "Rich output goes elsewhere" in stderr.getvalue()
+    print("✅ Notices and Rich output stay off stdout.")
+
+if __name__ == "__main__":
+    test_headless_output()
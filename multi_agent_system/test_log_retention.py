@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from src.interface.database import DatabaseHandler
+
+def test_log_retention():
+    print("🧹 --- TESTING LOG RETENTION ---")
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "logs_test.db")
+    db = DatabaseHandler(path)
+
+    # 1. Write some old and some fresh logs
+    conn = sqlite3.connect(path)
+    old = datetime.now() - timedelta(days=10)
+    conn.executemany(
+        "INSERT INTO logs (timestamp, run_id, agent_id, action, details) VALUES (?, ?, ?, ?, ?)",
+        [(old, "old_run", "researcher", "tool_use", "x" * 1000) for _ in range(50)]
+    )
+    conn.commit()
+    conn.close()
+    for i in range(20):
+        db.log_event("writer", "agent_response", f"answer {i}", run_id="new_run")
+
+    # 2. Indexed, streamed queries
+    rows = list(db.iter_logs(run_id="new_run", agent_id="writer", batch_size=7))
+    assert len(rows) == 20
+    assert rows[0][5] == "answer 0"
+    newest = list(db.iter_logs(run_id="new_run", limit=3, newest_first=True))
+    assert [r[5] for r in newest] == ["answer 19", "answer 18", "answer 17"]
+    print("✅ Streaming query returns the right rows.")
+
+    # 3. Age-based retention removes only the old run
+    deleted = db.prune_logs(max_age_days=7, batch_size=8)
+    assert deleted == 50, deleted
+    assert not list(db.iter_logs(run_id="old_run"))
+    print(f"✅ Pruned {deleted} old rows.")
+
+    # 4. Size-based retention keeps the newest rows
+    db.prune_logs(max_rows=5)
+    remaining = [r[5] for r in db.iter_logs()]
+    assert remaining == [f"answer {i}" for i in range(15, 20)], remaining
+    print("✅ Row cap keeps the newest 5 rows.")
+
+    # 5. The database uses incremental auto-vacuum
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+    print("✅ Incremental vacuum enabled.")
+
+    # 5b. Vacuuming returns every free page, so the file shrinks after deletes
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO logs (timestamp, agent_id, action, details) VALUES (?, ?, ?, ?)",
+                     [(datetime.now(), "bulk", "tool_use", "y" * 1000) for _ in range(3000)])
+    conn.commit()
+    pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.execute("DELETE FROM logs WHERE agent_id = 'bulk'")
+    conn.commit()
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 500
+    db.vacuum()
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert conn.execute("PRAGMA page_count").fetchone()[0] < pages_before / 2
+    conn.close()
+    print("✅ Free pages are returned to the OS.")
+
+    # 6. A legacy database is only rewritten by an explicit full vacuum
+    legacy = os.path.join(tmp_dir, "legacy.db")
+    conn = sqlite3.connect(legacy)
+    conn.execute("CREATE TABLE old_stuff (x TEXT)")  # Non-empty file: auto_vacuum can't change any more
+    conn.commit()
+    conn.close()
+    legacy_db = DatabaseHandler(legacy)
+    legacy_db.log_event("writer", "agent_response", "old", run_id="r")
+    legacy_db.prune_logs(max_rows=0, max_age_days=-1)  # What the background maintenance runs
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    conn.close()
+    assert legacy_db.vacuum(full=True)
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+    print("✅ Background pruning never runs a blocking full VACUUM.")
+
+    print("\n🎉 LOG RETENTION TEST COMPLETE")
+
+if __name__ == "__main__":
+    test_log_retention()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from dataclasses import asdict
+from src.engine import recall
+from src.engine.distributed import Worker
+from src.engine.recall import keywords, select_memories
+from src.interface.context import run_scope
+from src.interface.database import DatabaseHandler
+from src.interface.parser import ConfigParser
+
+def test_memory_recall():
+    print("🧠 --- TESTING MEMORY RECALL ---")
+    original_db = recall.db
+    recall.db = DatabaseHandler(os.path.join(tempfile.mkdtemp(), "recall_test.db"))
+    try:
+        recall.db.save_memory("customer_tier", "Acme is a gold customer")
+        recall.db.save_memory("customer_tier", "Acme is platinum for this run", namespace="run:r1")
+        recall.db.save_memory("pricing", "Discounts depend on the customer's tier")
+        recall.db.save_memory("release_notes", "Version 2 adds dark mode. " * 400)  # stored as a blob
+        recall.db.save_memory("lunch", "Pizza on Fridays")
+
+        # 1. Config forms
+        agent = ConfigParser._parse_agent({"id": "writer", "goal": "Draft a reply about pricing", "recall": 300})
+        assert agent.recall.max_chars == 300
+        assert ConfigParser._parse_agent({"id": "x", "recall": ["lunch"]}).recall.keys == ["lunch"]
+        assert ConfigParser._parse_agent({"id": "x", "recall": False}).recall is None
+        print("✅ 'recall' accepts a flag, a budget, keys or a dict.")
+        # Queue workers get the agent as a plain dict and must rebuild the recall options
+        assert Worker._agent_from_dict(asdict(agent)) == agent
+
+        # 2. Keys named in the goal or task are picked, unrelated entries left out
+        with run_scope("r1"):
+            selected = select_memories(agent, "Use the customer_tier and the release notes.")
+        keys = [key for _, key, _ in selected]
+        assert keys == ["customer_tier", "pricing", "release_notes"], keys  # all named; the run's entry ranks first
+        assert selected[0] == ("run:r1", "customer_tier", "Acme is platinum for this run")
+        assert sum(len(key) + 4 + len(value) for _, key, value in selected) <= 300
+        # Without a mention, key words count three times as much as words in the value
+        sales = ConfigParser._parse_agent({"id": "sales", "goal": "Help the sales team", "recall": True})
+        with run_scope("r1"):
+            selected = select_memories(sales, "Explain discounts per tier.")
+        assert [key for _, key, _ in selected] == ["customer_tier", "pricing"]
+        assert keywords("Customers' invoices") == {"customer", "invoice"}
+        with run_scope("r1"):
+            assert [key for _, key, _ in select_memories(agent, "Be polite.")] == ["pricing"]
+        print("✅ Relevant entries are picked within the budget, most specific namespace first.")
+    finally:
+        recall.db = original_db
+
+if __name__ == "__main__":
+    test_memory_recall()
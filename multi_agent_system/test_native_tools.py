@@ -0,0 +1,59 @@
+from typing import List
+from src.engine.agent_runner import AgentRunner
+from src.interface.tools import ToolRegistry
+
+def lookup(city: str, days: int, metric: bool = True, tags: list = None, *args, **kwargs) -> str:
+    """Looks up the weather forecast.
+
+    Longer notes that should not end up in the description.
+    """
+    return city
+
+def untyped(query, limit=5, names: List[str] = None):
+    return query
+
+def test_tool_schemas():
+    print("🧩 --- TESTING TOOL SCHEMAS ---")
+    ToolRegistry.register_tool("test_lookup")(lookup)
+    ToolRegistry.register_tool("test_untyped")(untyped)
+    try:
+        schema = ToolRegistry.get_schema("test_lookup")
+        assert schema == {
+            "type": "function",
+            "function": {
+                "name": "test_lookup",
+                "description": "Looks up the weather forecast.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"city": {"type": "string"}, "days": {"type": "integer"},
+                                   "metric": {"type": "boolean"}, "tags": {"type": "array"}},
+                    "required": ["city", "days"],
+                },
+            },
+        }, schema
+        # Missing or unusual annotations fall back to strings; no docstring means the name
+        params = ToolRegistry.get_schema("test_untyped")["function"]
+        assert params["description"] == "test_untyped"
+        assert params["parameters"]["properties"] == {
+            "query": {"type": "string"}, "limit": {"type": "string"}, "names": {"type": "string"}}
+        assert params["parameters"]["required"] == ["query"]
+        assert [s["function"]["name"] for s in ToolRegistry.get_schemas(["test_lookup", "nope"])] == ["test_lookup"]
+    finally:
+        ToolRegistry.unregister_tool("test_lookup")
+        ToolRegistry.unregister_tool("test_untyped")
+    print("✅ Signatures become OpenAI-style function schemas.")
+
+def test_extract_json():
+    print("🔍 --- TESTING TEXT-MODE TOOL CALLS ---")
+    call = {"tool": "file_read", "args": {"file_path": "a.txt"}}
+    assert AgentRunner._extract_json('Sure! {"tool": "file_read", "args": {"file_path": "a.txt"}} done') == call
+    # Objects without a "tool" key (or invalid JSON) are skipped, not mistaken for calls
+    text = 'Here is data {"name": "x"} and {broken and ```json\n{"tool": "python", "args": {"code": "1"}}\n```'
+    assert AgentRunner._extract_json(text) == {"tool": "python", "args": {"code": "1"}}
+    assert AgentRunner._extract_json('The set {1, 2} has no tool call.') is None
+    assert AgentRunner._extract_json("plain answer") is None
+    print("✅ Tool calls are found inside messy text, other JSON is ignored.")
+
+if __name__ == "__main__":
+    test_tool_schemas()
+    test_extract_json()
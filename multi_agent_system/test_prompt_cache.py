@@ -0,0 +1,37 @@
+from src.engine.agent_runner import AgentRunner
+from src.engine.llm import LLMEngine
+from src.schema import AgentConfig
+
+def test_cache_hints():
+    print("🧊 --- TESTING PROMPT CACHE HINTS ---")
+    messages = [
+        {"role": "system", "content": "You are a careful researcher."},
+        {"role": "user", "content": "Context: none\nCurrent Task: find facts"},
+        {"role": "assistant", "content": "Working on it."},
+    ]
+    hinted = LLMEngine._with_cache_hints(messages)
+
+    # 1. The system prompt becomes one cacheable content block
+    assert hinted[0] == {
+        "role": "system",
+        "content": [{"type": "text", "text": "You are a careful researcher.", "cache_control": {"type": "ephemeral"}}]
+    }
+    # 2. Everything else is passed through untouched, and the input isn't modified
+    assert hinted[1:] == messages[1:]
+    assert messages[0]["content"] == "You are a careful researcher."
+    print("✅ Only the system message carries a cache breakpoint.")
+
+def test_system_prompt_cache():
+    print("🗂️ --- TESTING SYSTEM PROMPT CACHE ---")
+    # Two configs (e.g. two concurrent runs) that reuse an agent id
+    a = AgentConfig(id="writer", role="Writer", goal="Draft a poem")
+    b = AgentConfig(id="writer", role="Writer", goal="Draft a contract")
+    first = AgentRunner.build_system_prompt(a)
+    assert "poem" in first and "contract" in AgentRunner.build_system_prompt(b)
+    # The same config gets the very same string back, with no reset between runs
+    assert AgentRunner.build_system_prompt(AgentConfig(id="other", role="Writer", goal="Draft a poem")) is first
+    print("✅ Prompts are cached by content, not by agent id.")
+
+if __name__ == "__main__":
+    test_cache_hints()
+    test_system_prompt_cache()
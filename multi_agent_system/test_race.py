@@ -0,0 +1,89 @@
+import time
+from src.engine import llm
+from src.engine.orchestrator import Orchestrator
+from src.interface.console import ui
+from src.interface.parser import ConfigParser
+from src.schema import AgentConfig, OrchestrationConfig, WorkflowConfig
+
+# role -> (delay, answer)
+ANSWERS = {
+    "Guesser": (0.0, "No idea, sorry."),
+    "Historian": (0.05, "Python came out in 1991."),
+    "Archivist": (0.3, "It was released in 1991."),
+    "Crasher": (0.0, None),  # Raises instead of answering
+}
+
+def fake_chat(messages, model=None, timeout=None):
+    role = messages[0]["content"].split(".")[0].replace("You are ", "")
+    delay, answer = ANSWERS[role]
+    time.sleep(delay)
+    if answer is None:
+        raise RuntimeError("provider exploded")
+    return answer
+
+def _run(quorum: int, accept: str, roles=("Guesser", "Historian", "Archivist")) -> str:
+    agents = [AgentConfig(id=role.lower(), role=role, goal="Answer") for role in roles]
+    config = OrchestrationConfig(agents=agents, workflow=WorkflowConfig(
+        type="parallel", branches=[a.id for a in agents], mode="race", quorum=quorum, accept=accept
+    ))
+    original = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    try:
+        return Orchestrator(config).run()
+    finally:
+        llm.llm_client.chat = original
+
+def test_race_quorum():
+    print("🏁 --- TESTING RACE MODE ---")
+
+    # 1. The fastest answer is rejected by `accept`; the first acceptable one wins
+    started = time.monotonic()
+    assert _run(quorum=1, accept=r"\b19\d\d\b") == "Python came out in 1991."
+    assert time.monotonic() - started < 0.25  # The slow branch wasn't waited for
+    print("✅ The first acceptable answer wins.")
+
+    # 2. Rejected answers don't count towards the quorum
+    result = _run(quorum=2, accept=r"\b19\d\d\b")
+    assert "Agent historian said" in result and "Agent archivist said" in result
+    assert "No idea" not in result
+    print("✅ Rejected answers don't count towards the quorum.")
+
+    # 3. Quorum not met: every answer received is passed on, rejected ones included
+    result = _run(quorum=2, accept=r"(?i)PYTHON CAME")
+    assert "Agent historian said" in result and "No idea" in result and "released in 1991" in result
+    print("✅ Falling back to all answers when the quorum isn't met.")
+
+    # 4. The pattern is used as written: no implicit case-insensitivity
+    assert "Agent historian said" in _run(quorum=1, accept=r"PYTHON CAME")
+    print("✅ The accept pattern is case-sensitive unless it says otherwise.")
+
+def test_failed_branch_is_not_an_answer():
+    print("💥 --- TESTING FAILED BRANCHES IN A RACE ---")
+    statuses = {}
+    original_status = ui.log_agent_status
+    ui.log_agent_status = lambda agent_id, status: statuses.__setitem__(agent_id, status)
+    try:
+        # The crash comes first, but only the two real answers make the quorum of 2
+        result = _run(quorum=2, accept=r"1991", roles=("Crasher", "Historian", "Archivist"))
+    finally:
+        ui.log_agent_status = original_status
+    assert "Agent historian said" in result and "Agent archivist said" in result, result
+    assert "crasher" not in result and "exploded" not in result
+    assert statuses.get("crasher") == "✗ failed" and "archivist" not in statuses
+    print("✅ A failed branch doesn't count toward the quorum and stays out of the output.")
+
+def test_quorum_validation():
+    print("🧮 --- TESTING QUORUM VALIDATION ---")
+    try:
+        ConfigParser._parse_workflow({"type": "parallel", "branches": ["a", "b"], "quorum": 3})
+    except ValueError as e:
+        assert "only 2 branches" in str(e)
+    else:
+        raise AssertionError("a quorum above the number of branches must be rejected")
+    assert ConfigParser._parse_workflow({"type": "parallel", "branches": ["a", "b"], "quorum": 2}).quorum == 2
+    print("✅ Unreachable quorums are rejected at parse time.")
+
+if __name__ == "__main__":
+    test_race_quorum()
+    test_failed_branch_is_not_an_answer()
+    test_quorum_validation()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import time
+from litellm import ModelResponse
+from src.engine import agent_runner, llm
+from src.engine.orchestrator import Orchestrator
+from src.interface import cassette
+from src.interface.cassette import Cassette
+from src.interface.context import get_agent_id
+from src.interface.database import DatabaseHandler
+from src.interface.parser import ConfigParser
+from src.interface.tools import ToolRegistry
+
+LATENCY = 0.2
+calls = {"llm": 0, "tool": 0}
+
+def fake_completion(model, messages, **kwargs):
+    calls["llm"] += 1
+    time.sleep(LATENCY)
+    return ModelResponse(model=model, choices=[{"message": {"role": "assistant", "content": f"{get_agent_id()} says hi"}}],
+                         usage={"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13})
+
+def offline(model, messages, **kwargs):
+    raise AssertionError("replay must not call the provider")
+
+def dice(sides: int = 6) -> str:
+    calls["tool"] += 1
+    return f"rolled {time.time_ns() % sides + 1}"
+
+def _metric_rows(database: DatabaseHandler) -> int:
+    conn = database._connect()
+    rows = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("usage", "spans"))
+    conn.close()
+    return rows
+
+def test_record_and_replay_workflow():
+    print("📼 --- TESTING RECORD / REPLAY ---")
+    path = os.path.join(tempfile.mkdtemp(), "debate.cassette")
+    config = ConfigParser.load_config("examples/parallel_debate.yaml")
+    original, original_db = llm.completion, llm.db
+    metrics_db = DatabaseHandler(os.path.join(tempfile.mkdtemp(), "replay_test.db"))
+    llm.db = agent_runner.db = metrics_db
+
+    # 1. Record the real example workflow against a (fake) provider
+    llm.completion = fake_completion
+    try:
+        with cassette.use(Cassette.record(path, config="parallel_debate.yaml")) as tape:
+            recorded = Orchestrator(config).run()
+        assert tape.recorded == 3 and calls["llm"] == 3
+        recorded_metrics = _metric_rows(metrics_db)
+        assert recorded_metrics == 6  # 3 LLM calls and 3 agent spans
+    finally:
+        llm.completion = original
+    print("✅ Every LLM call is captured.")
+
+    # 2. Replay offline: same result, recorded timings, no provider calls
+    llm.completion = offline
+    try:
+        started = time.monotonic()
+        with cassette.use(Cassette.replay(path)) as tape:
+            orchestrator = Orchestrator(config)
+            assert orchestrator.run() == recorded
+        assert time.monotonic() - started >= 2 * LATENCY  # a branch, then the judge
+        assert tape.replayed == 3 and tape.inexact == 0 and tape.unused == 0
+
+        started = time.monotonic()
+        with cassette.use(Cassette.replay(path, realtime=False)):
+            assert Orchestrator(config).run() == recorded
+        assert time.monotonic() - started < LATENCY
+    finally:
+        llm.completion = original
+        llm.db = agent_runner.db = original_db
+    print("✅ Replay reproduces the run offline, in real time or with zero latency.")
+
+    # 3. Replays stay out of the usage history the estimator learns from; their logs are tagged
+    assert _metric_rows(metrics_db) == recorded_metrics
+    assert orchestrator.run_id.startswith("replay-")
+    print("✅ Replayed calls are not counted as real usage.")
+
+def test_tool_replay():
+    print("🎲 --- TESTING TOOL REPLAY ---")
+    path = os.path.join(tempfile.mkdtemp(), "tools.cassette")
+    ToolRegistry.register_tool("dice")(dice)
+    try:
+        with cassette.use(Cassette.record(path)):
+            rolls = [ToolRegistry.run("dice", {"sides": 1000}) for _ in range(3)]
+        with cassette.use(Cassette.replay(path, realtime=False)) as tape:
+            replayed = [ToolRegistry.run("dice", {"sides": 1000}) for _ in range(3)]
+            missing = ToolRegistry.run("dice", {"sides": 1000})
+    finally:
+        ToolRegistry.unregister_tool("dice")
+    assert replayed == rolls and calls["tool"] == 3  # the tool itself never ran again
+    assert missing.startswith("Error executing tool 'dice'") and tape.missed == 1
+    print("✅ Tool results are replayed in order without running the tool.")
+
+if __name__ == "__main__":
+    test_record_and_replay_workflow()
+    test_tool_replay()
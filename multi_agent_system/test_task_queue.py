@@ -0,0 +1,132 @@
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from src.engine import llm
+from src.engine.distributed import QueueDispatcher, Worker
+from src.engine.orchestrator import Orchestrator
+from src.engine.task_queue import AgentTask, open_queue
+from src.schema import AgentConfig, CascadeConfig, OrchestrationConfig, WorkflowConfig, WorkflowStep
+
+def test_task_queue_leases():
+    print("📬 --- TESTING TASK QUEUE LEASES ---")
+    tmp_dir = tempfile.mkdtemp()
+    queue = open_queue("sqlite:///" + os.path.join(tmp_dir, "queue.db"))
+
+    # 1. A queued task is claimed exactly once
+    task_id = queue.enqueue(AgentTask(agent={"id": "writer"}, context="c", task_input="t", max_attempts=2))
+    task = queue.claim("w1", lease_seconds=0.2)
+    assert task is not None and task.id == task_id and task.attempts == 1
+    assert queue.claim("w2", lease_seconds=0.2) is None
+    print("✅ Claim is exclusive.")
+
+    # 2. A worker that stops heart-beating loses the task to someone else
+    time.sleep(0.3)
+    assert queue.requeue_expired() == (1, 0)
+    assert not queue.heartbeat(task_id, "w1", lease_seconds=5)
+    task = queue.claim("w2", lease_seconds=0.2)
+    assert task.attempts == 2
+    print("✅ Expired lease is re-queued.")
+
+    # 3. The stale worker can't overwrite the new holder's result
+    queue.complete(task_id, "w1", result="stale")
+    assert queue.results([task_id]) == {}
+
+    # 4. Out of attempts: the task fails instead of looping forever
+    time.sleep(0.3)
+    assert queue.requeue_expired() == (0, 1)
+    outcome = queue.results([task_id])[task_id]
+    assert outcome.status == "failed" and "Lease expired" in outcome.error
+    print("✅ Gives up after max_attempts.")
+
+    # 5. Cancelled tasks are never handed out
+    other = queue.enqueue(AgentTask(agent={"id": "critic"}, context="c", task_input="t"))
+    queue.cancel(other)
+    assert queue.claim("w1", lease_seconds=5) is None
+    assert queue.results([other])[other].status == "cancelled"
+    print("✅ Cancelled tasks stay cancelled.")
+
+    # 6. Finished tasks are deleted once they are older than the TTL; queued ones never
+    waiting = queue.enqueue(AgentTask(agent={"id": "editor"}, context="c", task_input="t"))
+    assert queue.prune_finished(max_age_seconds=3600) == 0
+    assert queue.prune_finished(max_age_seconds=0) == 2
+    assert queue.results([task_id, other]) == {}
+    assert queue.claim("w1", lease_seconds=5).id == waiting
+    print("✅ Finished tasks are pruned.")
+
+    print("\n🎉 TASK QUEUE TEST COMPLETE")
+
+def test_dispatcher_and_worker():
+    print("👷 --- TESTING QUEUE DISPATCHER + WORKER ---")
+    queue = open_queue("sqlite:///" + os.path.join(tempfile.mkdtemp(), "queue.db"))
+    config = OrchestrationConfig(
+        agents=[AgentConfig(id="writer", role="Writer", goal="Draft", model="test/model"),
+                AgentConfig(id="editor", role="Editor", goal="Polish", model="test/model")],
+        workflow=WorkflowConfig(type="sequential", steps=[WorkflowStep(agent="writer"), WorkflowStep(agent="editor")])
+    )
+    worker_threads = set()
+
+    def fake_chat(messages, model=None, timeout=None):
+        worker_threads.add(threading.current_thread().name)
+        role = messages[0]["content"].split(".")[0].replace("You are ", "")
+        return f"{role} output"
+
+    original_chat = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    worker = Worker(queue, worker_id="test-worker", concurrency=2, idle_sleep=0.05)
+    thread = threading.Thread(target=worker.run_forever, name="test-worker-loop", daemon=True)
+    thread.start()
+    dispatcher = QueueDispatcher(queue, poll_interval=0.05)
+    try:
+        # Every step travels through the queue and runs on the worker's pool
+        result = Orchestrator(config, dispatcher=dispatcher).run()
+        assert result == "Editor output", result
+        assert worker_threads and "MainThread" not in worker_threads
+    finally:
+        dispatcher.shutdown()
+        worker.stop()
+        thread.join(timeout=5)
+        llm.llm_client.chat = original_chat
+    assert not thread.is_alive()
+    print("✅ A workflow runs end to end on a queue worker.")
+
+def test_cascade_agent_on_worker():
+    print("🪜 --- TESTING CASCADE AGENT ON A WORKER ---")
+    agent = AgentConfig(id="extractor", role="Extractor", goal="Extract names", model="small",
+                        cascade=CascadeConfig(models=["small", "large"], checks=["json"], json_keys=["name"]))
+
+    # 1. The queued (plain dict) form rebuilds the nested cascade options
+    queued = AgentTask.from_json(AgentTask(agent=asdict(agent), context="", task_input="t").to_json())
+    rebuilt = Worker._agent_from_dict(queued.agent)
+    assert rebuilt == agent and isinstance(rebuilt.cascade, CascadeConfig)
+    print("✅ Cascade config survives the queue.")
+
+    # 2. The worker actually escalates
+    queue = open_queue("sqlite:///" + os.path.join(tempfile.mkdtemp(), "queue.db"))
+    models = []
+
+    def fake_chat(messages, model=None, timeout=None):
+        models.append(model)
+        return '{"name": "Ada"}' if model == "large" else "no idea"
+
+    original_chat = llm.llm_client.chat
+    llm.llm_client.chat = fake_chat
+    worker = Worker(queue, worker_id="cascade-worker", idle_sleep=0.05)
+    thread = threading.Thread(target=worker.run_forever, daemon=True)
+    thread.start()
+    dispatcher = QueueDispatcher(queue, poll_interval=0.05)
+    try:
+        result = dispatcher.submit(agent, context="", task_input="Who wrote the first program?").result(timeout=10)
+    finally:
+        dispatcher.shutdown()
+        worker.stop()
+        thread.join(timeout=5)
+        llm.llm_client.chat = original_chat
+    assert result == '{"name": "Ada"}' and models == ["small", "large"], (result, models)
+    print("✅ The worker runs the cascade and escalates.")
+
+if __name__ == "__main__":
+    test_task_queue_leases()
+    test_dispatcher_and_worker()
+    test_cascade_agent_on_worker()
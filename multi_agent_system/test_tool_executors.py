@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+from src.interface.tools import ToolRegistry
+from src.interface.context import agent_scope, get_agent_id
+
+def slow_io(n: int) -> str:
+    time.sleep(0.1)
+    return f"{n}:{get_agent_id()}"
+
+async def async_tool(n: int) -> str:
+    await asyncio.sleep(0.05)
+    return f"{n}:{get_agent_id()}"
+
+def test_tool_executors():
+    print("🧰 --- TESTING TOOL EXECUTORS ---")
+    ToolRegistry.register_tool("test_slow_io", kind="io", max_concurrency=2)(slow_io)
+    ToolRegistry.register_tool("test_async")(async_tool)
+    try:
+        _check_executors()
+    finally:
+        ToolRegistry.unregister_tool("test_slow_io")
+        ToolRegistry.unregister_tool("test_async")
+    assert "test_slow_io" not in ToolRegistry.list_tools()
+
+def _check_executors():
+    # 1. io tools run on their own pool, see the caller's agent, and honour max_concurrency
+    results = []
+
+    def agent(i):
+        with agent_scope(f"agent{i}"):
+            results.append(ToolRegistry.run("test_slow_io", {"n": i}))
+            results.append(ToolRegistry.run("test_async", {"n": i}))
+
+    threads = [threading.Thread(target=agent, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == sorted([f"{i}:agent{i}" for i in range(4)] * 2), results
+    metrics = ToolRegistry.metrics()
+    assert metrics["test_slow_io"]["calls"] == 4
+    assert metrics["test_slow_io"]["max_queue_depth"] >= 1  # Two callers had to queue
+    assert metrics["test_async"]["kind"] == "io (async)"
+    print("✅ io + async tools keep the agent scope; the limit queues callers.")
+
+    # 2. A tool that runs past the caller's deadline is abandoned, but keeps its slot until it ends
+    result = ToolRegistry.run("test_slow_io", {"n": 9}, timeout=0.01)
+    assert "timed out" in result, result
+    metrics = ToolRegistry.metrics()["test_slow_io"]
+    assert metrics["timeouts"] == 1 and metrics["running"] == 1  # Still executing in the pool
+    time.sleep(0.2)
+    assert ToolRegistry.metrics()["test_slow_io"]["running"] == 0
+    print("✅ Slow tools time out instead of holding the agent; the limit still counts them.")
+
+    # 3. cpu tools run in a worker process
+    assert ToolRegistry.execute("python", code="print(6 * 7)").strip() == "42"
+    print("✅ cpu tool ran in the process pool.")
+
+    # 4. A runaway cpu tool is stopped: its pool is killed and the next call gets a fresh one
+    pool = ToolRegistry._cpu_pool
+    workers = list(pool._processes.values())
+    result = ToolRegistry.run("python", {"code": "while True: pass"}, timeout=1)
+    assert "timed out" in result, result
+    for worker in workers:
+        worker.join(timeout=5)
+    assert not any(worker.is_alive() for worker in workers)
+    assert ToolRegistry.execute("python", code="print(7 * 6)").strip() == "42"
+    assert ToolRegistry._cpu_pool is not pool
+    print("✅ A timed-out cpu tool doesn't keep its worker process.")
+
+if __name__ == "__main__":
+    test_tool_executors()